@@ -1,11 +1,21 @@
 import os
 import re
+import json
 import logging
-from flask import Flask, request, jsonify, send_from_directory
+from contextlib import contextmanager
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
-from models.chat_session import SessionManager
+from models.session_locks import SessionBusyError, create_session_locks_from_env
+from models.chat_session import (
+    create_session_manager_from_env, encode_cursor, decode_cursor, MESSAGE_FIELDS, SESSION_FIELDS
+)
 from services.idol_chat_service import idol_chat_service
 from services.divination_service import divination_service
+from services.response_cache import response_cache
+from services.persona_cache import persona_cache, prewarm_names_from_env
+from services.llm_client import llm_client
+from services.safety_filter import reply_safety_filter, safety_filter
+from services.intent_classifier import intent_classifier, normalize_idol_name
 
 # 创建Flask应用
 # 如果存在 static 目录（Docker 部署），则使用它作为静态文件目录
@@ -20,11 +30,41 @@ cors_origins = os.getenv('CORS_ORIGINS', '*').split(',')
 CORS(app, origins=cors_origins, supports_credentials=True)
 
 # 初始化会话管理器
-session_manager = SessionManager()
+session_manager = create_session_manager_from_env()
+
+# 同一会话的聊天、占卜、翻译请求排队执行，避免状态机被并发修改（重复召唤、重复占卜）
+session_locks = create_session_locks_from_env()
+SESSION_BUSY_MESSAGE = "会话正在处理上一条消息，请稍后再试"
+
+@contextmanager
+def edit_session(session_id):
+    """
+    修改会话的请求使用：持有会话锁并加载会话（不存在时为 None），退出时提交修改。
+    多个 worker 共用存储（SESSION_SHARED）时提交会做版本检查，
+    期间被其他进程修改过则抛出 SessionConflictError（SessionBusyError 的子类）
+    """
+    with session_locks.hold(session_id):
+        session = session_manager.get_session(session_id)
+        try:
+            yield session
+        finally:
+            if session is not None:
+                session_manager.commit(session)
 
 # API路由前缀
 api_prefix = '/api'
 
+# 消息历史每页的默认数量与上限
+MESSAGE_PAGE_SIZE = 20
+MAX_MESSAGE_PAGE_SIZE = 200
+
+# 用户会话列表每页的默认数量与上限
+SESSION_PAGE_SIZE = 20
+MAX_SESSION_PAGE_SIZE = 100
+
+# 非中英文偶像回复的翻译方式：lazy 在前端请求时才生成（不阻塞回复），eager 随回复一起生成
+TRANSLATION_MODE = os.getenv('TRANSLATION_MODE', 'lazy').lower()
+
 # 偶像列表
 @app.route(f'{api_prefix}/idols', methods=['GET'])
 def get_idols():
@@ -63,16 +103,63 @@ def create_session():
     session = session_manager.create_session(idol_id, user_id)
     return jsonify(session.to_dict()), 201
 
+def parse_fields(value, allowed):
+    """
+    解析 ?fields=a,b 字段投影参数
+    :return: 字段列表，未指定时返回 None；包含未知字段时抛出 ValueError
+    """
+    if not value:
+        return None
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(unknown)}")
+    return fields
+
+def message_history_payload(session, args):
+    """
+    消息历史（同步与异步路由共用）：
+    指定 since（客户端已有的最后一条消息 id）时只返回之后的新消息，并给出 last_id 供下次同步；
+    否则按 offset/limit 分页。fields 指定只输出哪些字段
+    参数错误时抛出 ValueError
+    """
+    fields = parse_fields(args.get('fields'), MESSAGE_FIELDS)
+    limit = int(args.get('limit', MESSAGE_PAGE_SIZE))
+    if limit <= 0:
+        raise ValueError("limit 必须为正整数")
+    limit = min(limit, MAX_MESSAGE_PAGE_SIZE)
+    since = args.get('since')
+    if since is not None:
+        since = int(since)
+        messages = session.messages_since(since, limit)
+    else:
+        offset = int(args.get('offset', 0))
+        if offset < 0:
+            raise ValueError("offset 不能为负数")
+        messages = session.messages[offset:offset+limit]
+
+    payload = {
+        "session_id": session.session_id,
+        "messages": [msg.to_dict(fields) for msg in messages]
+    }
+    if since is not None:
+        payload["last_id"] = messages[-1].id if messages else since
+    return payload
+
 # 获取会话
 @app.route(f'{api_prefix}/sessions/<session_id>', methods=['GET'])
 def get_session(session_id):
     """
-    获取聊天会话
+    获取聊天会话，fields 参数指定只返回哪些字段（不包含 messages 时不序列化消息）
     """
     session = session_manager.get_session(session_id)
     if not session:
         return jsonify({"error": "会话不存在", "code": 404}), 404
-    return jsonify(session.to_dict())
+    try:
+        fields = parse_fields(request.args.get('fields'), SESSION_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e), "code": 400}), 400
+    return jsonify(session.to_dict(fields))
 
 # 删除会话
 @app.route(f'{api_prefix}/sessions/<session_id>', methods=['DELETE'])
@@ -85,6 +172,198 @@ def delete_session(session_id):
         return jsonify({"error": "会话不存在", "code": 404}), 404
     return jsonify({"message": "会话已删除"})
 
+def parse_page_params(args):
+    """
+    解析会话列表的分页参数（同步与异步路由共用）
+    :return: (limit, cursor)，参数错误时抛出 ValueError
+    """
+    limit = int(args.get('limit', SESSION_PAGE_SIZE))
+    if limit <= 0:
+        raise ValueError("limit 必须为正整数")
+    cursor = args.get('cursor')
+    return min(limit, MAX_SESSION_PAGE_SIZE), decode_cursor(cursor) if cursor else None
+
+def list_user_sessions_payload(user_id, args):
+    """
+    按 updated_at 倒序返回用户的一页会话摘要
+    """
+    limit, cursor = parse_page_params(args)
+    summaries, next_cursor = session_manager.list_user_sessions(user_id, limit, cursor)
+    return {
+        "user_id": user_id,
+        "sessions": summaries,
+        "next_cursor": encode_cursor(next_cursor) if next_cursor else None
+    }
+
+# 用户的会话列表
+@app.route(f'{api_prefix}/users/<user_id>/sessions', methods=['GET'])
+def list_user_sessions(user_id):
+    """
+    分页列出用户的会话摘要（不含消息）
+    """
+    try:
+        return jsonify(list_user_sessions_payload(user_id, request.args))
+    except ValueError:
+        return jsonify({"error": "分页参数错误", "code": 400}), 400
+
+def _run_to_completion(turn):
+    """
+    消费对话生成器，丢弃中间增量，返回最终的完整回复
+    """
+    while True:
+        try:
+            next(turn)
+        except StopIteration as stop:
+            return stop.value
+
+def plan_transition(session, content):
+    """
+    决定过渡阶段的下一步（不调用 LLM，同步与异步路由共用）
+    :return: (action, value)。action 为 "reply" 时 value 为直接回复的文本；
+             为 "summon" 时 value 为用户输入的偶像名字
+    """
+    step = session.transition_step or "ASK_MORE"
+    if step == "ASK_MORE":
+        intent = intent_classifier.classify(content)
+        if intent.negative:
+            return "reply", "明白。我会把这次占卜先放在这里。如果你之后想继续聊聊或需要一点陪伴，随时告诉我。"
+        if intent.affirmative:
+            session.transition_step = "ASK_IDOL"
+            return "reply", "好的。我可以陪你聊聊。你想选择哪位公众人物作为“虚拟偶像疗愈师”？\n\n提示：这是虚拟 AI 人设，不是真人，仅供娱乐与情绪陪伴。"
+        if intent.looks_like_name:
+            return "summon", content
+        return "reply", "我在这里。如果你愿意继续，我可以陪你聊聊。\n\n你想要更多建议或陪伴吗？如果想的话，回复“需要”；如果不想，回复“不需要”。"
+    if step == "ASK_IDOL":
+        return "summon", content
+    session.transition_step = "ASK_MORE"
+    return "reply", "如果你愿意继续，我可以陪你聊聊。想要吗？"
+
+def summon_failed_reply(step, content, error):
+    """
+    召唤偶像失败时的回复
+    :param step: 收到消息时所处的过渡步骤
+    """
+    if step == "ASK_MORE":
+        app.logger.error(f"Error in ASK_MORE direct idol summon: {str(error)}")
+        return "我明白你想直接召唤一位疗愈师。你可以再把名字发一次吗？"
+    idol_name = normalize_idol_name(content)
+    app.logger.error(f"Error in ASK_IDOL phase: {str(error)}")
+    import traceback
+    traceback.print_exc()
+    return f"抱歉，我暂时没法生成“{idol_name}”的虚拟人设。请稍后再试，或者换一个名字。"
+
+def apply_persona(session, persona_config):
+    """
+    绑定动态 Persona 并进入偶像聊天阶段，返回召唤提示语
+    """
+    session.persona_config = persona_config
+    session.prompt_prefix = None
+    session.idol_id = "dynamic_idol"
+    session.transition_step = None
+    session.set_state(session.STATE_IDOL_CHAT)
+    return f"✨ 正在为您召唤 {persona_config.get('name')} AI 疗愈师...\n提示：此“疗愈师”为虚拟 AI 人设，并非偶像真人，仅供娱乐与情绪陪伴。\n\n"
+
+SUMMON_HEADER_PATTERN = re.compile(r"^✨ 正在为您召唤 .*?\n\n", re.DOTALL)
+
+def mark_translatable(session, message):
+    """
+    惰性翻译模式下，把需要翻译的偶像回复标记为可翻译（翻译在首次请求时生成）
+    """
+    if (TRANSLATION_MODE == "lazy" and session.current_state == session.STATE_IDOL_CHAT
+            and session.persona_config and idol_chat_service.needs_translation(session.persona_config)):
+        session.update_message(message, translatable=True)
+    return message
+
+def translation_source(message):
+    """
+    需要翻译的文本：去掉召唤提示语，只保留偶像的回复
+    """
+    return SUMMON_HEADER_PATTERN.sub("", message.content, count=1)
+
+def format_idol_reply(idol_response):
+    """
+    拼接偶像回复与翻译
+    """
+    response_text = idol_response["persona_reply"]
+    if idol_response.get("translation"):
+        response_text += f"\n\n[翻译]\n{idol_response['translation']}"
+    return response_text
+
+def _process_chat_turn(session, content, stream=False):
+    """
+    处理一轮对话的状态机（生成器）
+    逐段产出可以立即展示给用户的文本增量，结束时返回需要持久化的完整回复。
+    stream=False 时 LLM 以非流式调用，只在结束时一次性得到结果。
+    """
+    session_id = session.session_id
+    current_state = session.current_state
+
+    if current_state == session.STATE_DIVINATION:
+        app.logger.info("DIVINATION input session=%s content=%s", session_id, content)
+        divination_type = idol_chat_service.detect_divination_intent(content) or "general"
+        if stream:
+            # 流式阶段产出去掉标签的增量，最终回复以格式化后的结果为准
+            result = yield from divination_service.stream_divination(None, divination_type, content, None)
+        else:
+            result = divination_service.generate_divination(None, divination_type, content, None)
+            yield result
+        app.logger.info("DIVINATION output session=%s result=%s", session_id, str(result)[:800])
+        session.add_divination(divination_type, content, result)
+        session.set_state(session.STATE_TRANSITION)
+        session.transition_step = "ASK_MORE"
+        return result
+
+    if current_state == session.STATE_TRANSITION:
+        step = session.transition_step or "ASK_MORE"
+        action, value = plan_transition(session, content)
+        if action == "summon":
+            idol_name = normalize_idol_name(value)
+            if not idol_name:
+                response_content = "你想召唤谁？直接把名字发给我就好。"
+            else:
+                try:
+                    persona_config = idol_chat_service.generate_persona_profile(idol_name)
+                    header = apply_persona(session, persona_config)
+                    yield header
+                    idol_response = yield from _idol_reply(session, persona_config, stream)
+                    return header + idol_response
+                except Exception as e:
+                    response_content = summon_failed_reply(step, content, e)
+        else:
+            response_content = value
+
+    elif current_state == session.STATE_IDOL_CHAT:
+        if not session.persona_config:
+            session.set_state(session.STATE_TRANSITION)
+            response_content = "系统错误：未找到偶像配置。请重新输入偶像名字。"
+        else:
+            return (yield from _idol_reply(session, session.persona_config, stream))
+    else:
+        response_content = ""
+
+    yield response_content
+    return response_content
+
+def _idol_reply(session, idol_info, stream):
+    """
+    生成偶像回复（生成器），非中文/英文母语时在回复后附带中文翻译
+    """
+    translate = TRANSLATION_MODE == "eager" and idol_chat_service.needs_translation(idol_info)
+    if stream:
+        idol_response = yield from idol_chat_service.stream_idol_response(idol_info, session, translate=translate)
+    else:
+        idol_response = idol_chat_service.generate_idol_response(idol_info, session, translate=translate)
+        yield idol_response["persona_reply"]
+
+    if idol_response.get("translation"):
+        yield f"\n\n[翻译]\n{idol_response['translation']}"
+    return format_idol_reply(idol_response)
+
+# 启动时在后台预热热门偶像的 Persona（PERSONA_PREWARM_NAMES）
+_prewarm_names = [name for name in (normalize_idol_name(n) for n in prewarm_names_from_env()) if name]
+if _prewarm_names:
+    idol_chat_service.prewarm_persona_profiles(_prewarm_names)
+
 # 发送消息
 @app.route(f'{api_prefix}/chat/<session_id>', methods=['POST'])
 def send_message(session_id):
@@ -96,149 +375,160 @@ def send_message(session_id):
     
     if not content:
         return jsonify({"error": "消息内容不能为空", "code": 400}), 400
-    
+
+    try:
+        with edit_session(session_id) as session:
+            if not session:
+                return jsonify({"error": "会话不存在", "code": 404}), 404
+
+            # 添加用户消息
+            session.add_message("user", content)
+
+            try:
+                response_content = _run_to_completion(_process_chat_turn(session, content))
+
+                # 添加系统/偶像消息
+                idol_message = mark_translatable(session, session.add_message("idol", response_content))
+                return jsonify({
+                    "session_id": session_id,
+                    "message": idol_message.to_dict(),
+                    "state": session.current_state # 返回当前状态方便前端处理
+                })
+
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                return jsonify({"error": str(e), "code": 500}), 500
+    except SessionBusyError:
+        return jsonify({"error": SESSION_BUSY_MESSAGE, "code": 409}), 409
+
+def _sse_event(event, payload):
+    """
+    序列化一条 Server-Sent Event
+    """
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+# 流式发送消息
+@app.route(f'{api_prefix}/chat/<session_id>/stream', methods=['POST'])
+def stream_message(session_id):
+    """
+    发送聊天消息，以 Server-Sent Events 逐段返回回复
+    事件：delta（文本增量）、done（持久化后的完整消息与状态）、error
+    """
+    data = request.get_json()
+    content = data.get('content')
+
+    if not content:
+        return jsonify({"error": "消息内容不能为空", "code": 400}), 400
+
     # 获取会话
-    session = session_manager.get_session(session_id)
-    if not session:
+    if not session_manager.get_session(session_id):
         return jsonify({"error": "会话不存在", "code": 404}), 404
-    
-    # 添加用户消息
-    session.add_message("user", content)
-    
-    try:
-        response_content = ""
-        current_state = session.current_state
-        
-        if current_state == session.STATE_DIVINATION:
-            app.logger.info("DIVINATION input session=%s content=%s", session_id, content)
-            divination_type = idol_chat_service.detect_divination_intent(content) or "general"
-            result = divination_service.generate_divination(None, divination_type, content, None)
-            app.logger.info("DIVINATION output session=%s result=%s", session_id, str(result)[:800])
-            session.add_divination(divination_type, content, result)
-            session.set_state(session.STATE_TRANSITION)
-            session.transition_step = "ASK_MORE"
-            response_content = result
-            
-        elif current_state == session.STATE_TRANSITION:
-            step = session.transition_step or "ASK_MORE"
-
-            def is_negative(text):
-                negative_keywords = ["不需要", "不用", "不要", "算了", "不想", "没事", "不了", "先不用"]
-                return any(k in text for k in negative_keywords)
-
-            def is_affirmative(text):
-                affirmative_keywords = ["需要", "想", "要", "好的", "好", "可以", "嗯", "想聊", "陪伴", "请"]
-                return any(k in text for k in affirmative_keywords) and not is_negative(text)
-
-            def normalize_idol_name(text):
-                t = (text or "").strip()
-                t = t.strip(" \t\r\n\"'“”‘’")
-                t = re.sub(r"^(我想|想|我要|要|请|帮我|给我|召唤|召请|请你召唤|请召唤)[：:\s]*", "", t)
-                t = re.sub(r"^(一位|一个)?(虚拟)?(偶像)?(疗愈师)?[：:\s]*", "", t)
-                return t.strip()
-
-            def looks_like_name(text):
-                t = normalize_idol_name(text)
-                if not t:
-                    return False
-                if any(k in t for k in ["占卜", "问题", "建议", "陪伴", "聊聊", "需要", "不需要", "不用", "不要"]):
-                    return False
-                if re.fullmatch(r"[A-Za-z][A-Za-z .'\-]{1,39}", t):
-                    return True
-                if re.fullmatch(r"[\u4e00-\u9fff·\s]{2,20}", t):
-                    return True
-                return False
-
-            def summon_idol(idol_name_raw):
-                idol_name = normalize_idol_name(idol_name_raw)
-                if not idol_name:
-                    return "你想召唤谁？直接把名字发给我就好。"
-
-                persona_config = idol_chat_service.generate_persona_profile(idol_name)
-                session.persona_config = persona_config
-                session.idol_id = "dynamic_idol"
-                session.transition_step = None
-                session.set_state(session.STATE_IDOL_CHAT)
-
-                lang = (persona_config.get("default_language", "zh") or "zh").lower()
-                need_translation = lang not in ["zh", "zh-cn", "chinese", "en", "english"]
-                idol_response = idol_chat_service.generate_idol_response(persona_config, session, translate=need_translation)
-                response_text = f"✨ 正在为您召唤 {idol_name} AI 疗愈师...\n提示：此“疗愈师”为虚拟 AI 人设，并非偶像真人，仅供娱乐与情绪陪伴。\n\n" + idol_response["persona_reply"]
-                if idol_response.get("translation"):
-                    response_text += f"\n\n[翻译]\n{idol_response['translation']}"
-                return response_text
-
-            if step == "ASK_MORE":
-                if is_negative(content):
-                    response_content = "明白。我会把这次占卜先放在这里。如果你之后想继续聊聊或需要一点陪伴，随时告诉我。"
-                elif is_affirmative(content):
-                    session.transition_step = "ASK_IDOL"
-                    response_content = "好的。我可以陪你聊聊。你想选择哪位公众人物作为“虚拟偶像疗愈师”？\n\n提示：这是虚拟 AI 人设，不是真人，仅供娱乐与情绪陪伴。"
-                elif looks_like_name(content):
-                    try:
-                        response_content = summon_idol(content)
-                    except Exception as e:
-                        app.logger.error(f"Error in ASK_MORE direct idol summon: {str(e)}")
-                        response_content = "我明白你想直接召唤一位疗愈师。你可以再把名字发一次吗？"
-                else:
-                    response_content = "我在这里。如果你愿意继续，我可以陪你聊聊。\n\n你想要更多建议或陪伴吗？如果想的话，回复“需要”；如果不想，回复“不需要”。"
-            elif step == "ASK_IDOL":
+
+    def generate():
+        # 会话锁在生成器内获取：响应开始输出后才持有，客户端断开时随生成器关闭释放
+        done = None
+        try:
+            with edit_session(session_id) as session:
+                if not session:
+                    yield _sse_event("error", {"error": "会话不存在", "code": 404})
+                    return
+
+                # 添加用户消息
+                session.add_message("user", content)
                 try:
-                    response_content = summon_idol(content)
+                    turn = _process_chat_turn(session, content, stream=True)
+                    while True:
+                        try:
+                            delta = next(turn)
+                        except StopIteration as stop:
+                            response_content = stop.value
+                            break
+                        if delta:
+                            yield _sse_event("delta", {"content": delta})
+
+                    # 流结束后再持久化完整消息
+                    idol_message = mark_translatable(session, session.add_message("idol", response_content))
+                    done = {
+                        "session_id": session_id,
+                        "message": idol_message.to_dict(),
+                        "state": session.current_state
+                    }
                 except Exception as e:
-                    idol_name = normalize_idol_name(content)
-                    app.logger.error(f"Error in ASK_IDOL phase: {str(e)}")
                     import traceback
                     traceback.print_exc()
-                    response_content = f"抱歉，我暂时没法生成“{idol_name}”的虚拟人设。请稍后再试，或者换一个名字。"
-            else:
-                session.transition_step = "ASK_MORE"
-                response_content = "如果你愿意继续，我可以陪你聊聊。想要吗？"
+                    yield _sse_event("error", {"error": str(e), "code": 500})
+        except SessionBusyError:
+            # 包括共享模式下提交时的版本冲突：回复没有写入，不发送 done
+            yield _sse_event("error", {"error": SESSION_BUSY_MESSAGE, "code": 409})
+            return
 
-        elif current_state == session.STATE_IDOL_CHAT:
-            if not session.persona_config:
-                session.set_state(session.STATE_TRANSITION)
-                response_content = "系统错误：未找到偶像配置。请重新输入偶像名字。"
-            else:
-                idol_info = session.persona_config
-                lang = idol_info.get("default_language", "zh").lower()
-                need_translation = lang not in ["zh", "zh-cn", "chinese", "en", "english"]
-                idol_response = idol_chat_service.generate_idol_response(idol_info, session, translate=need_translation)
-                response_content = idol_response['persona_reply']
-                if idol_response.get('translation'):
-                    response_content += f"\n\n[翻译]\n{idol_response['translation']}"
-
-        # 添加系统/偶像消息
-        idol_message = session.add_message("idol", response_content)
-        return jsonify({
-            "session_id": session_id,
-            "message": idol_message.to_dict(),
-            "state": session.current_state # 返回当前状态方便前端处理
-        })
-        
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return jsonify({"error": str(e), "code": 500}), 500
+        # edit_session 退出时已经提交，提交成功后才告诉客户端消息已持久化
+        if done is not None:
+            yield _sse_event("done", done)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
 
 # 获取消息历史
 @app.route(f'{api_prefix}/chat/<session_id>/messages', methods=['GET'])
 def get_messages(session_id):
     """
-    获取消息历史
+    获取消息历史，支持 since 增量同步、fields 字段投影，
+    以及 ETag：消息没有变化时对 If-None-Match 返回 304，不再序列化
     """
     session = session_manager.get_session(session_id)
     if not session:
         return jsonify({"error": "会话不存在", "code": 404}), 404
-    
-    # 获取分页参数
-    limit = request.args.get('limit', default=20, type=int)
-    offset = request.args.get('offset', default=0, type=int)
-    
-    messages = session.messages[offset:offset+limit]
+
+    etag = session.messages_etag()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        try:
+            response = jsonify(message_history_payload(session, request.args))
+        except ValueError as e:
+            return jsonify({"error": str(e), "code": 400}), 400
+    response.set_etag(etag)
+    # 要求浏览器每次都带 If-None-Match 重新验证，而不是直接使用缓存
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+# 获取消息的中文翻译（惰性生成）
+@app.route(f'{api_prefix}/chat/<session_id>/messages/<message_id>/translation', methods=['GET'])
+def get_message_translation(session_id, message_id):
+    """
+    获取偶像回复的中文翻译：首次请求时生成并保存在消息上，之后直接返回保存的结果
+    """
+    session = session_manager.get_session(session_id)
+    if not session:
+        return jsonify({"error": "会话不存在", "code": 404}), 404
+
+    message = session.get_message(message_id)
+    if not message:
+        return jsonify({"error": "消息不存在", "code": 404}), 404
+    if not message.translatable:
+        return jsonify({"error": "该消息不需要翻译", "code": 400}), 400
+
+    try:
+        if message.translation is None:
+            # 同一条消息的并发请求只生成一次翻译：拿到锁后再检查一次
+            with edit_session(session_id) as session:
+                message = session.get_message(message_id) if session else None
+                if message is not None and message.translation is None:
+                    session.update_message(message, translation=idol_chat_service.translate_reply(session.persona_config, translation_source(message)))
+    except SessionBusyError:
+        return jsonify({"error": SESSION_BUSY_MESSAGE, "code": 409}), 409
+    except Exception as e:
+        app.logger.error(f"Translation failed: {str(e)}")
+        return jsonify({"error": str(e), "code": 500}), 500
+    if message is None:
+        return jsonify({"error": "消息不存在", "code": 404}), 404
+
     return jsonify({
         "session_id": session_id,
-        "messages": [msg.to_dict() for msg in messages]
+        "message_id": message_id,
+        "translation": message.translation
     })
 
 # 请求占卜
@@ -262,10 +552,19 @@ def request_divination(session_id):
     if divination_type not in valid_types:
         return jsonify({"error": "无效的占卜类型", "code": 400}), 400
     
-    # 获取会话
-    session = session_manager.get_session(session_id)
+    try:
+        with edit_session(session_id) as session:
+            return _run_divination(session, divination_type, question)
+    except SessionBusyError:
+        return jsonify({"error": SESSION_BUSY_MESSAGE, "code": 409}), 409
+
+def _run_divination(session, divination_type, question):
+    """
+    生成占卜结果并写入会话（调用方通过 edit_session 持有会话锁）
+    """
     if not session:
         return jsonify({"error": "会话不存在", "code": 404}), 404
+    session_id = session.session_id
 
     # 生成占卜结果
     try:
@@ -315,6 +614,26 @@ def get_divination_history(session_id):
         "divinations": [div.to_dict() for div in divinations]
     })
 
+# 运行指标
+@app.route(f'{api_prefix}/metrics', methods=['GET'])
+def get_metrics():
+    """
+    获取运行指标（缓存命中等）
+    """
+    return jsonify({
+        "llm_cache": response_cache.stats(),
+        "persona_cache": persona_cache.stats(),
+        "llm_single_flight": llm_client.single_flight.stats() if llm_client.single_flight else None,
+        "llm_resilience": llm_client.resilience_stats(),
+        "llm_prompt_cache": llm_client.prompt_cache_stats.stats(),
+        "idol_translation": idol_chat_service.translation_stats(),
+        "idol_memory": idol_chat_service.conversation_memory.stats(),
+        "session_locks": session_locks.stats(),
+        "safety_filter": safety_filter.stats(),
+        "reply_safety_filter": reply_safety_filter.stats(),
+        "sessions": session_manager.stats()
+    })
+
 # 提供前端静态文件（用于 Docker 部署）
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -0,0 +1,323 @@
+"""
+异步服务入口（aiohttp）
+
+与 app.py 共用会话管理器和状态机规则，但聊天与占卜路由以协程方式调用 LLM：
+一次 LLM 等待不再占用一个工作线程，大量在途请求在同一个事件循环内复用，
+整体并发由 AsyncLLMClient 的全局信号量（LLM_MAX_CONCURRENCY）约束。
+
+会话管理器在共享模式或配置了存储时会同步读写数据库，这些调用统一经 asyncio.to_thread 放到线程池执行，
+不阻塞事件循环。
+
+启动：python async_app.py
+"""
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from aiohttp import web
+from app import (
+    session_manager,
+    session_locks,
+    SESSION_BUSY_MESSAGE,
+    list_user_sessions_payload,
+    message_history_payload,
+    parse_fields,
+    plan_transition,
+    normalize_idol_name,
+    summon_failed_reply,
+    apply_persona,
+    format_idol_reply,
+    mark_translatable,
+    translation_source,
+    TRANSLATION_MODE,
+)
+from models.chat_session import SESSION_FIELDS
+from models.session_locks import SessionBusyError
+from services.idol_chat_service import idol_chat_service
+from services.divination_service import divination_service
+from services.async_llm_client import async_llm_client
+
+logger = logging.getLogger(__name__)
+
+# API路由前缀
+api_prefix = '/api'
+
+routes = web.RouteTableDef()
+
+def _error(message, code):
+    return web.json_response({"error": message, "code": code}, status=code)
+
+@asynccontextmanager
+async def edit_session(session_id):
+    """
+    与 app.edit_session 相同：持有会话锁（协程版本）并加载会话，退出时提交修改
+    """
+    async with session_locks.ahold(session_id):
+        session = await asyncio.to_thread(session_manager.get_session, session_id)
+        try:
+            yield session
+        finally:
+            if session is not None:
+                await asyncio.to_thread(session_manager.commit, session)
+
+async def _read_json(request):
+    try:
+        return await request.json()
+    except Exception:
+        return {}
+
+# 创建会话
+@routes.post(f'{api_prefix}/sessions')
+async def create_session(request):
+    """
+    创建聊天会话
+    """
+    data = await _read_json(request)
+    idol_id = data.get('idol_id')
+    user_id = data.get('user_id')
+
+    if idol_id:
+        if not idol_chat_service.get_idol_info(idol_id):
+            return _error("偶像不存在", 404)
+
+    session = await asyncio.to_thread(session_manager.create_session, idol_id, user_id)
+    return web.json_response(session.to_dict(), status=201)
+
+# 获取会话
+@routes.get(f'{api_prefix}/sessions/{{session_id}}')
+async def get_session(request):
+    """
+    获取聊天会话，fields 参数与 app.get_session 一致
+    """
+    session = await asyncio.to_thread(session_manager.get_session, request.match_info['session_id'])
+    if not session:
+        return _error("会话不存在", 404)
+    try:
+        fields = parse_fields(request.query.get('fields'), SESSION_FIELDS)
+    except ValueError as e:
+        return _error(str(e), 400)
+    return web.json_response(session.to_dict(fields))
+
+# 用户的会话列表
+@routes.get(f'{api_prefix}/users/{{user_id}}/sessions')
+async def list_user_sessions(request):
+    """
+    分页列出用户的会话摘要（不含消息）
+    """
+    try:
+        payload = await asyncio.to_thread(list_user_sessions_payload, request.match_info['user_id'], request.query)
+        return web.json_response(payload)
+    except ValueError:
+        return _error("分页参数错误", 400)
+
+async def _idol_reply(session, idol_info):
+    idol_response = await idol_chat_service.agenerate_idol_response(
+        idol_info, session, translate=TRANSLATION_MODE == "eager" and idol_chat_service.needs_translation(idol_info)
+    )
+    return format_idol_reply(idol_response)
+
+async def _process_chat_turn(session, content):
+    """
+    处理一轮对话的状态机，规则与 app._process_chat_turn 一致
+    """
+    current_state = session.current_state
+
+    if current_state == session.STATE_DIVINATION:
+        logger.info("DIVINATION input session=%s content=%s", session.session_id, content)
+        divination_type = idol_chat_service.detect_divination_intent(content) or "general"
+        result = await divination_service.agenerate_divination(None, divination_type, content, None)
+        session.add_divination(divination_type, content, result)
+        session.set_state(session.STATE_TRANSITION)
+        session.transition_step = "ASK_MORE"
+        return result
+
+    if current_state == session.STATE_TRANSITION:
+        step = session.transition_step or "ASK_MORE"
+        action, value = plan_transition(session, content)
+        if action == "reply":
+            return value
+        idol_name = normalize_idol_name(value)
+        if not idol_name:
+            return "你想召唤谁？直接把名字发给我就好。"
+        try:
+            persona_config = await idol_chat_service.agenerate_persona_profile(idol_name)
+            header = apply_persona(session, persona_config)
+            return header + await _idol_reply(session, persona_config)
+        except Exception as e:
+            return summon_failed_reply(step, content, e)
+
+    if current_state == session.STATE_IDOL_CHAT:
+        if not session.persona_config:
+            session.set_state(session.STATE_TRANSITION)
+            return "系统错误：未找到偶像配置。请重新输入偶像名字。"
+        return await _idol_reply(session, session.persona_config)
+
+    return ""
+
+# 发送消息
+@routes.post(f'{api_prefix}/chat/{{session_id}}')
+async def send_message(request):
+    """
+    发送聊天消息，处理不同阶段的逻辑
+    """
+    session_id = request.match_info['session_id']
+    data = await _read_json(request)
+    content = data.get('content')
+
+    if not content:
+        return _error("消息内容不能为空", 400)
+
+    try:
+        async with edit_session(session_id) as session:
+            if not session:
+                return _error("会话不存在", 404)
+
+            session.add_message("user", content)
+
+            try:
+                response_content = await _process_chat_turn(session, content)
+                idol_message = mark_translatable(session, session.add_message("idol", response_content))
+                return web.json_response({
+                    "session_id": session_id,
+                    "message": idol_message.to_dict(),
+                    "state": session.current_state
+                })
+            except Exception as e:
+                logger.exception("async chat failed session=%s", session_id)
+                return _error(str(e), 500)
+    except SessionBusyError:
+        return _error(SESSION_BUSY_MESSAGE, 409)
+
+# 获取消息历史
+@routes.get(f'{api_prefix}/chat/{{session_id}}/messages')
+async def get_messages(request):
+    """
+    获取消息历史，since / fields / ETag 的规则与 app.get_messages 一致
+    """
+    session = await asyncio.to_thread(session_manager.get_session, request.match_info['session_id'])
+    if not session:
+        return _error("会话不存在", 404)
+
+    etag = session.messages_etag()
+    if any(tag.value == etag for tag in request.if_none_match or ()):
+        response = web.Response(status=304)
+    else:
+        try:
+            response = web.json_response(message_history_payload(session, request.query))
+        except ValueError as e:
+            return _error(str(e), 400)
+    response.etag = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+# 获取消息的中文翻译（惰性生成）
+@routes.get(f'{api_prefix}/chat/{{session_id}}/messages/{{message_id}}/translation')
+async def get_message_translation(request):
+    """
+    获取偶像回复的中文翻译，规则与 app.get_message_translation 一致
+    """
+    session_id = request.match_info['session_id']
+    message_id = request.match_info['message_id']
+
+    session = await asyncio.to_thread(session_manager.get_session, session_id)
+    if not session:
+        return _error("会话不存在", 404)
+
+    message = session.get_message(message_id)
+    if not message:
+        return _error("消息不存在", 404)
+    if not message.translatable:
+        return _error("该消息不需要翻译", 400)
+
+    try:
+        if message.translation is None:
+            async with edit_session(session_id) as session:
+                message = session.get_message(message_id) if session else None
+                if message is not None and message.translation is None:
+                    session.update_message(message, translation=await idol_chat_service.atranslate_reply(session.persona_config, translation_source(message)))
+    except SessionBusyError:
+        return _error(SESSION_BUSY_MESSAGE, 409)
+    except Exception as e:
+        logger.exception("async translation failed session=%s", session_id)
+        return _error(str(e), 500)
+    if message is None:
+        return _error("消息不存在", 404)
+
+    return web.json_response({
+        "session_id": session_id,
+        "message_id": message_id,
+        "translation": message.translation
+    })
+
+# 请求占卜
+@routes.post(f'{api_prefix}/divination/{{session_id}}')
+async def request_divination(request):
+    """
+    请求占卜服务
+    """
+    session_id = request.match_info['session_id']
+    data = await _read_json(request)
+    divination_type = data.get('type')
+    question = data.get('question')
+
+    if not divination_type:
+        return _error("缺少占卜类型", 400)
+
+    if not question:
+        return _error("缺少占卜问题", 400)
+
+    valid_types = ['love', 'career', 'fortune', 'study']
+    if divination_type not in valid_types:
+        return _error("无效的占卜类型", 400)
+
+    try:
+        async with edit_session(session_id) as session:
+            return await _run_divination(session, divination_type, question)
+    except SessionBusyError:
+        return _error(SESSION_BUSY_MESSAGE, 409)
+
+async def _run_divination(session, divination_type, question):
+    """
+    生成占卜结果并写入会话（调用方通过 edit_session 持有会话锁）
+    """
+    if not session:
+        return _error("会话不存在", 404)
+    session_id = session.session_id
+
+    try:
+        was_divination = session.current_state == session.STATE_DIVINATION
+        result = await divination_service.agenerate_divination(None, divination_type, question, None)
+
+        divination = session.add_divination(divination_type, question, result)
+        if was_divination:
+            session.set_state(session.STATE_TRANSITION)
+            session.transition_step = "ASK_MORE"
+
+        session.add_message("user", f"请求{divination_type}占卜：{question}")
+        session.add_message("idol", result)
+
+        return web.json_response({
+            "session_id": session_id,
+            "divination": divination.to_dict(),
+            "state": session.current_state,
+            "transition_step": session.transition_step
+        })
+    except Exception as e:
+        return _error(str(e), 500)
+
+async def _close_llm_client(app):
+    await async_llm_client.close()
+
+def create_app():
+    """
+    创建 aiohttp 应用
+    """
+    app = web.Application()
+    app.add_routes(routes)
+    app.on_cleanup.append(_close_llm_client)
+    return app
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    port = int(os.getenv('ASYNC_PORT', '5001'))
+    web.run_app(create_app(), port=port, host='0.0.0.0')
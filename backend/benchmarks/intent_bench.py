@@ -0,0 +1,99 @@
+"""
+意图识别的微基准：单次扫描的自动机与原先逐个关键词判断的每条消息耗时对比
+
+原先的实现保留在本文件中作为对照，同时校验两者对样例消息的结论一致。
+
+在 backend 目录下运行：
+    python -m benchmarks.intent_bench --iterations 20000
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.intent_classifier import DEFAULT_KEYWORD_TABLES, intent_classifier
+
+SAMPLE_MESSAGES = [
+    "我最近的事业怎么样？",
+    "需要",
+    "不需要了，谢谢",
+    "Taylor Swift",
+    "周杰伦",
+    "召唤：一位虚拟偶像 IU",
+    "我想聊聊最近的压力，感情上也有点迷茫",
+    "今天有点累，想和你聊聊",
+]
+
+
+def legacy_classify(text):
+    """
+    原先的实现：每个判断各自遍历关键词表，正则在调用时解析
+    """
+    tables = DEFAULT_KEYWORD_TABLES
+
+    def is_negative(t):
+        return any(k in t for k in tables["negative"])
+
+    def normalize_idol_name(t):
+        t = (t or "").strip()
+        t = t.strip(" \t\r\n\"'“”‘’")
+        t = re.sub(r"^(我想|想|我要|要|请|帮我|给我|召唤|召请|请你召唤|请召唤)[：:\s]*", "", t)
+        t = re.sub(r"^(一位|一个)?(虚拟)?(偶像)?(疗愈师)?[：:\s]*", "", t)
+        return t.strip()
+
+    def looks_like_name(t):
+        t = normalize_idol_name(t)
+        if not t or any(k in t for k in tables["not_name"]):
+            return False
+        return bool(re.fullmatch(r"[A-Za-z][A-Za-z .'\-]{1,39}", t) or re.fullmatch(r"[\u4e00-\u9fff·\s]{2,20}", t))
+
+    divination_type = None
+    lowered = text.lower()
+    for div_type, keywords in tables["divination"].items():
+        if any(k in lowered for k in keywords):
+            divination_type = div_type
+            break
+    negative = is_negative(text)
+    return (divination_type, negative, any(k in text for k in tables["affirmative"]) and not negative,
+            normalize_idol_name(text), looks_like_name(text))
+
+
+def time_per_message(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for message in SAMPLE_MESSAGES:
+            func(message)
+    return (time.perf_counter() - start) / (iterations * len(SAMPLE_MESSAGES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="意图识别微基准")
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    for message in SAMPLE_MESSAGES:
+        if tuple(intent_classifier.classify(message)) != legacy_classify(message):
+            raise RuntimeError(f"结论不一致: {message}")
+
+    results = {
+        "messages": len(SAMPLE_MESSAGES),
+        "classifier_us": time_per_message(intent_classifier.classify, args.iterations) * 1e6,
+        "legacy_us": time_per_message(legacy_classify, args.iterations) * 1e6
+    }
+    results["speedup"] = results["legacy_us"] / results["classifier_us"]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"自动机单次扫描: {results['classifier_us']:.2f}µs/条")
+    print(f"逐个关键词判断: {results['legacy_us']:.2f}µs/条")
+    print(f"加速比: {results['speedup']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
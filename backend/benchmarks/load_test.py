@@ -0,0 +1,274 @@
+"""
+三阶段对话流程（DIVINATION → TRANSITION → IDOL_CHAT）的压测脚本
+
+启动本地模拟 LLM 服务，把 LLM 客户端指向它，再用 N 个并发的模拟用户
+通过真实的 HTTP 路由走完整个流程，按阶段统计吞吐量与 p50/p95/p99 延迟。
+
+在 backend 目录下运行：
+    python -m benchmarks.load_test --users 200 --concurrency 50
+    python -m benchmarks.load_test --target async --latency lognormal:1.5:0.6 --error-rate 0.05
+    python -m benchmarks.load_test --stream --chat-turns 5
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_llm_server import MockLLMServer
+
+STAGES = ["create_session", "divination", "transition", "summon", "idol_chat"]
+
+
+def percentile(samples, p):
+    """
+    最近秩法计算百分位数
+    :param samples: 已排序的样本
+    """
+    if not samples:
+        return None
+    index = min(len(samples) - 1, max(0, int(round(p / 100.0 * len(samples))) - 1))
+    return samples[index]
+
+
+class StageRecorder:
+    """线程安全地记录每个阶段每次请求的耗时与成败"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.first_byte = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, stage, seconds, ok, first_byte=None):
+        with self._lock:
+            if ok:
+                self.latencies[stage].append(seconds)
+                if first_byte is not None:
+                    self.first_byte[stage].append(first_byte)
+            else:
+                self.errors[stage] += 1
+
+    def summary(self, elapsed):
+        """
+        :param elapsed: 整个压测的墙钟时间（秒），用于计算吞吐量
+        :return: { stage: {count, errors, error_rate, throughput, p50, p95, p99, ttfb_p50, ...} }
+        """
+        result = {}
+        for stage in STAGES:
+            samples = sorted(self.latencies.get(stage, []))
+            errors = self.errors.get(stage, 0)
+            total = len(samples) + errors
+            if not total:
+                continue
+            row = {
+                "count": len(samples),
+                "errors": errors,
+                "error_rate": errors / total,
+                "throughput": len(samples) / elapsed if elapsed else 0.0,
+                "mean": sum(samples) / len(samples) if samples else None,
+                "p50": percentile(samples, 50),
+                "p95": percentile(samples, 95),
+                "p99": percentile(samples, 99)
+            }
+            ttfb = sorted(self.first_byte.get(stage, []))
+            if ttfb:
+                row["ttfb_p50"] = percentile(ttfb, 50)
+                row["ttfb_p95"] = percentile(ttfb, 95)
+                row["ttfb_p99"] = percentile(ttfb, 99)
+            result[stage] = row
+        return result
+
+
+class SimulatedUser:
+    """
+    一个模拟用户：创建会话 → 占卜 → 回复“需要” → 输入偶像名字 → 聊若干轮
+    """
+
+    def __init__(self, base_url, http, recorder, index, idol_name, chat_turns, stream):
+        self.base_url = base_url
+        self.http = http
+        self.recorder = recorder
+        self.index = index
+        self.idol_name = idol_name
+        self.chat_turns = chat_turns
+        self.stream = stream
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            response = self.http.post(f"{self.base_url}/api/sessions", json={"user_id": f"load_user_{self.index}"}, timeout=30)
+            response.raise_for_status()
+            session_id = response.json()["session_id"]
+        except Exception:
+            self.recorder.record("create_session", time.perf_counter() - start, False)
+            return
+        self.recorder.record("create_session", time.perf_counter() - start, True)
+
+        # 每个用户的问题不同，避免所有占卜都命中响应缓存
+        steps = [
+            ("divination", f"第{self.index}号用户：我最近的事业怎么样？"),
+            ("transition", "需要"),
+            ("summon", self.idol_name),
+        ]
+        steps += [("idol_chat", f"今天有点累，想和你聊聊（第{turn + 1}轮）") for turn in range(self.chat_turns)]
+        for stage, content in steps:
+            if not self.send(session_id, stage, content):
+                return
+
+    def send(self, session_id, stage, content):
+        """
+        发送一条消息并记录耗时；流式模式下同时记录首字节时间
+        :return: 是否成功（失败后该用户停止后续阶段）
+        """
+        path = f"/api/chat/{session_id}/stream" if self.stream else f"/api/chat/{session_id}"
+        start = time.perf_counter()
+        first_byte = None
+        ok = False
+        try:
+            with self.http.post(f"{self.base_url}{path}", json={"content": content}, timeout=300, stream=self.stream) as response:
+                if self.stream:
+                    last_event = None
+                    for line in response.iter_lines(decode_unicode=True):
+                        if first_byte is None:
+                            first_byte = time.perf_counter() - start
+                        if line and line.startswith("event: "):
+                            last_event = line[len("event: "):]
+                    ok = response.status_code == 200 and last_event == "done"
+                else:
+                    ok = response.status_code == 200 and "message" in response.json()
+        except Exception:
+            ok = False
+        self.recorder.record(stage, time.perf_counter() - start, ok, first_byte)
+        return ok
+
+
+def start_flask_app():
+    """
+    在后台线程中以多线程模式启动 Flask 应用，返回 (base_url, server)
+    """
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def start_async_app():
+    """
+    在后台线程的事件循环中启动 aiohttp 应用，返回 (base_url, runner)
+    """
+    from aiohttp import web
+    from async_app import create_app
+
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(create_app())
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return f"http://127.0.0.1:{port}", runner
+
+
+def configure_llm_env(mock_url):
+    """
+    把 LLM 客户端指向模拟服务；必须在导入 app 之前调用（客户端在导入时读取配置）
+    """
+    os.environ["DEEPSEEK_API_URL"] = f"{mock_url}/chat/completions"
+    os.environ["DEEPSEEK_API_KEY"] = os.environ.get("DEEPSEEK_API_KEY") or "mock-key"
+    os.environ["OPENAI_API_BASE"] = f"{mock_url}/v1"
+    os.environ["DEFAULT_MODEL"] = "deepseek-chat"
+
+
+def run_load(base_url, users, concurrency, idol_names, chat_turns, stream):
+    """
+    用 concurrency 个线程并发驱动 users 个模拟用户
+    :return: (StageRecorder, 墙钟时间)
+    """
+    recorder = StageRecorder()
+    http = requests.Session()
+    http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=concurrency))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i in range(users):
+            user = SimulatedUser(base_url, http, recorder, i, idol_names[i % len(idol_names)], chat_turns, stream)
+            executor.submit(user.run)
+    return recorder, time.perf_counter() - start
+
+
+def format_report(summary, elapsed, users, mock_stats=None):
+    lines = [
+        f"用户数: {users}  总耗时: {elapsed:.2f}s  完成流程吞吐: {users / elapsed:.2f} 用户/s" if elapsed else "",
+        f"{'stage':<16}{'ok':>7}{'err':>6}{'err%':>7}{'req/s':>9}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'ttfb p50':>10}"
+    ]
+
+    def ms(value):
+        return f"{value * 1000:.0f}ms" if value is not None else "-"
+
+    for stage, row in summary.items():
+        lines.append(
+            f"{stage:<16}{row['count']:>7}{row['errors']:>6}{row['error_rate'] * 100:>6.1f}%{row['throughput']:>9.2f}"
+            f"{ms(row['mean']):>9}{ms(row['p50']):>9}{ms(row['p95']):>9}{ms(row['p99']):>9}{ms(row.get('ttfb_p50')):>10}"
+        )
+    if mock_stats:
+        lines.append(f"模拟 LLM 服务: 收到 {mock_stats['requests']} 次请求，注入错误 {mock_stats['errors']} 次，"
+                     f"提示词前缀缓存命中率 {mock_stats['cache_hit_rate'] * 100:.1f}%")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="三阶段对话流程压测")
+    parser.add_argument("--users", type=int, default=50, help="模拟用户总数")
+    parser.add_argument("--concurrency", type=int, default=20, help="同时在线的用户数")
+    parser.add_argument("--chat-turns", type=int, default=3, help="每个用户在偶像聊天阶段发送的消息数")
+    parser.add_argument("--idols", default="Taylor Swift,周杰伦,IU", help="逗号分隔的偶像名字，用户依次轮换")
+    parser.add_argument("--stream", action="store_true", help="走 /stream 路由并统计首字节时间")
+    parser.add_argument("--target", choices=["flask", "async"], default="flask", help="压测同步 Flask 应用或 aiohttp 应用")
+    parser.add_argument("--base-url", help="压测已经在运行的服务（此时不启动模拟 LLM 与应用）")
+    parser.add_argument("--latency", default="lognormal:0.8:0.5", help="模拟 LLM 的延迟分布，例如 fixed:0.5、uniform:0.2:1.5、lognormal:0.8:0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟 LLM 返回错误的概率")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="模拟 LLM 流式输出的分片间隔秒数")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果，便于和历史结果比较")
+    args = parser.parse_args()
+
+    if args.stream and args.target == "async":
+        parser.error("异步服务暂不提供流式路由")
+
+    mock = None
+    base_url = args.base_url
+    if base_url is None:
+        mock = MockLLMServer(latency=args.latency, error_rate=args.error_rate,
+                             error_status=args.error_status, chunk_delay=args.chunk_delay)
+        configure_llm_env(mock.start())
+        base_url, _ = start_flask_app() if args.target == "flask" else start_async_app()
+
+    idol_names = [name.strip() for name in args.idols.split(",") if name.strip()]
+    recorder, elapsed = run_load(base_url, args.users, args.concurrency, idol_names, args.chat_turns, args.stream)
+    summary = recorder.summary(elapsed)
+    mock_stats = mock.stats() if mock else None
+
+    if args.json:
+        print(json.dumps({"users": args.users, "elapsed": elapsed, "stages": summary, "mock_llm": mock_stats}, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(summary, elapsed, args.users, mock_stats))
+
+    if mock:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
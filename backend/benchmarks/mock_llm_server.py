@@ -0,0 +1,219 @@
+import json
+import time
+import random
+import hashlib
+import asyncio
+import argparse
+import threading
+from aiohttp import web
+
+# 各阶段的模拟回复，结构与真实服务商返回的内容保持一致，保证解析逻辑都被走到
+DIVINATION_REPLY = (
+    "<interpretation>此卦刚健中正，象征着持续向上的力量。顺势而为，保持耐心，不必急于求成。</interpretation>"
+    "<comfort>不用担心，现在的困难只是暂时的。</comfort>"
+)
+PERSONA_REPLY = (
+    "【母语】英语\n【常用语言】英语\n【说话节奏】慢，停顿多\n【语气特点】克制\n"
+    "【情绪表达方式】先共情\n【习惯的回应方式】陈述感受\n【明显避免的说话方式】说教"
+)
+IDOL_REPLY = "I hear you. Take a breath with me, we can go through this slowly, one step at a time."
+TRANSLATION_REPLY = "我听到了。和我一起深呼吸，我们可以慢慢来，一步一步走。"
+FUSED_REPLY = f"<reply>{IDOL_REPLY}</reply>\n<translation>{TRANSLATION_REPLY}</translation>"
+
+
+def pick_reply(prompt):
+    """
+    根据提示词判断当前所处的阶段，返回对应的模拟回复
+    """
+    if "精通梅花易数" in prompt:
+        return DIVINATION_REPLY
+    if "提取这个人的【语言风格】" in prompt:
+        return PERSONA_REPLY
+    if "<translation>" in prompt:
+        return FUSED_REPLY
+    if "翻译成中文" in prompt:
+        return TRANSLATION_REPLY
+    return IDOL_REPLY
+
+
+def parse_latency(spec):
+    """
+    解析延迟分布配置，返回一个无参数、返回秒数的采样函数
+    支持：fixed:秒、uniform:最小:最大、normal:均值:标准差、lognormal:中位数:sigma
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(":") if v]
+    rng = random.Random()
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda: median * rng.lognormvariate(0.0, sigma)
+    raise ValueError(f"未知的延迟分布: {spec}")
+
+
+class MockLLMServer:
+    """
+    本地的 OpenAI / DeepSeek 兼容接口（/chat/completions 与 /v1/chat/completions），
+    按配置的延迟分布与错误率返回模拟回复，支持 stream=true 的 SSE 输出。
+    usage 按 DeepSeek 的格式模拟前缀缓存：与之前某次请求相同的前若干条消息记为 prompt_cache_hit_tokens
+    （token 数按字符数计）。用于压测时替代真实服务商，不产生费用，结果也可以复现。
+    """
+
+    def __init__(self, latency="lognormal:0.8:0.5", error_rate=0.0, error_status=503,
+                 chunk_size=8, chunk_delay=0.02, host="127.0.0.1", port=0):
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.cache_hit_tokens = 0
+        self._prefixes = set()
+        self._runner = None
+        self._loop = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_post("/chat/completions", self.handle_completions)
+        app.router.add_post("/v1/chat/completions", self.handle_completions)
+        return app
+
+    async def handle_completions(self, request):
+        body = await request.json()
+        self.requests += 1
+        prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+        model = body.get("model", "deepseek-chat")
+
+        # 流式请求的延迟代表首个 token 的等待时间
+        await asyncio.sleep(self.sample_latency())
+        if random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"error": {"message": "mock upstream error"}}, status=self.error_status)
+
+        content = pick_reply(prompt)
+        usage = self.usage(body.get("messages", []), content)
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return await self._stream(request, model, content, usage if include_usage else None)
+        return web.json_response({
+            "id": f"mock-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage
+        })
+
+    def usage(self, messages, content):
+        """
+        计算 usage：逐条累加消息前缀的摘要，最长的一段曾经出现过的前缀记为缓存命中
+        """
+        digest = hashlib.sha256()
+        prompt_tokens = hit_tokens = 0
+        missed = False
+        for message in messages:
+            digest.update(json.dumps(message, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+            prompt_tokens += len(message.get("content", ""))
+            key = digest.hexdigest()
+            if not missed and key in self._prefixes:
+                hit_tokens = prompt_tokens
+            else:
+                missed = True
+                self._prefixes.add(key)
+        self.prompt_tokens += prompt_tokens
+        self.cache_hit_tokens += hit_tokens
+        return {
+            "prompt_tokens": prompt_tokens,
+            "prompt_cache_hit_tokens": hit_tokens,
+            "prompt_cache_miss_tokens": prompt_tokens - hit_tokens,
+            "completion_tokens": len(content),
+            "total_tokens": prompt_tokens + len(content)
+        }
+
+    async def _stream(self, request, model, content, usage=None):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i in range(0, len(content), self.chunk_size):
+            chunk = {
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": content[i:i + self.chunk_size]}, "finish_reason": None}]
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            await asyncio.sleep(self.chunk_delay)
+        if usage is not None:
+            chunk = {"object": "chat.completion.chunk", "model": model, "choices": [], "usage": usage}
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    def start(self):
+        """
+        在后台线程的事件循环中启动服务，返回 base_url
+        """
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.create_app())
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, self.host, self.port)
+            self._loop.run_until_complete(site.start())
+            self.port = site._server.sockets[0].getsockname()[1]
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.base_url
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "cache_hit_tokens": self.cache_hit_tokens,
+            "cache_hit_rate": self.cache_hit_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OpenAI / DeepSeek 兼容的模拟 LLM 服务")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", default="lognormal:0.8:0.5", help="延迟分布，例如 fixed:0.5、uniform:0.2:1.5、lognormal:0.8:0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="流式输出时每个分片的间隔秒数")
+    args = parser.parse_args()
+
+    server = MockLLMServer(latency=args.latency, error_rate=args.error_rate, error_status=args.error_status,
+                           chunk_delay=args.chunk_delay, port=args.port)
+    web.run_app(server.create_app(), host=server.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+安全过滤的微基准：Aho-Corasick 自动机与逐条正则匹配的耗时对比
+
+在默认规则之外随机生成若干条短语，模拟数千条规则的规则集，
+分别用自动机（整段与流式）和逐条 re.search 过滤一段典型的占卜回复。
+
+在 backend 目录下运行：
+    python -m benchmarks.safety_filter_bench --rules 5000 --iterations 200
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.safety_filter import DEFAULT_RULES_PATH, SafetyFilter, load_rules
+
+SAMPLE_REPLY = (
+    "此卦刚健中正，象征着持续向上的力量。你现在的处境或许并不轻松，但这并不意味着结局已经注定。"
+    "顺势而为，保持耐心，不必急于求成；若能在细节上多下功夫，则事情倾向于慢慢好转。"
+    "不用担心，现在的困难只是暂时的，你一定会找到属于自己的节奏。"
+) * 3
+
+
+def synthetic_rules(count, seed=42):
+    """
+    随机生成 count 条 2-6 字的中文短语
+    """
+    rng = random.Random(seed)
+    return [("".join(chr(rng.randint(0x4e00, 0x9fa5)) for _ in range(rng.randint(2, 6))), "*") for _ in range(count)]
+
+
+def time_per_call(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="安全过滤微基准")
+    parser.add_argument("--rules", type=int, default=5000, help="额外随机生成的规则条数")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=8, help="流式过滤时每个增量的字符数")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    rules = load_rules(DEFAULT_RULES_PATH) + synthetic_rules(args.rules)
+    start = time.perf_counter()
+    safety_filter = SafetyFilter(rules)
+    build_seconds = time.perf_counter() - start
+    patterns = [re.compile(re.escape(phrase), re.IGNORECASE) for phrase, _ in rules]
+
+    def stream_filter():
+        stream = safety_filter.stream()
+        for i in range(0, len(SAMPLE_REPLY), args.chunk_size):
+            stream.feed(SAMPLE_REPLY[i:i + args.chunk_size])
+        stream.close()
+
+    results = {
+        "rules": len(rules),
+        "text_length": len(SAMPLE_REPLY),
+        "build_ms": build_seconds * 1000,
+        "automaton_us": time_per_call(lambda: safety_filter.filter(SAMPLE_REPLY), args.iterations) * 1e6,
+        "automaton_stream_us": time_per_call(stream_filter, args.iterations) * 1e6,
+        "regex_per_pattern_us": time_per_call(lambda: [p.search(SAMPLE_REPLY) for p in patterns], max(1, args.iterations // 10)) * 1e6
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"规则 {results['rules']} 条，文本 {results['text_length']} 字，自动机构建 {results['build_ms']:.0f}ms")
+    print(f"自动机整段过滤: {results['automaton_us']:>10.0f}µs")
+    print(f"自动机流式过滤: {results['automaton_stream_us']:>10.0f}µs")
+    print(f"逐条正则匹配:   {results['regex_per_pattern_us']:>10.0f}µs")
+
+
+if __name__ == "__main__":
+    main()
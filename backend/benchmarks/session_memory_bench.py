@@ -0,0 +1,94 @@
+"""
+会话内存基准：每条消息 / 每条占卜记录占用的字节数（不含正文文本）
+
+原先的实现（普通对象 + UUID 字符串 id + 创建时即格式化的 ISO 时间字符串）保留在本文件中作为对照，
+与现在的 __slots__ 记录（会话内序号 id + epoch 秒 + intern 的 role）在相同的正文下对比。
+结果也用来校准 chat_session 中 MESSAGE_OVERHEAD_BYTES / DIVINATION_OVERHEAD_BYTES 的估算值。
+
+在 backend 目录下运行：
+    python -m benchmarks.session_memory_bench --messages 100000
+"""
+import os
+import sys
+import gc
+import json
+import uuid
+import argparse
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.chat_session import Divination, Message
+
+
+class LegacyMessage:
+    def __init__(self, role, content):
+        self.id = str(uuid.uuid4())
+        self.role = role
+        self.content = content
+        self.timestamp = datetime.now().isoformat()
+        self.token_count = None
+        self.translatable = False
+        self.translation = None
+
+
+class LegacyDivination:
+    def __init__(self, divination_type, question, result):
+        self.id = str(uuid.uuid4())
+        self.type = divination_type
+        self.question = question
+        self.result = result
+        self.timestamp = datetime.now().isoformat()
+
+
+def bytes_per_record(factory, count):
+    """
+    创建 count 个记录，返回平均每个记录新分配的字节数（正文在测量前已经分配好）
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = [factory(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # 列表本身每项占 8 字节指针，不计入记录
+    result = (after - before - sys.getsizeof(records)) / count
+    del records
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话内存基准")
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    content = "今天有点累，想和你聊聊"
+    question, result = "我的事业怎么样？", "【第1卦 乾卦】"
+
+    def role(i):
+        # 模拟从数据库读回的 role：每次都是新的字符串对象，原先的实现会为每条消息各保存一份
+        return "".join(["us", "er"]) if i % 2 == 0 else "".join(["id", "ol"])
+
+    results = {
+        "messages": args.messages,
+        "legacy_message_bytes": bytes_per_record(lambda i: LegacyMessage(role(i), content), args.messages),
+        "message_bytes": bytes_per_record(lambda i: Message(i, role(i), content), args.messages),
+        "legacy_divination_bytes": bytes_per_record(lambda i: LegacyDivination("career", question, result), args.messages),
+        "divination_bytes": bytes_per_record(lambda i: Divination(i, "career", question, result), args.messages),
+    }
+    results["message_ratio"] = results["legacy_message_bytes"] / results["message_bytes"]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"消息（原先）: {results['legacy_message_bytes']:.0f} 字节/条")
+    print(f"消息（现在）: {results['message_bytes']:.0f} 字节/条")
+    print(f"占卜（原先）: {results['legacy_divination_bytes']:.0f} 字节/条")
+    print(f"占卜（现在）: {results['divination_bytes']:.0f} 字节/条")
+    print(f"消息内存缩减: {results['message_ratio']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+非中文 Persona 回复的延迟对比：合并翻译（一次调用）与回复 + 翻译（两次调用）
+
+在 backend 目录下运行：
+    python -m benchmarks.translation_latency --iterations 50 --latency lognormal:1.2:0.4
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_llm_server import MockLLMServer
+from benchmarks.load_test import configure_llm_env, percentile
+
+KOREAN_PERSONA = {
+    "name": "IU",
+    "default_language": "ko",
+    "mother_tongue": "韩语",
+    "common_languages": "韩语",
+    "speaking_pace": "慢，停顿多",
+    "tone_features": "温柔、克制",
+    "emotion_expression": "先共情",
+    "response_habits": "陈述感受",
+    "avoid_style": "说教"
+}
+
+
+def measure(service, session, iterations, fused):
+    """
+    :return: 每次生成回复（含翻译）的耗时列表（秒）
+    """
+    service.fused_translation = fused
+    samples = []
+    for i in range(iterations):
+        session.add_message("user", f"今天有点累（第{i + 1}次）")
+        start = time.perf_counter()
+        reply = service.generate_idol_response(KOREAN_PERSONA, session, translate=True)
+        samples.append(time.perf_counter() - start)
+        if not reply.get("translation"):
+            raise RuntimeError("回复缺少翻译")
+    return sorted(samples)
+
+
+def summarize(samples):
+    return {
+        "mean": sum(samples) / len(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合并翻译与两次调用的延迟对比")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--latency", default="lognormal:0.8:0.5", help="模拟 LLM 的延迟分布")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    mock = MockLLMServer(latency=args.latency)
+    configure_llm_env(mock.start())
+
+    from models.chat_session import ChatSession
+    from services.idol_chat_service import IdolChatService
+
+    service = IdolChatService()
+    # 模拟服务每次返回相同的原文，关闭响应缓存以免翻译调用被缓存命中
+    service.llm_client.response_cache = None
+    results = {}
+    for label, fused in (("two_call", False), ("fused", True)):
+        session = ChatSession(idol_id=None, user_id="benchmark")
+        results[label] = summarize(measure(service, session, args.iterations, fused))
+    results["speedup_p50"] = results["two_call"]["p50"] / results["fused"]["p50"]
+    mock.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'path':<10}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for label in ("two_call", "fused"):
+        row = results[label]
+        print(f"{label:<10}" + "".join(f"{row[k] * 1000:>7.0f}ms" for k in ("mean", "p50", "p95", "p99")))
+    print(f"p50 加速比: {results['speedup_p50']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+gunicorn 配置（Procfile / Dockerfile 使用，gunicorn 启动时自动读取当前目录下的本文件）
+
+多个 worker 进程各自持有一份内存中的会话缓存，会话本身保存在共用的存储里（SESSION_SHARED），
+每个请求核对版本号，请求结束时带版本检查写入，因此请求可以落到任意一个 worker 上。
+LLM 调用主要是等待网络，每个 worker 再开若干线程；解析、过滤等 CPU 工作分摊到多个核上。
+
+环境变量：
+    WEB_CONCURRENCY  worker 进程数（默认 CPU 核数，最多 8）
+    WEB_THREADS      每个 worker 的线程数（默认 8）
+    PORT             监听端口（默认 FLASK_PORT 或 5000）
+"""
+import os
+import multiprocessing
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(multiprocessing.cpu_count(), 8))))
+threads = int(os.getenv("WEB_THREADS", "8"))
+worker_class = "gthread"
+bind = f"0.0.0.0:{os.getenv('PORT', os.getenv('FLASK_PORT', '5000'))}"
+# 流式回复与慢速 LLM 调用可能持续较久
+timeout = 180
+graceful_timeout = 30
+accesslog = "-"
+
+# 多个 worker 时会话必须放在共用的存储中；worker 由主进程 fork，继承这里设置的环境变量。
+# 不要开启 preload_app：存储的后台写入线程与数据库连接需要在每个 worker 中各自创建
+if workers > 1:
+    os.environ.setdefault("SESSION_SHARED", "true")
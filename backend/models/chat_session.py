@@ -1,28 +1,117 @@
+import os
+import sys
+import json
+import time
 import uuid
+import base64
+import bisect
+import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from .session_locks import SessionBusyError
+
+logger = logging.getLogger(__name__)
+
+# 估算会话占用内存时每个对象的固定开销（字节），文本按 sys.getsizeof 计入
+# （数值由 benchmarks/session_memory_bench.py 测得后取整）
+SESSION_OVERHEAD_BYTES = 2048
+MESSAGE_OVERHEAD_BYTES = 150
+DIVINATION_OVERHEAD_BYTES = 130
+
+
+def format_timestamp(timestamp):
+    """
+    把 epoch 秒格式化成 ISO 8601 本地时间（只在序列化时调用）
+    """
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+# 消息与会话可投影（?fields=）的字段
+MESSAGE_FIELDS = ("id", "role", "content", "timestamp", "translatable", "translation")
+SESSION_FIELDS = ("session_id", "idol_id", "user_id", "created_at", "updated_at", "current_state",
+                  "persona_config", "transition_step", "messages")
+
+
+class SessionConflictError(SessionBusyError):
+    """
+    多进程共享存储时，会话在本次请求期间已被其他进程修改（版本号不一致），本次修改被丢弃
+    """
+
 
 class Message:
-    def __init__(self, role, content):
-        self.id = str(uuid.uuid4())
-        self.role = role  # user or idol
+    """
+    一条消息。使用 __slots__ 节省内存：id 为会话内的序号，timestamp 为 epoch 秒，
+    role 字符串经过 intern，所有消息共用同一个对象
+    """
+    __slots__ = ("id", "role", "content", "timestamp", "token_count", "translatable", "translation")
+
+    def __init__(self, message_id, role, content):
+        self.id = message_id
+        self.role = sys.intern(role)  # user or idol
         self.content = content
-        self.timestamp = datetime.now().isoformat()
+        self.timestamp = time.time()
+        self.token_count = None  # 惰性计算并缓存的 token 数
+        self.translatable = False  # 是否可以按需获取中文翻译
+        self.translation = None  # 首次请求时生成并保存的翻译
     
-    def to_dict(self):
-        return {
+    @classmethod
+    def restore(cls, message_id, role, content, timestamp, translatable=False, translation=None):
+        """
+        从持久化存储中恢复消息（保留原有的 id 与时间）
+        """
+        message = cls.__new__(cls)
+        message.id = message_id
+        message.role = sys.intern(role)
+        message.content = content
+        message.timestamp = timestamp
+        message.token_count = None
+        message.translatable = translatable
+        message.translation = translation
+        return message
+
+    def to_dict(self, fields=None):
+        """
+        :param fields: 只输出这些字段（取自 MESSAGE_FIELDS），None 表示默认的完整格式
+        """
+        if fields is not None:
+            return {name: format_timestamp(self.timestamp) if name == "timestamp" else getattr(self, name) for name in fields}
+        data = {
             "id": self.id,
             "role": self.role,
             "content": self.content,
-            "timestamp": self.timestamp
+            "timestamp": format_timestamp(self.timestamp)
         }
+        if self.translatable:
+            data["translatable"] = True
+            data["translation"] = self.translation
+        return data
 
 class Divination:
-    def __init__(self, divination_type, question, result):
-        self.id = str(uuid.uuid4())
-        self.type = divination_type
+    """
+    一次占卜记录，与 Message 一样使用 __slots__、会话内序号与 epoch 秒
+    """
+    __slots__ = ("id", "type", "question", "result", "timestamp")
+
+    def __init__(self, divination_id, divination_type, question, result):
+        self.id = divination_id
+        self.type = sys.intern(divination_type)
         self.question = question
         self.result = result
-        self.timestamp = datetime.now().isoformat()
+        self.timestamp = time.time()
+
+    @classmethod
+    def restore(cls, divination_id, divination_type, question, result, timestamp):
+        """
+        从持久化存储中恢复占卜记录
+        """
+        divination = cls.__new__(cls)
+        divination.id = divination_id
+        divination.type = sys.intern(divination_type)
+        divination.question = question
+        divination.result = result
+        divination.timestamp = timestamp
+        return divination
     
     def to_dict(self):
         return {
@@ -30,7 +119,7 @@ class Divination:
             "type": self.type,
             "question": self.question,
             "result": self.result,
-            "timestamp": self.timestamp
+            "timestamp": format_timestamp(self.timestamp)
         }
 
 class ChatSession:
@@ -43,28 +132,141 @@ class ChatSession:
         self.session_id = str(uuid.uuid4())
         self.idol_id = idol_id
         self.user_id = user_id
-        self.created_at = datetime.now().isoformat()
-        self.updated_at = datetime.now().isoformat()
+        # 创建与更新时间均为 epoch 秒，序列化时才格式化
+        self.created_at = time.time()
+        self.updated_at = self.created_at
         self.messages = []
         self.divinations = []
         self.persona_config = None
         self.transition_step = None
         # 初始状态设置为占卜阶段
         self.current_state = self.STATE_DIVINATION
+        # 由 SessionManager 维护：最近一次访问的时刻（time.monotonic）
+        self.last_accessed = None
+        # 估算的内存占用，随消息与占卜记录增量累加
+        self.approx_bytes = SESSION_OVERHEAD_BYTES
+        # 持久化存储（SessionStore），新增消息、占卜记录与状态变化都会通知它
+        self.store = None
+        # 用户会话索引（UserSessionIndex），updated_at 变化时通知它调整排序
+        self.user_index = None
+        # 消息列表的版本号（新增或修改消息时递增），用作消息历史的 ETag
+        self.message_revision = _next_revision(0)
+        # 持久化存储中的行版本号（乐观并发控制），0 表示尚未写入
+        self.version = 0
+        # 滚动摘要记忆：messages[:summary_upto] 已经折叠进 summary，提示词只放摘要与之后的消息
+        self.summary = None
+        self.summary_upto = 0
+        # 偶像聊天提示词的固定前缀（系统提示词 + Persona），首次使用时生成；
+        # 由 persona_config 决定，不持久化，重新加载后按需重新生成（内容相同）
+        self.prompt_prefix = None
+
+    @classmethod
+    def restore(cls, record, messages, divinations):
+        """
+        从持久化存储中恢复会话
+        :param record: 会话字段字典（与 to_dict 的键相同，不含 messages，时间为 epoch 秒）
+        """
+        session = cls.__new__(cls)
+        session.session_id = record["session_id"]
+        session.idol_id = record["idol_id"]
+        session.user_id = record["user_id"]
+        session.created_at = record["created_at"]
+        session.updated_at = record["updated_at"]
+        session.current_state = record["current_state"]
+        session.persona_config = record["persona_config"]
+        session.transition_step = record["transition_step"]
+        session.messages = list(messages)
+        session.divinations = list(divinations)
+        session.last_accessed = None
+        session.approx_bytes = SESSION_OVERHEAD_BYTES
+        session.approx_bytes += sum(MESSAGE_OVERHEAD_BYTES + sys.getsizeof(m.content) for m in session.messages)
+        session.approx_bytes += sum(DIVINATION_OVERHEAD_BYTES + sys.getsizeof(d.question) + sys.getsizeof(d.result) for d in session.divinations)
+        session.store = None
+        session.user_index = None
+        session.message_revision = _next_revision(0)
+        session.version = record.get("version", 0)
+        session.summary = record.get("summary")
+        session.summary_upto = record.get("summary_upto") or 0
+        session.prompt_prefix = None
+        if session.summary:
+            session.approx_bytes += sys.getsizeof(session.summary)
+        return session
+
+    def _touch(self):
+        self.updated_at = time.time()
+        if self.user_index is not None:
+            self.user_index.touch(self)
     
     def add_message(self, role, content):
-        message = Message(role, content)
+        message = Message(len(self.messages), role, content)
         self.messages.append(message)
-        self.updated_at = datetime.now().isoformat()
+        self.approx_bytes += MESSAGE_OVERHEAD_BYTES + sys.getsizeof(content)
+        self.message_revision = _next_revision(self.message_revision)
+        self._touch()
+        if self.store is not None:
+            self.store.message_added(self, message)
         return message
+
+    def update_message(self, message, **fields):
+        """
+        修改已有消息的字段（例如 translatable、translation），并通知持久化存储
+        """
+        for name, value in fields.items():
+            setattr(message, name, value)
+        self.message_revision = _next_revision(self.message_revision)
+        if self.store is not None:
+            self.store.message_changed(self, message)
+        return message
+
+    def get_message(self, message_id):
+        """
+        按 id 查找消息，id 即消息在会话中的序号（可以是路由里的字符串）
+        """
+        try:
+            index = int(message_id)
+        except (TypeError, ValueError):
+            return None
+        if 0 <= index < len(self.messages):
+            return self.messages[index]
+        return None
+
+    def messages_since(self, message_id, limit=None):
+        """
+        增量同步：返回 id 大于 message_id 的消息。id 即序号，直接切片，耗时只与返回的条数有关
+        :param message_id: 客户端已有的最后一条消息 id，-1 表示从头开始
+        :param limit: 最多返回的条数（正整数，由路由校验并限制上限），None 表示不限
+        """
+        start = max(message_id + 1, 0)
+        return self.messages[start:start + limit] if limit is not None else self.messages[start:]
+
+    def messages_etag(self):
+        return f"m{self.message_revision:x}"
+    
+    def set_summary(self, summary, upto):
+        """
+        更新滚动摘要（由 ConversationMemory 写回），不改变 updated_at
+        :param upto: 摘要覆盖的消息数，即 messages[:upto]；不比现有摘要新时忽略
+        :return: 是否更新
+        """
+        if upto <= self.summary_upto:
+            return False
+        self.approx_bytes += sys.getsizeof(summary) - (sys.getsizeof(self.summary) if self.summary else 0)
+        self.summary = summary
+        self.summary_upto = upto
+        if self.store is not None:
+            self.store.session_changed(self)
+        return True
     
     def add_divination(self, divination_type, question, result):
-        divination = Divination(divination_type, question, result)
+        divination = Divination(len(self.divinations), divination_type, question, result)
         self.divinations.append(divination)
-        self.updated_at = datetime.now().isoformat()
+        self.approx_bytes += DIVINATION_OVERHEAD_BYTES + sys.getsizeof(question) + sys.getsizeof(result)
+        self._touch()
         if self.current_state == self.STATE_DIVINATION:
             self.current_state = self.STATE_TRANSITION
             self.transition_step = "ASK_MORE"
+        if self.store is not None:
+            self.store.divination_added(self, divination)
         return divination
 
     def set_state(self, state):
@@ -74,44 +276,437 @@ class ChatSession:
         valid_states = [self.STATE_DIVINATION, self.STATE_TRANSITION, self.STATE_IDOL_CHAT]
         if state in valid_states:
             self.current_state = state
-            self.updated_at = datetime.now().isoformat()
+            self._touch()
+            if self.store is not None:
+                self.store.session_changed(self)
             return True
         return False
     
-    def to_dict(self):
+    def to_dict(self, fields=None):
+        """
+        :param fields: 只输出这些字段（取自 SESSION_FIELDS），未包含 messages 时不序列化消息
+        """
+        if fields is not None:
+            data = {}
+            for name in fields:
+                if name == "messages":
+                    data[name] = [msg.to_dict() for msg in self.messages]
+                elif name in ("created_at", "updated_at"):
+                    data[name] = format_timestamp(getattr(self, name))
+                else:
+                    data[name] = getattr(self, name)
+            return data
         return {
             "session_id": self.session_id,
             "idol_id": self.idol_id,
             "user_id": self.user_id,
-            "created_at": self.created_at,
-            "updated_at": self.updated_at,
+            "created_at": format_timestamp(self.created_at),
+            "updated_at": format_timestamp(self.updated_at),
             "current_state": self.current_state,
             "persona_config": self.persona_config,
             "transition_step": self.transition_step,
             "messages": [msg.to_dict() for msg in self.messages]
         }
     
+    def to_summary(self):
+        """
+        会话列表使用的摘要（不含消息与占卜记录）
+        """
+        return session_summary(self.session_id, self.idol_id, self.persona_config, self.current_state,
+                               self.created_at, self.updated_at)
+    
     def get_divinations(self):
         return [div.to_dict() for div in self.divinations]
 
+
+def _next_revision(previous):
+    """
+    取新的版本号：纳秒时间戳且严格递增。会话从存储中重新加载后版本号仍然比之前发出的大，
+    客户端手中的旧 ETag 不会误判为未变化
+    """
+    return max(time.time_ns(), previous + 1)
+
+
+def session_summary(session_id, idol_id, persona_config, current_state, created_at, updated_at):
+    """
+    构造会话摘要，内存中的会话与数据库中的记录共用同一格式
+    """
+    return {
+        "session_id": session_id,
+        "idol_id": idol_id,
+        "idol_name": persona_config.get("name") if persona_config else None,
+        "current_state": current_state,
+        "created_at": format_timestamp(created_at),
+        "updated_at": format_timestamp(updated_at)
+    }
+
+
+def encode_cursor(key):
+    """
+    把分页位置 (updated_at, session_id) 编码成不透明的游标字符串
+    """
+    raw = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    解析 encode_cursor 生成的游标
+    :return: (updated_at, session_id)，格式错误时抛出 ValueError
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, session_id = json.loads(raw)
+    except Exception:
+        raise ValueError(f"无效的游标: {cursor}")
+    if not isinstance(updated_at, (int, float)) or not isinstance(session_id, str):
+        raise ValueError(f"无效的游标: {cursor}")
+    return updated_at, session_id
+
+
+class UserSessionIndex:
+    """
+    user_id -> 会话的二级索引
+    每个用户的会话按 (updated_at, session_id) 升序保存在有序列表里，分页时二分定位游标再切片，
+    耗时只与页大小（和该用户的会话数的对数）有关，与会话总数无关。
+    会话 updated_at 变化时通过 touch 移动到新位置，通常是列表末尾
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = {}  # user_id -> [(updated_at, session_id), ...]
+        self._entries = {}  # session_id -> (user_id, key, ChatSession)
+
+    def add(self, session):
+        if session.user_id is None:
+            return
+        with self._lock:
+            self._discard(session.session_id)
+            key = (session.updated_at, session.session_id)
+            bisect.insort(self._keys.setdefault(session.user_id, []), key)
+            self._entries[session.session_id] = (session.user_id, key, session)
+        session.user_index = self
+
+    def touch(self, session):
+        with self._lock:
+            entry = self._entries.get(session.session_id)
+            # 已经移出索引的会话（被淘汰或删除）不再加回来
+            if entry is None or entry[2] is not session:
+                return
+            self._discard(session.session_id)
+            key = (session.updated_at, session.session_id)
+            bisect.insort(self._keys.setdefault(session.user_id, []), key)
+            self._entries[session.session_id] = (session.user_id, key, session)
+
+    def remove(self, session_id):
+        with self._lock:
+            entry = self._discard(session_id)
+        if entry is not None:
+            entry[2].user_index = None
+
+    def _discard(self, session_id):
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return None
+        user_id, key, _ = entry
+        keys = self._keys[user_id]
+        del keys[bisect.bisect_left(keys, key)]
+        if not keys:
+            del self._keys[user_id]
+        return entry
+
+    def page(self, user_id, limit, cursor=None):
+        """
+        按 updated_at 倒序取一页
+        :param cursor: 上一页最后一个会话的 (updated_at, session_id)，None 表示第一页
+        :return: (会话列表, 下一页的 cursor 或 None)
+        """
+        with self._lock:
+            keys = self._keys.get(user_id, [])
+            end = bisect.bisect_left(keys, tuple(cursor)) if cursor is not None else len(keys)
+            start = max(0, end - limit)
+            page_keys = keys[start:end][::-1]
+            sessions = [self._entries[session_id][2] for _, session_id in page_keys]
+        next_cursor = page_keys[-1] if start > 0 and page_keys else None
+        return sessions, next_cursor
+
+    def __len__(self):
+        return len(self._entries)
+
 # 会话管理类
 class SessionManager:
-    def __init__(self):
-        self.sessions = {}
-    
+    """
+    有上限的会话存储：
+    - 会话数超过 max_sessions 时立即淘汰最久未访问的会话（OrderedDict 头部，O(1)）
+    - 闲置超过 idle_ttl 秒的会话、以及总估算内存超过 max_memory_bytes 时最久未访问的会话，
+      由后台线程每 sweep_interval 秒清理一次；访问时发现已过期的会话也视为不存在
+    上限参数为 None 时不启用对应的限制。
+    配置了持久化存储（store）时，内存中只保留活跃会话：淘汰只是从内存中卸载，
+    之后再访问时从存储中按需加载；闲置过期也不再视为会话不存在。
+    shared=True 时多个进程共用同一个存储：每次读取内存中的会话前核对存储中的版本号，
+    被其他进程修改过就重新加载；请求结束时由 commit 同步写入并做版本检查（乐观并发控制）。
+    按用户列出会话：没有存储时使用内存中的 UserSessionIndex（创建时加入，删除与淘汰时移除），
+    有存储时由数据库的 (user_id, updated_at) 索引分页
+    """
+
+    def __init__(self, max_sessions=None, max_memory_bytes=None, idle_ttl=None, sweep_interval=60.0,
+                 clock=time.monotonic, store=None, shared=False):
+        self.sessions = OrderedDict()  # 按最近访问排序，最久未访问的在前
+        self.store = store
+        self.shared = shared and store is not None
+        if self.shared:
+            # 会话的修改只在 commit 时按版本号同步写入，不走后台批量写入
+            store.shared = True
+        self.user_index = UserSessionIndex() if store is None else None
+        self.max_sessions = max_sessions
+        self.max_memory_bytes = max_memory_bytes
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._stop = threading.Event()
+        self.evictions = {"lru": 0, "idle": 0, "memory": 0}
+        self.sweeps = 0
+        self.approx_bytes = 0
+        self.last_sweep_seconds = 0.0
+
     def create_session(self, idol_id=None, user_id=None):
         session = ChatSession(idol_id, user_id)
-        self.sessions[session.session_id] = session
+        if self.store is not None:
+            session.store = self.store
+            self.store.session_changed(session)
+        else:
+            self.user_index.add(session)
+        self._admit(session)
+        # 共享存储时立即写入，其他进程马上可以读到
+        self.commit(session)
+        self._ensure_sweeper()
         return session
     
     def get_session(self, session_id):
-        return self.sessions.get(session_id)
+        now = self._clock()
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                if self.store is None and self._is_idle(session, now):
+                    del self.sessions[session_id]
+                    self._unindex(session_id)
+                    self.evictions["idle"] += 1
+                    return None
+                session.last_accessed = now
+                self.sessions.move_to_end(session_id)
+        if session is not None:
+            if not self.shared:
+                return session
+            # 共享存储：版本号一致说明没有被其他进程修改过，直接使用内存中的对象
+            version = self.store.current_version(session_id)
+            if version == session.version:
+                return session
+            self._drop(session)
+            if version is None:
+                return None
+        if self.store is None:
+            return None
+
+        # 冷会话：从存储中加载后放回内存
+        session = self.store.load_session(session_id)
+        if session is None:
+            return None
+        session.store = self.store
+        return self._admit(session)
+
+    def _admit(self, session):
+        """
+        把会话放入内存（已有同一会话时返回已有的对象），超过会话数上限时淘汰最久未访问的会话
+        """
+        with self._lock:
+            session = self.sessions.setdefault(session.session_id, session)
+            session.last_accessed = self._clock()
+            self.sessions.move_to_end(session.session_id)
+            if self.max_sessions is not None:
+                while len(self.sessions) > self.max_sessions:
+                    evicted_id, _ = self.sessions.popitem(last=False)
+                    self._unindex(evicted_id)
+                    self.evictions["lru"] += 1
+        return session
     
+    def commit(self, session):
+        """
+        共享存储时把会话在本次请求中的修改同步写入存储（只写入版本号未变化的会话）；
+        未共享时修改由存储在后台按批写入，这里什么都不做
+        :raises SessionConflictError: 会话已被其他进程修改，内存中的对象被丢弃，下次访问时重新加载
+        """
+        if not self.shared:
+            return
+        try:
+            self.store.commit_session(session)
+        except SessionConflictError:
+            self._drop(session)
+            raise
+
+    def _drop(self, session):
+        """
+        从内存中移除这个会话对象（已被替换成别的对象时不动）
+        """
+        with self._lock:
+            if self.sessions.get(session.session_id) is session:
+                del self.sessions[session.session_id]
+
     def delete_session(self, session_id):
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-            return True
-        return False
+        with self._lock:
+            removed = self.sessions.pop(session_id, None) is not None
+            self._unindex(session_id)
+        if self.store is not None:
+            deleted = self.store.delete_session(session_id) or removed
+            if self.shared:
+                # 其他进程核对版本号时立即看到会话已删除
+                self.store.flush()
+            return deleted
+        return removed
     
     def get_sessions_by_user(self, user_id):
-        return [session for session in self.sessions.values() if session.user_id == user_id]
+        if self.store is not None:
+            sessions = (self.get_session(session_id) for session_id in self.store.find_session_ids(user_id))
+            return [session for session in sessions if session is not None]
+        sessions, _ = self.user_index.page(user_id, len(self.user_index))
+        return sessions
+
+    def list_user_sessions(self, user_id, limit=20, cursor=None):
+        """
+        按 updated_at 倒序分页列出用户的会话摘要（不含消息）
+        :param cursor: 上一页返回的 next_cursor，即 (updated_at, session_id)；None 表示第一页
+        :return: (摘要列表, next_cursor)，没有下一页时 next_cursor 为 None
+        """
+        if self.store is not None:
+            return self.store.list_user_sessions(user_id, limit, cursor)
+        sessions, next_cursor = self.user_index.page(user_id, limit, cursor)
+        return [session.to_summary() for session in sessions], next_cursor
+
+    def _unindex(self, session_id):
+        if self.user_index is not None:
+            self.user_index.remove(session_id)
+
+    def _is_idle(self, session, now):
+        return self.idle_ttl is not None and now - session.last_accessed >= self.idle_ttl
+
+    def sweep(self):
+        """
+        清理闲置会话并把总内存压到上限以内（后台线程调用，也可以手动调用）
+        闲置会话都在 OrderedDict 头部，从头部开始逐个删除，遇到未过期的即停止；
+        内存统计在锁外累加，避免长时间占用锁阻塞请求
+        """
+        start = time.perf_counter()
+        now = self._clock()
+        with self._lock:
+            while self.sessions:
+                session_id, session = next(iter(self.sessions.items()))
+                if not self._is_idle(session, now):
+                    break
+                del self.sessions[session_id]
+                self._unindex(session_id)
+                self.evictions["idle"] += 1
+            snapshot = list(self.sessions.values())
+
+        total = sum(session.approx_bytes for session in snapshot)
+        if self.max_memory_bytes is not None and total > self.max_memory_bytes:
+            for session in snapshot:
+                if total <= self.max_memory_bytes:
+                    break
+                with self._lock:
+                    # 快照之后被访问过的会话已经不是最久未访问的，跳过
+                    current = self.sessions.get(session.session_id)
+                    if current is not session or session.last_accessed > now:
+                        continue
+                    del self.sessions[session.session_id]
+                    self._unindex(session.session_id)
+                    self.evictions["memory"] += 1
+                total -= session.approx_bytes
+
+        with self._lock:
+            self.approx_bytes = total
+            self.sweeps += 1
+            self.last_sweep_seconds = time.perf_counter() - start
+
+    def _ensure_sweeper(self):
+        """
+        配置了闲置过期或内存上限时，在第一次创建会话时启动后台清理线程
+        """
+        if self._sweeper is not None or (self.idle_ttl is None and self.max_memory_bytes is None):
+            return
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._run_sweeper, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _run_sweeper(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Session sweep failed: {e}")
+
+    def stop(self):
+        """
+        停止后台清理线程
+        """
+        self._stop.set()
+
+    def stats(self):
+        """
+        返回会话占用与淘汰统计
+        """
+        with self._lock:
+            return {
+                "sessions": len(self.sessions),
+                "max_sessions": self.max_sessions,
+                "approx_bytes": self.approx_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "idle_ttl": self.idle_ttl,
+                "evictions": dict(self.evictions),
+                "sweeps": self.sweeps,
+                "last_sweep_seconds": self.last_sweep_seconds,
+                "store": self.store.stats() if self.store is not None else None
+            }
+
+
+def _optional_number(name, default, cast=float):
+    """
+    读取数值型环境变量，0 或负数表示不限制
+    """
+    value = cast(os.getenv(name, default))
+    return value if value > 0 else None
+
+
+def create_session_manager_from_env():
+    """
+    根据环境变量创建会话管理器：
+    SESSION_MAX_COUNT 最大会话数，SESSION_MAX_MEMORY_MB 会话总估算内存上限，
+    SESSION_IDLE_TTL 闲置多少秒后过期，SESSION_SWEEP_INTERVAL 后台清理间隔秒数；
+    前三项设为 0 表示不限制。
+    SESSION_STORE_URL 持久化存储的 SQLAlchemy URL（例如 sqlite:///sessions.db，不设置则只保存在内存中），
+    SESSION_STORE_BATCH_SIZE 与 SESSION_STORE_FLUSH_INTERVAL 控制批量写入。
+    SESSION_SHARED=true 表示多个 worker 进程（或多台机器）共用同一个存储，
+    未设置 SESSION_STORE_URL 时默认使用 sqlite:///sessions.db
+    """
+    store = None
+    shared = os.getenv("SESSION_SHARED", "false").lower() == "true"
+    store_url = os.getenv("SESSION_STORE_URL") or ("sqlite:///sessions.db" if shared else None)
+    if store_url:
+        from .session_store import SessionStore
+        store = SessionStore(
+            store_url,
+            batch_size=int(os.getenv("SESSION_STORE_BATCH_SIZE", "200")),
+            flush_interval=float(os.getenv("SESSION_STORE_FLUSH_INTERVAL", "0.5"))
+        )
+
+    max_memory_mb = _optional_number("SESSION_MAX_MEMORY_MB", "512")
+    return SessionManager(
+        max_sessions=_optional_number("SESSION_MAX_COUNT", "10000", int),
+        max_memory_bytes=int(max_memory_mb * 1024 * 1024) if max_memory_mb else None,
+        idle_ttl=_optional_number("SESSION_IDLE_TTL", "21600"),
+        sweep_interval=float(os.getenv("SESSION_SWEEP_INTERVAL", "60")),
+        store=store,
+        shared=shared
+    )
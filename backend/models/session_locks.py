@@ -0,0 +1,113 @@
+"""
+按会话串行化聊天状态机
+
+同一会话的请求（发送消息、占卜、生成翻译）会读写 current_state、transition_step、persona_config，
+并发执行时可能重复召唤偶像或重复占卜，每次重复都是一次浪费的 LLM 调用。
+这里为每个会话按需创建一把锁：同一会话的请求排队执行，不同会话互不影响。
+登记表本身只在取锁/放锁的瞬间加全局互斥，LLM 调用期间只持有该会话自己的锁；
+没有请求持有或等待的锁立即从登记表中移除，内存只与在途会话数有关。
+"""
+import os
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+
+class SessionBusyError(Exception):
+    """
+    等待会话锁超时（同一会话的上一条请求仍在处理）
+    """
+
+
+class SessionLocks:
+    def __init__(self, timeout=None):
+        """
+        :param timeout: 等待同一会话上一条请求的最长秒数，None 表示一直等待
+        """
+        self.timeout = timeout
+        self._mutex = threading.Lock()
+        self._locks = {}  # session_id -> [threading.Lock, 持有与等待的请求数]
+        self._async_locks = {}  # session_id -> [asyncio.Lock, 持有与等待的请求数]（只在事件循环线程中访问）
+        self.acquired = 0
+        self.contended = 0
+        self.timeouts = 0
+
+    @contextmanager
+    def hold(self, session_id):
+        """
+        在线程中持有会话锁
+        :raises SessionBusyError: 超过 timeout 仍未等到
+        """
+        with self._mutex:
+            entry = self._locks.get(session_id)
+            if entry is None:
+                entry = self._locks[session_id] = [threading.Lock(), 0]
+            entry[1] += 1
+        lock = entry[0]
+        try:
+            if not lock.acquire(blocking=False):
+                self._count("contended")
+                if not lock.acquire(timeout=-1 if self.timeout is None else self.timeout):
+                    self._count("timeouts")
+                    raise SessionBusyError(session_id)
+            self._count("acquired")
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            with self._mutex:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[session_id]
+
+    @asynccontextmanager
+    async def ahold(self, session_id):
+        """
+        在协程中持有会话锁（等待期间不阻塞事件循环）
+        :raises SessionBusyError: 超过 timeout 仍未等到
+        """
+        entry = self._async_locks.get(session_id)
+        if entry is None:
+            entry = self._async_locks[session_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        lock = entry[0]
+        try:
+            if lock.locked():
+                self._count("contended")
+            try:
+                await asyncio.wait_for(lock.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                self._count("timeouts")
+                raise SessionBusyError(session_id)
+            self._count("acquired")
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._async_locks[session_id]
+
+    def _count(self, name):
+        with self._mutex:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self._mutex:
+            return {
+                "active": len(self._locks) + len(self._async_locks),
+                "acquired": self.acquired,
+                "contended": self.contended,
+                "timeouts": self.timeouts,
+                "timeout": self.timeout
+            }
+
+
+def create_session_locks_from_env():
+    """
+    根据环境变量创建会话锁：SESSION_LOCK_TIMEOUT 等待同一会话上一条请求的最长秒数（0 表示一直等待）
+    """
+    timeout = float(os.getenv("SESSION_LOCK_TIMEOUT", "120"))
+    return SessionLocks(timeout=timeout if timeout > 0 else None)
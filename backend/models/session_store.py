@@ -0,0 +1,568 @@
+"""
+会话持久化：把 ChatSession / Message / Divination 写入 SQLAlchemy 支持的数据库（默认 SQLite WAL 模式）
+
+写入采用 write-behind：add_message、add_divination 等只把变更记入内存缓冲区，
+由后台线程按批（数量达到 batch_size 或每隔 flush_interval 秒）在一个事务里写入，
+请求路径不等待磁盘同步。尚未写入的会话在缓冲区中保留引用，读取时优先返回，避免读到旧数据。
+
+按用户列出会话使用 (user_id, updated_at, session_id) 复合索引做游标分页（keyset），
+每页只扫描页大小附近的索引项，不随会话总数增长。
+
+会话行带有版本号，每次写入都是 “WHERE version = 读取时的版本” 的条件更新（乐观并发控制）：
+多个进程共用同一个数据库时，基于旧版本的修改不会覆盖其他进程的写入。
+共享模式下请求结束时调用 commit_session 同步写入该会话的修改，版本冲突时抛出 SessionConflictError；
+此时后台线程只写入删除，不写入会话的修改：否则冲突会在后台被静默丢弃（请求照常返回成功），
+请求进行到一半的状态也会被其他进程读到。
+"""
+import json
+import time
+import atexit
+import logging
+import threading
+from sqlalchemy import (
+    Boolean, Column, Float, Index, Integer, MetaData, String, Table, Text,
+    and_, create_engine, delete, event, insert, inspect, or_, select, text, update
+)
+from .chat_session import ChatSession, Divination, Message, SessionConflictError, session_summary
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+sessions_table = Table(
+    "chat_sessions", metadata,
+    Column("session_id", String(36), primary_key=True),
+    Column("idol_id", String(64)),
+    Column("user_id", String(128)),
+    Column("created_at", Float),
+    Column("updated_at", Float),
+    Column("current_state", String(16)),
+    Column("transition_step", String(16)),
+    Column("persona_config", Text),
+    Column("version", Integer, nullable=False, default=0),
+    Column("summary", Text),
+    Column("summary_upto", Integer, nullable=False, default=0)
+)
+
+# 按用户分页列出会话：user_id 等值过滤后按 (updated_at, session_id) 有序扫描
+user_sessions_index = Index(
+    "ix_chat_sessions_user_updated",
+    sessions_table.c.user_id, sessions_table.c.updated_at, sessions_table.c.session_id
+)
+
+# 消息与占卜记录的 id 就是会话内的序号，主键为 (session_id, seq)
+messages_table = Table(
+    "chat_messages", metadata,
+    Column("session_id", String(36), primary_key=True),
+    Column("seq", Integer, primary_key=True),
+    Column("role", String(16)),
+    Column("content", Text),
+    Column("timestamp", Float),
+    Column("translatable", Boolean, default=False),
+    Column("translation", Text)
+)
+
+divinations_table = Table(
+    "chat_divinations", metadata,
+    Column("session_id", String(36), primary_key=True),
+    Column("seq", Integer, primary_key=True),
+    Column("type", String(32)),
+    Column("question", Text),
+    Column("result", Text),
+    Column("timestamp", Float)
+)
+
+
+class SessionSchemaError(RuntimeError):
+    """
+    数据库是以 id 为主键的旧版消息表结构，无法自动迁移
+    """
+
+
+def _enable_sqlite_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # WAL 模式下 NORMAL 只在检查点时同步，提交不再等待 fsync
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+class _WriteBatch:
+    """一批待写入的变更"""
+
+    def __init__(self):
+        self.sessions = {}  # session_id -> ChatSession（写入时读取最新字段）
+        self.new_messages = {}  # (session_id, message_id) -> Message
+        self.changed_messages = {}  # (session_id, message_id) -> Message
+        self.new_divinations = {}  # (session_id, divination_id) -> Divination
+        self.deleted = set()
+
+    def __len__(self):
+        return (len(self.sessions) + len(self.new_messages) + len(self.changed_messages)
+                + len(self.new_divinations) + len(self.deleted))
+
+    def extract(self, session_id):
+        """
+        取出某个会话的全部变更，作为单独的一批
+        """
+        batch = _WriteBatch()
+        if session_id in self.sessions:
+            batch.sessions[session_id] = self.sessions.pop(session_id)
+        for name in ("new_messages", "changed_messages", "new_divinations"):
+            pending = getattr(self, name)
+            keys = [key for key in pending if key[0] == session_id]
+            setattr(batch, name, {key: pending.pop(key) for key in keys})
+        return batch
+
+    def merge(self, other):
+        """
+        把写入失败的上一批合并回来，本批（较新）的变更优先
+        """
+        for name in ("sessions", "new_messages", "changed_messages", "new_divinations"):
+            merged = dict(getattr(other, name))
+            merged.update(getattr(self, name))
+            setattr(self, name, merged)
+        self.deleted |= other.deleted
+
+
+class SessionStore:
+    def __init__(self, url, batch_size=200, flush_interval=0.5, engine=None):
+        """
+        :param url: SQLAlchemy 数据库 URL，例如 sqlite:///sessions.db
+        :param batch_size: 缓冲区变更数达到多少时立即触发写入
+        :param flush_interval: 后台线程最长多少秒写入一次
+        """
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.engine = engine or self._create_engine(url)
+        metadata.create_all(self.engine)
+        self._check_record_tables()
+        # 早先创建的数据库里表已经存在，create_all 不会补建新增的列与索引
+        self._add_missing_session_columns()
+        user_sessions_index.create(self.engine, checkfirst=True)
+
+        self._lock = threading.Lock()
+        # 保证同一时刻只有一个线程在写入，批次按顺序提交
+        self._flush_lock = threading.Lock()
+        self._pending = _WriteBatch()
+        self._in_flight = _WriteBatch()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.flushes = 0
+        self.rows_written = 0
+        self.loads = 0
+        self.errors = 0
+        self.conflicts = 0
+        self.last_flush_seconds = 0.0
+        # 共享模式（由 SessionManager(shared=True) 设置）：会话的修改只由 commit_session 写入
+        self.shared = False
+
+        self._writer = threading.Thread(target=self._run_writer, name="session-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _check_record_tables(self):
+        """
+        消息与占卜表早先以 id（UUID 字符串）为主键、时间为字符串，数据无法与按序号存储的记录对应，
+        遇到旧表时直接拒绝启动，而不是在第一次写入时才报错
+        """
+        inspector = inspect(self.engine)
+        for table in (messages_table, divinations_table):
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            if "id" in columns:
+                raise SessionSchemaError(
+                    f"{table.name} in {self.engine.url!r} uses the old schema keyed by id; "
+                    "drop the chat_* tables (or delete the SQLite file) so they can be recreated"
+                )
+
+    def _add_missing_session_columns(self):
+        """
+        为早先创建的 chat_sessions 表补上后来新增的列（version、summary、summary_upto），已有的行取列的默认值；
+        已有的行都已经写入过，version 记为 1（0 表示尚未写入，会被当成新会话插入）
+        """
+        existing = {column["name"] for column in inspect(self.engine).get_columns(sessions_table.name)}
+        missing = [column for column in sessions_table.columns if column.name not in existing]
+        if not missing:
+            return
+        with self.engine.begin() as conn:
+            for column in missing:
+                ddl = f"ALTER TABLE {sessions_table.name} ADD COLUMN {column.name} {column.type.compile(self.engine.dialect)}"
+                if column.name == "version":
+                    ddl += " NOT NULL DEFAULT 1"
+                elif column.default is not None:
+                    ddl += f" NOT NULL DEFAULT {column.default.arg}"
+                conn.execute(text(ddl))
+        logger.info(f"Session store added columns: {', '.join(column.name for column in missing)}")
+
+    @staticmethod
+    def _create_engine(url):
+        if url.startswith("sqlite"):
+            engine = create_engine(url, connect_args={"check_same_thread": False})
+            event.listen(engine, "connect", _enable_sqlite_wal)
+            return engine
+        return create_engine(url, pool_pre_ping=True)
+
+    # ---- 会话对象的变更通知（请求路径，只操作内存） ----
+
+    def session_changed(self, session):
+        with self._lock:
+            self._pending.sessions[session.session_id] = session
+        self._maybe_wake()
+
+    def message_added(self, session, message):
+        with self._lock:
+            self._pending.sessions[session.session_id] = session
+            self._pending.new_messages[(session.session_id, message.id)] = message
+        self._maybe_wake()
+
+    def message_changed(self, session, message):
+        with self._lock:
+            # 翻译等字段的修改也要让会话版本号递增，其他进程才会重新加载
+            self._pending.sessions[session.session_id] = session
+            key = (session.session_id, message.id)
+            if key not in self._pending.new_messages:
+                self._pending.changed_messages[key] = message
+        self._maybe_wake()
+
+    def divination_added(self, session, divination):
+        with self._lock:
+            self._pending.sessions[session.session_id] = session
+            self._pending.new_divinations[(session.session_id, divination.id)] = divination
+        self._maybe_wake()
+
+    def _maybe_wake(self):
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    # ---- 读取 ----
+
+    def load_session(self, session_id):
+        """
+        读取会话；还在缓冲区中（尚未写入或正在写入）的会话直接返回内存中的对象
+        :return: ChatSession 或 None
+        """
+        with self._lock:
+            if session_id in self._pending.deleted or session_id in self._in_flight.deleted:
+                return None
+            session = self._pending.sessions.get(session_id) or self._in_flight.sessions.get(session_id)
+        if session is not None:
+            return session
+
+        with self.engine.connect() as conn:
+            row = conn.execute(select(sessions_table).where(sessions_table.c.session_id == session_id)).mappings().first()
+            if row is None:
+                return None
+            message_rows = conn.execute(
+                select(messages_table).where(messages_table.c.session_id == session_id).order_by(messages_table.c.seq)
+            ).mappings().all()
+            divination_rows = conn.execute(
+                select(divinations_table).where(divinations_table.c.session_id == session_id).order_by(divinations_table.c.seq)
+            ).mappings().all()
+
+        record = dict(row)
+        record["persona_config"] = json.loads(record["persona_config"]) if record["persona_config"] else None
+        messages = [
+            Message.restore(r["seq"], r["role"], r["content"], r["timestamp"], bool(r["translatable"]), r["translation"])
+            for r in message_rows
+        ]
+        divinations = [
+            Divination.restore(r["seq"], r["type"], r["question"], r["result"], r["timestamp"])
+            for r in divination_rows
+        ]
+        with self._lock:
+            self.loads += 1
+        return ChatSession.restore(record, messages, divinations)
+
+    def current_version(self, session_id):
+        """
+        :return: 数据库中会话的版本号，会话不存在（或已删除）时返回 None
+        """
+        with self._lock:
+            if session_id in self._pending.deleted or session_id in self._in_flight.deleted:
+                return None
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(sessions_table.c.version).where(sessions_table.c.session_id == session_id)
+            ).scalar()
+
+    def find_session_ids(self, user_id):
+        """
+        :return: 该用户的全部会话 id（包括还未写入的新会话）
+        """
+        with self._lock:
+            pending = [s.session_id for s in list(self._pending.sessions.values()) + list(self._in_flight.sessions.values())
+                       if s.user_id == user_id]
+            deleted = self._pending.deleted | self._in_flight.deleted
+        with self.engine.connect() as conn:
+            stored = conn.execute(
+                select(sessions_table.c.session_id).where(sessions_table.c.user_id == user_id)
+            ).scalars().all()
+        return [sid for sid in dict.fromkeys(list(stored) + pending) if sid not in deleted]
+
+    def list_user_sessions(self, user_id, limit, cursor=None):
+        """
+        按 updated_at 倒序分页列出用户的会话摘要
+        数据库按复合索引取一页，再与缓冲区中该用户的会话（updated_at 可能比数据库新）合并
+        :param cursor: 上一页最后一个会话的 (updated_at, session_id)，None 表示第一页
+        :return: (摘要列表, 下一页的 cursor 或 None)
+        """
+        with self._lock:
+            buffered = {}
+            for session in list(self._in_flight.sessions.values()) + list(self._pending.sessions.values()):
+                if session.user_id == user_id:
+                    buffered[session.session_id] = session
+            deleted = self._pending.deleted | self._in_flight.deleted
+        overlay = {sid: session for sid, session in buffered.items() if sid not in deleted}
+        skipped = set(buffered) | deleted
+
+        query = select(
+            sessions_table.c.session_id, sessions_table.c.idol_id, sessions_table.c.persona_config,
+            sessions_table.c.current_state, sessions_table.c.created_at, sessions_table.c.updated_at
+        ).where(sessions_table.c.user_id == user_id)
+        if cursor is not None:
+            updated_at, session_id = cursor
+            query = query.where(or_(
+                sessions_table.c.updated_at < updated_at,
+                and_(sessions_table.c.updated_at == updated_at, sessions_table.c.session_id < session_id)
+            ))
+        # 多取的行用来抵消被缓冲区覆盖或已删除的记录，并判断是否还有下一页
+        query = query.order_by(sessions_table.c.updated_at.desc(), sessions_table.c.session_id.desc())
+        query = query.limit(limit + len(skipped) + 1)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).mappings().all()
+
+        # (updated_at, session_id) 为排序键，摘要里的时间已经格式化成字符串
+        entries = [
+            ((r["updated_at"], r["session_id"]), session_summary(
+                r["session_id"], r["idol_id"], json.loads(r["persona_config"]) if r["persona_config"] else None,
+                r["current_state"], r["created_at"], r["updated_at"]
+            ))
+            for r in rows if r["session_id"] not in skipped
+        ]
+        for session in overlay.values():
+            key = (session.updated_at, session.session_id)
+            if cursor is None or key < tuple(cursor):
+                entries.append((key, session.to_summary()))
+        entries.sort(key=lambda entry: entry[0], reverse=True)
+        page = [summary for _, summary in entries[:limit]]
+        next_cursor = entries[limit - 1][0] if len(entries) > limit and limit > 0 else None
+        return page, next_cursor
+
+    def delete_session(self, session_id):
+        """
+        删除会话及其消息与占卜记录（异步写入）
+        :return: 会话是否存在
+        """
+        with self._lock:
+            exists = session_id in self._pending.sessions or session_id in self._in_flight.sessions
+        if not exists:
+            with self.engine.connect() as conn:
+                exists = conn.execute(
+                    select(sessions_table.c.session_id).where(sessions_table.c.session_id == session_id)
+                ).first() is not None
+        if not exists:
+            return False
+
+        with self._lock:
+            self._pending.sessions.pop(session_id, None)
+            self._pending.new_messages = {k: v for k, v in self._pending.new_messages.items() if k[0] != session_id}
+            self._pending.changed_messages = {k: v for k, v in self._pending.changed_messages.items() if k[0] != session_id}
+            self._pending.new_divinations = {k: v for k, v in self._pending.new_divinations.items() if k[0] != session_id}
+            self._pending.deleted.add(session_id)
+        self._maybe_wake()
+        return True
+
+    # ---- 后台写入 ----
+
+    def _run_writer(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Session store flush failed: {e}")
+
+    def flush(self):
+        """
+        把缓冲区中的变更在一个事务里写入数据库；共享模式下只写入删除，会话的修改留给 commit_session
+        :return: 写入的行数
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self.shared:
+                    batch = _WriteBatch()
+                    batch.deleted, self._pending.deleted = self._pending.deleted, set()
+                else:
+                    batch, self._pending = self._pending, _WriteBatch()
+                if not len(batch):
+                    return 0
+                self._in_flight = batch
+
+            start = time.perf_counter()
+            try:
+                rows = self._write(batch)
+            except Exception:
+                with self._lock:
+                    self._pending.merge(batch)
+                    self._in_flight = _WriteBatch()
+                    self.errors += 1
+                raise
+
+            with self._lock:
+                self._in_flight = _WriteBatch()
+                self.flushes += 1
+                self.rows_written += rows
+                self.last_flush_seconds = time.perf_counter() - start
+            return rows
+
+    def commit_session(self, session):
+        """
+        同步写入一个会话尚未写入的全部变更（共享模式下每个请求结束时调用）
+        :raises SessionConflictError: 数据库中的版本号已经变化，本次变更被丢弃
+        :return: 写入的行数
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending.extract(session.session_id)
+                if not len(batch):
+                    return 0
+                self._in_flight = batch
+            try:
+                rows = self._write(batch, strict=True)
+            except SessionConflictError:
+                with self._lock:
+                    self._in_flight = _WriteBatch()
+                raise
+            except Exception:
+                with self._lock:
+                    self._pending.merge(batch)
+                    self._in_flight = _WriteBatch()
+                    self.errors += 1
+                raise
+            with self._lock:
+                self._in_flight = _WriteBatch()
+                self.rows_written += rows
+            return rows
+
+    def _write(self, batch, strict=False):
+        """
+        在一个事务里写入一批变更。会话行按版本号条件更新，版本不一致的会话连同它的消息与占卜记录都不写入；
+        strict=True 时遇到版本冲突回滚整个事务并抛出 SessionConflictError
+        """
+        sessions = [session for sid, session in batch.sessions.items() if sid not in batch.deleted]
+        committed = []  # (会话, 写入后的版本号)
+        conflicts = set()
+
+        with self.engine.begin() as conn:
+            new_rows = [dict(self._session_row(s), version=1) for s in sessions if s.version == 0]
+            if new_rows:
+                conn.execute(insert(sessions_table), new_rows)
+                committed += [(s, 1) for s in sessions if s.version == 0]
+            for session in sessions:
+                if session.version == 0:
+                    continue
+                result = conn.execute(update(sessions_table).where(and_(
+                    sessions_table.c.session_id == session.session_id,
+                    sessions_table.c.version == session.version
+                )).values(**self._session_row(session), version=session.version + 1))
+                if result.rowcount == 1:
+                    committed.append((session, session.version + 1))
+                else:
+                    conflicts.add(session.session_id)
+            if conflicts and strict:
+                raise SessionConflictError(", ".join(conflicts))
+
+            skipped = batch.deleted | conflicts
+            message_rows = [self._message_row(sid, m) for (sid, _), m in batch.new_messages.items() if sid not in skipped]
+            divination_rows = [self._divination_row(sid, d) for (sid, _), d in batch.new_divinations.items() if sid not in skipped]
+            changed_messages = {key: m for key, m in batch.changed_messages.items() if key[0] not in skipped}
+            if message_rows:
+                conn.execute(insert(messages_table), message_rows)
+            for (sid, seq), message in changed_messages.items():
+                conn.execute(update(messages_table).where(
+                    and_(messages_table.c.session_id == sid, messages_table.c.seq == seq)
+                ).values(
+                    translatable=bool(message.translatable), translation=message.translation
+                ))
+            if divination_rows:
+                conn.execute(insert(divinations_table), divination_rows)
+            if batch.deleted:
+                deleted = list(batch.deleted)
+                conn.execute(delete(messages_table).where(messages_table.c.session_id.in_(deleted)))
+                conn.execute(delete(divinations_table).where(divinations_table.c.session_id.in_(deleted)))
+                conn.execute(delete(sessions_table).where(sessions_table.c.session_id.in_(deleted)))
+
+        for session, version in committed:
+            session.version = version
+        if conflicts:
+            logger.warning(f"Session store version conflicts, changes dropped: {', '.join(conflicts)}")
+            with self._lock:
+                self.conflicts += len(conflicts)
+        return len(committed) + len(message_rows) + len(changed_messages) + len(divination_rows) + len(batch.deleted)
+
+    @staticmethod
+    def _session_row(session):
+        return {
+            "session_id": session.session_id,
+            "idol_id": session.idol_id,
+            "user_id": session.user_id,
+            "created_at": session.created_at,
+            "updated_at": session.updated_at,
+            "current_state": session.current_state,
+            "transition_step": session.transition_step,
+            "persona_config": json.dumps(session.persona_config, ensure_ascii=False) if session.persona_config is not None else None,
+            "summary": session.summary,
+            "summary_upto": session.summary_upto
+        }
+
+    @staticmethod
+    def _message_row(session_id, message):
+        return {
+            "session_id": session_id,
+            "seq": message.id,
+            "role": message.role,
+            "content": message.content,
+            "timestamp": message.timestamp,
+            "translatable": bool(message.translatable),
+            "translation": message.translation
+        }
+
+    @staticmethod
+    def _divination_row(session_id, divination):
+        return {
+            "session_id": session_id,
+            "seq": divination.id,
+            "type": divination.type,
+            "question": divination.question,
+            "result": divination.result,
+            "timestamp": divination.timestamp
+        }
+
+    def close(self):
+        """
+        停止后台线程并写入剩余的变更（进程退出时自动调用）
+        """
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        self._writer.join(timeout=5)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Session store final flush failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "url": self.engine.url.render_as_string(hide_password=True),
+                "pending": len(self._pending),
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+                "loads": self.loads,
+                "errors": self.errors,
+                "conflicts": self.conflicts,
+                "last_flush_seconds": self.last_flush_seconds
+            }
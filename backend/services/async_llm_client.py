@@ -0,0 +1,267 @@
+import os
+import time
+import asyncio
+import aiohttp
+from dotenv import load_dotenv
+import openai
+from .llm_client import DEEPSEEK_API_URL, chat_messages
+from .response_cache import response_cache, make_cache_key
+from .single_flight import AsyncSingleFlight
+from .model_router import create_model_router_from_env
+from .prompt_cache_stats import prompt_cache_stats
+from .resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    acall_with_hedge,
+    backoff_delay,
+    create_circuit_breakers_from_env,
+    is_retryable,
+)
+
+# 加载环境变量
+load_dotenv()
+
+class AsyncLLMClient:
+    """
+    基于 asyncio 的 LLM 客户端，与 LLMClient.generate_response 语义一致。
+    所有调用共享一个 aiohttp 连接池，并受全局并发信号量约束，
+    大量在途请求可以在少数进程内复用事件循环，而不是各占一个线程。
+    """
+
+    def __init__(self):
+        # 配置API密钥
+        self.openai_api_key = os.getenv("OPENAI_API_KEY")
+        self.deepseek_api_key = os.getenv("DEEPSEEK_API_KEY")
+        self.default_model = os.getenv("DEFAULT_MODEL", "deepseek-chat")
+
+        # 并发与连接配置
+        self.max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "512"))
+        self.keep_alive = os.getenv("LLM_KEEP_ALIVE", "true").lower() == "true"
+        self.connect_timeout = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+        self.read_timeout = float(os.getenv("LLM_READ_TIMEOUT", "90"))
+        self._http_session = None
+        self._semaphore = None
+        self._loop = None
+        self.in_flight = 0
+
+        # 配置响应缓存（与同步客户端共用同一个缓存实例）
+        self.response_cache = response_cache if os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true" else None
+        self.cache_default = os.getenv("LLM_CACHE_DEFAULT", "false").lower() == "true"
+
+        # 合并并发中的相同请求，只向上游发送一次
+        self.single_flight = AsyncSingleFlight() if os.getenv("LLM_SINGLE_FLIGHT", "true").lower() == "true" else None
+
+        # 重试退避、对冲请求与熔断配置（与同步客户端相同）
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.backoff_base = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+        self.backoff_cap = float(os.getenv("LLM_BACKOFF_CAP", "8"))
+        self.hedge_enabled = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+        self.hedge_percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        self.hedge_min_delay = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+        self.hedge_min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+        self.circuit_breakers = create_circuit_breakers_from_env()
+        self.latency = {provider: LatencyTracker() for provider in self.circuit_breakers}
+        self.hedged_requests = 0
+
+        # 多端点路由（与同步客户端相同）
+        self.router = create_model_router_from_env(self.default_model, is_available=self._endpoint_available)
+
+        # 提示词缓存命中统计（与同步客户端共用）
+        self.prompt_cache_stats = prompt_cache_stats
+
+        # 配置OpenAI客户端
+        if self.openai_api_key:
+            openai.api_key = self.openai_api_key
+
+    def _bind_loop(self):
+        """
+        连接池与信号量都绑定在事件循环上，切换事件循环时重新创建
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._http_session = None
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def get_http_session(self):
+        """
+        获取当前事件循环上的 aiohttp 会话（惰性创建）
+        """
+        self._bind_loop()
+        if self._http_session is None or self._http_session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, force_close=not self.keep_alive)
+            timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+            self._http_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._http_session
+
+    async def close(self):
+        """
+        关闭连接池
+        """
+        if self._http_session is not None and not self._http_session.closed:
+            await self._http_session.close()
+        self._http_session = None
+
+    async def generate_response(self, prompt, model=None, max_tokens=2000, temperature=0.7, cache=None, cache_ttl=None):
+        """
+        生成LLM响应
+        :param prompt: 提示词（字符串，或按角色拆分的消息列表）
+        :param model: 使用的模型，None 时由路由器在 LLM_ENDPOINTS 配置的端点中选择
+        :param max_tokens: 最大令牌数
+        :param temperature: 温度参数
+        :param cache: 是否使用响应缓存，None 时按 LLM_CACHE_DEFAULT 决定
+        :param cache_ttl: 写入缓存的过期秒数，None 时使用缓存默认值
+        :return: 生成的响应文本
+        """
+        key_model = model or self.default_model
+        self._bind_loop()
+
+        cache_key = self._cache_key(prompt, key_model, max_tokens, temperature, cache)
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        try:
+            if self.single_flight is not None:
+                flight_key = cache_key or make_cache_key(key_model, prompt, temperature, max_tokens)
+                result = await self.single_flight.do(flight_key, lambda: self._dispatch(prompt, model, max_tokens, temperature))
+            else:
+                result = await self._dispatch(prompt, model, max_tokens, temperature)
+        except Exception as e:
+            raise Exception(f"LLM调用失败: {str(e)}")
+
+        if cache_key and result:
+            self.response_cache.set(cache_key, result, cache_ttl)
+        return result
+
+    def _endpoint_available(self, endpoint):
+        return self.circuit_breakers[endpoint.provider].state != CircuitBreaker.OPEN
+
+    async def _dispatch(self, prompt, model, max_tokens, temperature):
+        """
+        由路由器选择端点并发起调用，切换、重试、对冲与熔断规则与 LLMClient._dispatch 一致
+        """
+        failed = set()
+        for attempt in range(self.max_retries):
+            endpoint = self.router.select(model, exclude=failed)
+            if endpoint.name in failed:
+                await asyncio.sleep(backoff_delay(attempt - 1, self.backoff_base, self.backoff_cap))
+
+            provider = endpoint.provider
+            breaker = self.circuit_breakers[provider]
+            if not breaker.allow_request():
+                raise CircuitOpenError(f"{provider} 服务暂时不可用（熔断中）")
+
+            started = time.monotonic()
+            try:
+                result = await self._call_with_optional_hedge(provider, lambda: self._call_provider(provider, prompt, endpoint.model, max_tokens, temperature))
+            except Exception as e:
+                if not is_retryable(e):
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                self.router.record_failure(endpoint)
+                failed.add(endpoint.name)
+                if attempt == self.max_retries - 1:
+                    raise
+                continue
+
+            elapsed = time.monotonic() - started
+            breaker.record_success()
+            self.latency[provider].record(elapsed)
+            self.router.record_success(endpoint, elapsed)
+            return result
+
+    async def _call_provider(self, provider, prompt, model, max_tokens, temperature):
+        """
+        在全局并发信号量内调用服务商
+        """
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                if provider == "deepseek":
+                    return await self._call_deepseek(prompt, model, max_tokens, temperature)
+                else:
+                    return await self._call_openai(prompt, model, max_tokens, temperature)
+            finally:
+                self.in_flight -= 1
+
+    async def _call_with_optional_hedge(self, provider, fn):
+        tracker = self.latency[provider]
+        if not self.hedge_enabled or len(tracker) < self.hedge_min_samples:
+            return await fn()
+
+        hedge_delay = max(self.hedge_min_delay, tracker.percentile(self.hedge_percentile))
+        result, hedged = await acall_with_hedge(fn, hedge_delay)
+        if hedged:
+            self.hedged_requests += 1
+        return result
+
+    def resilience_stats(self):
+        """
+        返回各服务商的熔断器状态、耗时分位数与对冲次数，用于监控
+        """
+        return {
+            "circuit_breakers": {provider: breaker.stats() for provider, breaker in self.circuit_breakers.items()},
+            "latency_p50": {provider: tracker.percentile(50) for provider, tracker in self.latency.items()},
+            "latency_p95": {provider: tracker.percentile(95) for provider, tracker in self.latency.items()},
+            "hedged_requests": self.hedged_requests,
+            "endpoints": self.router.stats()
+        }
+
+    def _cache_key(self, prompt, model, max_tokens, temperature, cache):
+        """
+        计算本次调用的缓存键；不使用缓存时返回 None
+        """
+        use_cache = self.cache_default if cache is None else cache
+        if not use_cache or self.response_cache is None:
+            return None
+        return make_cache_key(model, prompt, temperature, max_tokens)
+
+    async def _call_deepseek(self, prompt, model, max_tokens, temperature):
+        """
+        调用DeepSeek API
+        """
+        headers = {
+            "Authorization": f"Bearer {self.deepseek_api_key}",
+            "Content-Type": "application/json"
+        }
+
+        data = {
+            "model": model,
+            "messages": chat_messages(prompt),
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": False
+        }
+
+        http = self.get_http_session()
+        async with http.post(DEEPSEEK_API_URL, headers=headers, json=data) as response:
+            response.raise_for_status()
+            payload = await response.json()
+            self.prompt_cache_stats.record("deepseek", payload.get("usage"))
+            return payload["choices"][0]["message"]["content"]
+
+    async def _call_openai(self, prompt, model, max_tokens, temperature):
+        """
+        调用OpenAI API（通过 openai.aiosession 复用同一个连接池）
+        """
+        token = openai.aiosession.set(self.get_http_session())
+        try:
+            response = await openai.ChatCompletion.acreate(
+                model=model,
+                messages=chat_messages(prompt),
+                max_tokens=max_tokens,
+                temperature=temperature,
+                request_timeout=(self.connect_timeout, self.read_timeout)
+            )
+        finally:
+            openai.aiosession.reset(token)
+
+        self.prompt_cache_stats.record("openai", response.get("usage"))
+        return response.choices[0].message.content
+
+# 创建全局异步LLM客户端实例
+async_llm_client = AsyncLLMClient()
@@ -0,0 +1,168 @@
+"""
+偶像聊天的滚动摘要记忆
+
+提示词只放得下最近的一小段对话记录，更早的内容会被截掉。这里为每个会话维护一份滚动摘要：
+未摘要的消息每积累 every_turns 轮，就在后台把其中较早的部分连同已有摘要交给 LLM 合并成新的摘要，
+最近 keep_messages 条消息保持原文。提示词 = 摘要 + 摘要之后的原文消息，长度不随对话轮数增长。
+
+摘要在后台线程中生成，结果先暂存在这里，由同一会话的下一轮请求（持有会话锁）写回 ChatSession，
+后台线程从不直接修改会话对象；多进程部署时写回随该请求的提交一起做版本检查。
+"""
+import os
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """下面是“我”和“你”（{name}）之间一段私密聊天的记录，其中“我”是和你聊天的那个人。
+请把它整理成一份备忘，让“你”之后继续聊天时还记得聊过什么：
+
+- 记下“我”提到的事实：称呼、经历、近况、在意的人和事
+- 记下“我”的情绪变化，以及还没聊完的话题
+- 记下“你”答应过的事和说过的关键的话
+- 只写记录里出现过的内容，不要编造，不要评价
+- 用中文，不超过{max_chars}字，只输出备忘本身
+
+{previous}对话记录：
+{conversation}"""
+
+
+class ConversationMemory:
+    def __init__(self, llm_client, every_turns=6, keep_messages=6, max_chars=400, workers=2, max_ready=1024):
+        """
+        :param llm_client: 生成摘要使用的 LLM 客户端（同步接口，在后台线程中调用）
+        :param every_turns: 未摘要的消息超出 keep_messages 多少轮（每轮一问一答两条）时触发一次摘要，0 表示关闭
+        :param keep_messages: 始终以原文放进提示词、不参与摘要的最近消息数
+        :param max_chars: 摘要的最大字数
+        :param workers: 后台生成摘要的线程数
+        :param max_ready: 最多暂存多少个尚未写回会话的摘要（超出时丢弃最早的，之后会重新生成）
+        """
+        self.llm_client = llm_client
+        self.every_turns = every_turns
+        self.keep_messages = keep_messages
+        self.max_chars = max_chars
+        self.workers = workers
+        self.max_ready = max_ready
+        self._lock = threading.Lock()
+        self._executor = None
+        self._in_flight = set()
+        self._ready = OrderedDict()  # session_id -> (summary, upto)
+        self.scheduled = 0
+        self.completed = 0
+        self.failed = 0
+        self.applied = 0
+
+    @property
+    def enabled(self):
+        return self.every_turns > 0
+
+    def context(self, session, idol_info):
+        """
+        取本轮提示词使用的记忆：先写回已经生成好的摘要，需要时在后台开始下一次摘要
+        （调用方持有会话锁）
+        :return: (摘要或 None, 摘要之后尚未折叠的消息列表)
+        """
+        if self.enabled:
+            self.apply_ready(session)
+            self.schedule(session, idol_info)
+        upto = session.summary_upto
+        return session.summary, session.messages[upto:] if upto else session.messages
+
+    def apply_ready(self, session):
+        """
+        把后台生成好的摘要写回会话；覆盖范围不比会话现有摘要新的结果直接丢弃
+        :return: 是否写回
+        """
+        with self._lock:
+            result = self._ready.pop(session.session_id, None)
+        if result is None:
+            return False
+        summary, upto = result
+        if upto > len(session.messages) or not session.set_summary(summary, upto):
+            return False
+        with self._lock:
+            self.applied += 1
+        return True
+
+    def schedule(self, session, idol_info):
+        """
+        未摘要的消息足够多时，在后台把 messages[summary_upto:upto] 合并进摘要
+        :return: Future；不需要摘要或同一会话已有在途的摘要时返回 None
+        """
+        upto = len(session.messages) - self.keep_messages
+        if upto - session.summary_upto < self.every_turns * 2:
+            return None
+        session_id = session.session_id
+        with self._lock:
+            if session_id in self._in_flight or session_id in self._ready:
+                return None
+            self._in_flight.add(session_id)
+            self.scheduled += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="idol-memory")
+        # 消息只会追加不会修改内容，这里取的快照在后台线程中读取是安全的
+        messages = session.messages[session.summary_upto:upto]
+        return self._executor.submit(self._run, session_id, idol_info.get("name", ""), session.summary, messages, upto)
+
+    def _run(self, session_id, name, previous_summary, messages, upto):
+        try:
+            summary = self.summarize(name, previous_summary, messages)
+        except Exception as e:
+            logger.warning(f"Conversation summary failed for {session_id}: {e}")
+            with self._lock:
+                self._in_flight.discard(session_id)
+                self.failed += 1
+            return None
+
+        with self._lock:
+            self._in_flight.discard(session_id)
+            self.completed += 1
+            self._ready[session_id] = (summary, upto)
+            self._ready.move_to_end(session_id)
+            while len(self._ready) > self.max_ready:
+                self._ready.popitem(last=False)
+        return summary
+
+    def summarize(self, name, previous_summary, messages):
+        """
+        把已有摘要与一段对话记录合并成新的摘要（同步调用 LLM）
+        """
+        previous = f"已有的备忘（请在此基础上补充和精简）：\n{previous_summary}\n\n" if previous_summary else ""
+        conversation = "".join(f"{'我' if msg.role == 'user' else '你'}：{msg.content}\n" for msg in messages)
+        prompt = SUMMARY_PROMPT.format(name=name, max_chars=self.max_chars, previous=previous, conversation=conversation)
+        summary = self.llm_client.generate_response(prompt, max_tokens=self.max_chars * 2, temperature=0.3, cache=False)
+        summary = (summary or "").strip()
+        if not summary:
+            raise ValueError("empty summary")
+        return summary[:self.max_chars]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "every_turns": self.every_turns,
+                "keep_messages": self.keep_messages,
+                "scheduled": self.scheduled,
+                "completed": self.completed,
+                "failed": self.failed,
+                "applied": self.applied,
+                "in_flight": len(self._in_flight),
+                "ready": len(self._ready)
+            }
+
+
+def create_conversation_memory_from_env(llm_client):
+    """
+    根据环境变量创建滚动摘要记忆：
+    IDOL_SUMMARY_EVERY_TURNS 每积累多少轮未摘要的对话触发一次摘要（0 表示关闭），
+    IDOL_SUMMARY_KEEP_MESSAGES 始终保留原文的最近消息数，IDOL_SUMMARY_MAX_CHARS 摘要最大字数，
+    IDOL_SUMMARY_WORKERS 后台生成摘要的线程数
+    """
+    return ConversationMemory(
+        llm_client,
+        every_turns=int(os.getenv("IDOL_SUMMARY_EVERY_TURNS", "6")),
+        keep_messages=int(os.getenv("IDOL_SUMMARY_KEEP_MESSAGES", "6")),
+        max_chars=int(os.getenv("IDOL_SUMMARY_MAX_CHARS", "400")),
+        workers=int(os.getenv("IDOL_SUMMARY_WORKERS", "2"))
+    )
@@ -2,12 +2,38 @@ import logging
 import json
 import re
 from .llm_client import llm_client
+from .async_llm_client import async_llm_client
+from .meihua import cast
+from .safety_filter import safety_filter
+from .tag_stream_parser import TagStreamParser, SectionTextRenderer, parse_sections
 
 logger = logging.getLogger(__name__)
 
+# 卦象与原文由本地起卦给出，模型只需写解读与安抚，输出长度可以明显缩短
+DIVINATION_MAX_TOKENS = 1200
+
+CAST_METHOD_NAMES = {"time": "时间起卦", "numbers": "报数起卦", "text": "文字起卦"}
+
+# 占卜结尾的过渡询问（固定文案，不再由模型复述）
+TRANSITION_QUESTION = """卦到这里，我先不替你把未来说死。你如果愿意，我们可以把它落到“你当下能做什么”上。
+
+你想继续的话，我可以为你召唤一位你喜欢的公众人物，作为“虚拟偶像疗愈师”，用他/她更习惯的方式陪你聊一会儿。
+
+提醒一下：这位“疗愈师”是虚拟 AI 人设，并非偶像真人，仅供娱乐与情绪陪伴。
+
+你想继续吗？回复“不需要”就到这里；回复“需要”我会问你想召唤谁；你也可以直接把名字发给我（例如：Taylor Swift / 周杰伦）。"""
+
+FAILED_DIVINATION_MESSAGE = "抱歉，由于神秘力量（网络波动），这次占卜未能完成。请稍息片刻，诚心再试一次。"
+
+# 本地起卦时模型只输出这两段；旧版提示词（没有本地起卦）下模型输出全部五段
+DIVINATION_TAGS = ("interpretation", "comfort")
+LEGACY_DIVINATION_TAGS = ("hexagram", "source", "interpretation", "comfort", "question")
+
 class DivinationService:
     def __init__(self):
         self.llm_client = llm_client
+        self.async_llm_client = async_llm_client
+        self.safety_filter = safety_filter
     
     def generate_divination(self, idol_info, divination_type, question, user_emotion=None):
         """
@@ -18,31 +44,112 @@ class DivinationService:
         :param user_emotion: 用户情绪
         :return: 占卜结果
         """
-        prompt = self._create_divination_prompt(idol_info, divination_type, question, user_emotion)
-        logger.info("divination_input type=%s question=%s", divination_type, str(question)[:500])
+        casting = cast(question)
+        prompt = self._create_divination_prompt(idol_info, divination_type, question, user_emotion, casting)
+        logger.info("divination_input type=%s question=%s hexagram=%s", divination_type, str(question)[:500], casting["hexagram"]["number"])
         
         try:
-            result = self.llm_client.generate_response(prompt)
+            result = self.llm_client.generate_response(prompt, max_tokens=DIVINATION_MAX_TOKENS)
         except Exception as e:
             logger.error(f"LLM generation failed: {e}")
-            return "抱歉，由于神秘力量（网络波动），这次占卜未能完成。请稍息片刻，诚心再试一次。"
+            return FAILED_DIVINATION_MESSAGE
+
+        return self._format_divination_result(result, casting)
+
+    async def agenerate_divination(self, idol_info, divination_type, question, user_emotion=None):
+        """
+        generate_divination 的异步版本
+        """
+        casting = cast(question)
+        prompt = self._create_divination_prompt(idol_info, divination_type, question, user_emotion, casting)
+        logger.info("divination_input type=%s question=%s hexagram=%s", divination_type, str(question)[:500], casting["hexagram"]["number"])
+
+        try:
+            result = await self.async_llm_client.generate_response(prompt, max_tokens=DIVINATION_MAX_TOKENS)
+        except Exception as e:
+            logger.error(f"LLM generation failed: {e}")
+            return FAILED_DIVINATION_MESSAGE
+
+        return self._format_divination_result(result, casting)
+
+    def stream_divination(self, idol_info, divination_type, question, user_emotion=None):
+        """
+        流式生成占卜结果（生成器）
+        先立即产出本地起得的卦象与原文，再边生成边产出去掉标签、经过安全过滤的解读与安抚，
+        结束后返回与 generate_divination 相同的格式化结果
+        :return: 格式化后的完整占卜结果（生成器返回值）
+        """
+        casting = cast(question)
+        prompt = self._create_divination_prompt(idol_info, divination_type, question, user_emotion, casting)
+        logger.info("divination_stream_input type=%s question=%s hexagram=%s", divination_type, str(question)[:500], casting["hexagram"]["number"])
+
+        yield "\n\n".join(self._format_casting(casting)) + "\n\n"
 
+        parser = TagStreamParser(DIVINATION_TAGS)
+        renderer = SectionTextRenderer()
+        stream_filter = self.safety_filter.stream()
+        chunks = []
+        try:
+            for delta in self.llm_client.stream_response(prompt, max_tokens=DIVINATION_MAX_TOKENS):
+                chunks.append(delta)
+                text = stream_filter.feed(renderer.render(parser.feed(delta)))
+                if text:
+                    yield text
+        except Exception as e:
+            logger.error(f"LLM streaming failed: {e}")
+            if not chunks:
+                return FAILED_DIVINATION_MESSAGE
+
+        text = stream_filter.feed(renderer.render(parser.close())) + stream_filter.close()
+        if text:
+            yield text
+        return self._format_divination_result("".join(chunks), casting, parser.sections, parser.untagged)
+
+    def _format_casting(self, casting):
+        """
+        本地起卦部分的展示文本：[卦名行, 原文]
+        """
+        hexagram = casting["hexagram"]
+        title = f"【第{hexagram['number']}卦 {hexagram['name']}卦 {hexagram['full_name']} 上{hexagram['upper']}下{hexagram['lower']}】"
+        source = (
+            f"《周易·{hexagram['name']}卦》卦辞：{hexagram['judgment']}\n"
+            f"《象》曰：{hexagram['image']}\n"
+            f"动爻：{casting['moving_line_name']}　变卦：{casting['changed']['full_name']}　互卦：{casting['mutual']['full_name']}"
+        )
+        return [title, source]
+
+    def _format_divination_result(self, result, casting=None, sections=None, untagged=None):
+        """
+        按标签分段并格式化模型原始输出
+        :param casting: 本地起卦结果；提供时卦象、原文与结尾询问都使用本地内容，模型只提供解读与安抚
+        :param sections: 流式解析时已经得到的段落，提供时不再扫描 result
+        :param untagged: 与 sections 一起提供的段外文字
+        """
         logger.info("divination_raw_output result=%s", str(result)[:1200])
+
+        if sections is None:
+            tags = DIVINATION_TAGS if casting is not None else LEGACY_DIVINATION_TAGS
+            sections, untagged = parse_sections(result, tags)
+
+        if casting is not None:
+            interpretation = sections.get("interpretation", "")
+            comfort = sections.get("comfort", "")
+            if not interpretation and not comfort:
+                # 模型没有按标签输出时，把去掉标签后的全文作为解读
+                logger.warning("Failed to parse tags from divination response")
+                interpretation = untagged
+            interpretation = self.safety_filter.filter(interpretation)
+            comfort = self.safety_filter.filter(comfort)
+            parts = self._format_casting(casting) + [interpretation, comfort, TRANSITION_QUESTION]
+            return "\n\n".join(part for part in parts if part)
         
         # 尝试提取内容 (使用 XML 标签更稳健)
         try:
-            # 定义提取函数
-            def extract_tag(tag, text):
-                # 允许标签带有属性或空格，忽略大小写
-                pattern = f"<{tag}.*?>(.*?)</{tag}>"
-                match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
-                return match.group(1).strip() if match else ""
-
-            hexagram = extract_tag("hexagram", result)
-            source = extract_tag("source", result)
-            interpretation = extract_tag("interpretation", result)
-            comfort = extract_tag("comfort", result)
-            question = extract_tag("question", result)
+            hexagram = sections.get("hexagram", "")
+            source = sections.get("source", "")
+            interpretation = sections.get("interpretation", "")
+            comfort = sections.get("comfort", "")
+            question = sections.get("question", "")
 
             # 如果关键字段都提取不到，说明格式不对，直接返回原始结果
             if not hexagram and not interpretation:
@@ -72,9 +179,9 @@ class DivinationService:
             parts = []
             if hexagram: parts.append(f"【{hexagram}】")
             if source: parts.append(source.strip())
-            if interpretation: parts.append(interpretation.strip())
-            if comfort: parts.append(comfort.strip())
-            if question: parts.append(question.strip())
+            if interpretation: parts.append(self.safety_filter.filter(interpretation.strip()))
+            if comfort: parts.append(self.safety_filter.filter(comfort.strip()))
+            if question: parts.append(self.safety_filter.filter(question.strip()))
             
             if not parts:
                 logger.warning("No parts extracted, returning raw result")
@@ -86,58 +193,35 @@ class DivinationService:
             logger.error(f"Error parsing divination response: {e}")
             return result
 
-    def _create_divination_prompt(self, idol_info, divination_type, question, user_emotion):
+    def _create_divination_prompt(self, idol_info, divination_type, question, user_emotion, casting=None):
         """
-        创建占卜提示词 - 恢复深度解析版本
+        创建占卜提示词：卦象与原文已由本地起卦确定，模型只需写解读与安抚
         """
-        prompt = f"""你是一位隐居山林的易经宗师，精通梅花易数与六爻预测。你不仅通晓古籍，更能洞察人性，将易理与心理慰藉完美融合。
+        casting = casting or cast(question)
+        hexagram = casting["hexagram"]
 
-现在，有一位缘主求卦，其所求之事为："{question}"
+        prompt = f"""你是一位精通梅花易数的易经老师，善于把卦理与心理慰藉结合起来。
+
+缘主所问："{question}"
 占卜类型：{divination_type if divination_type else "综合运势"}
 缘主当前心境：{user_emotion if user_emotion else "平静且期待"}
 
-请你凝神静气，起得一卦。你的解析必须包含以下几个维度，且每个维度都要深入透彻。
-
-**重要要求：**
-1. **深度解析**：总字数必须在 1000 字以上。不要敷衍，要像真正的宗师一样条分缕析。
-2. **结构要求**：请将你的回答放入以下 XML 标签中，以便于我提取。但标签内部的内容应该是纯粹的解析文字，不需要任何标题或前缀。
-
-<hexagram>
-这里写卦名。格式：第X卦 [卦名] [卦象描述]（例如：第31卦 咸卦 泽山咸 上兑下艮）。
-</hexagram>
-
-<source>
-这里给出卦辞或象传原文。必须引用《周易》或相关古籍的真实原文。
-紧接着，请你用充满禅意的现代语言，解析这段古文的深层含义。
-</source>
+卦已用{CAST_METHOD_NAMES[casting["method"]]}起好，请直接据此解读，不要另起一卦，也不要复述原文：
+本卦：第{hexagram["number"]}卦 {hexagram["name"]}卦（{hexagram["full_name"]}，上{hexagram["upper"]}下{hexagram["lower"]}）
+卦辞：{hexagram["judgment"]}
+象曰：{hexagram["image"]}
+动爻：{casting["moving_line_name"]}
+变卦：{casting["changed"]["full_name"]}　互卦：{casting["mutual"]["full_name"]}
 
+请严格按照以下 XML 标签格式输出，标签内只写正文，不要标题或前缀：
 <interpretation>
-这是最核心的部分，要求极其详尽（不少于 800 字）：
-- 首先，从卦象的意象出发（如：泽在山上，山感泽气）。
-- 其次，结合互卦、变卦或五行生克，分析事情的现状与潜在变化。
-- 再次，针对缘主的问题 "{question}"，给出多层次的剖析。不要给死结论，要给方向，要用“或许”、“倾向于”、“若能...则...”等温和而专业的措辞。
-- 最后，给出一个既含蓄又富有智慧的阶段性总结。
+结合卦象的意象、互卦与变卦所示的变化，针对缘主的问题给出 300-500 字的解读。给方向而不下死结论，多用“或许”“倾向于”“若能……则……”等温和措辞。
 </interpretation>
-
 <comfort>
-这里是你的慈悲之心。请针对缘主的焦虑或疑惑，给出一份深度的情绪慰藉（不少于 150 字）。
-强调因果，强调过程的意义，让缘主感受到被理解与被陪伴的温暖。
+针对缘主的焦虑给出 100-150 字的情绪慰藉，让缘主感到被理解与被陪伴。
 </comfort>
 
-<question>
-卦到这里，我先不替你把未来说死。你如果愿意，我们可以把它落到“你当下能做什么”上。
-
-你想继续的话，我可以为你召唤一位你喜欢的公众人物，作为“虚拟偶像疗愈师”，用他/她更习惯的方式陪你聊一会儿。
-
-提醒一下：这位“疗愈师”是虚拟 AI 人设，并非偶像真人，仅供娱乐与情绪陪伴。
-
-你想继续吗？回复“不需要”就到这里；回复“需要”我会问你想召唤谁；你也可以直接把名字发给我（例如：Taylor Swift / 周杰伦）。
-</question>
-
-**禁忌：**
-- 绝对禁止使用 JSON 格式。
-- 绝对禁止出现“灾难、必死、死局”等极端断语。
-- 保持宗师风范，言辞雅致，不落俗套。"""
+禁止使用 JSON，禁止出现“灾难、必死、死局”等极端断语。"""
         
         return prompt.strip()
     
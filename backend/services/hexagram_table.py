@@ -0,0 +1,136 @@
+"""
+《周易》六十四卦静态数据表
+
+八卦按先天数（乾1 兑2 离3 震4 巽5 坎6 艮7 坤8）编号，爻从下往上排列，1 为阳爻、0 为阴爻。
+六十四卦按通行本卦序编号，收录卦名、卦辞与大象传，导入时建立按卦序、上下卦、六爻三种索引。
+"""
+
+# (先天数, 卦名, 象, 三爻自下而上)
+TRIGRAMS = [
+    {"number": 1, "name": "乾", "nature": "天", "lines": (1, 1, 1)},
+    {"number": 2, "name": "兑", "nature": "泽", "lines": (1, 1, 0)},
+    {"number": 3, "name": "离", "nature": "火", "lines": (1, 0, 1)},
+    {"number": 4, "name": "震", "nature": "雷", "lines": (1, 0, 0)},
+    {"number": 5, "name": "巽", "nature": "风", "lines": (0, 1, 1)},
+    {"number": 6, "name": "坎", "nature": "水", "lines": (0, 1, 0)},
+    {"number": 7, "name": "艮", "nature": "山", "lines": (0, 0, 1)},
+    {"number": 8, "name": "坤", "nature": "地", "lines": (0, 0, 0)},
+]
+
+# (卦序, 卦名, 上卦先天数, 下卦先天数, 卦辞, 大象传)
+_HEXAGRAM_DATA = [
+    (1, "乾", 1, 1, "元，亨，利，贞。", "天行健，君子以自强不息。"),
+    (2, "坤", 8, 8, "元，亨，利牝马之贞。君子有攸往，先迷后得主，利西南得朋，东北丧朋。安贞，吉。", "地势坤，君子以厚德载物。"),
+    (3, "屯", 6, 4, "元，亨，利，贞，勿用有攸往，利建侯。", "云雷，屯；君子以经纶。"),
+    (4, "蒙", 7, 6, "亨。匪我求童蒙，童蒙求我。初筮告，再三渎，渎则不告。利贞。", "山下出泉，蒙；君子以果行育德。"),
+    (5, "需", 6, 1, "有孚，光亨，贞吉。利涉大川。", "云上于天，需；君子以饮食宴乐。"),
+    (6, "讼", 1, 6, "有孚，窒。惕中吉。终凶。利见大人，不利涉大川。", "天与水违行，讼；君子以作事谋始。"),
+    (7, "师", 8, 6, "贞，丈人，吉无咎。", "地中有水，师；君子以容民畜众。"),
+    (8, "比", 6, 8, "吉。原筮元永贞，无咎。不宁方来，后夫凶。", "地上有水，比；先王以建万国，亲诸侯。"),
+    (9, "小畜", 5, 1, "亨。密云不雨，自我西郊。", "风行天上，小畜；君子以懿文德。"),
+    (10, "履", 1, 2, "履虎尾，不咥人，亨。", "上天下泽，履；君子以辨上下，定民志。"),
+    (11, "泰", 8, 1, "小往大来，吉亨。", "天地交，泰；后以财成天地之道，辅相天地之宜，以左右民。"),
+    (12, "否", 1, 8, "否之匪人，不利君子贞，大往小来。", "天地不交，否；君子以俭德辟难，不可荣以禄。"),
+    (13, "同人", 1, 3, "同人于野，亨。利涉大川，利君子贞。", "天与火，同人；君子以类族辨物。"),
+    (14, "大有", 3, 1, "元亨。", "火在天上，大有；君子以遏恶扬善，顺天休命。"),
+    (15, "谦", 8, 7, "亨，君子有终。", "地中有山，谦；君子以裒多益寡，称物平施。"),
+    (16, "豫", 4, 8, "利建侯行师。", "雷出地奋，豫；先王以作乐崇德，殷荐之上帝，以配祖考。"),
+    (17, "随", 2, 4, "元亨利贞，无咎。", "泽中有雷，随；君子以向晦入宴息。"),
+    (18, "蛊", 7, 5, "元亨，利涉大川。先甲三日，后甲三日。", "山下有风，蛊；君子以振民育德。"),
+    (19, "临", 8, 2, "元，亨，利，贞。至于八月有凶。", "泽上有地，临；君子以教思无穷，容保民无疆。"),
+    (20, "观", 5, 8, "盥而不荐，有孚颙若。", "风行地上，观；先王以省方观民设教。"),
+    (21, "噬嗑", 3, 4, "亨。利用狱。", "雷电，噬嗑；先王以明罚敕法。"),
+    (22, "贲", 7, 3, "亨。小利有攸往。", "山下有火，贲；君子以明庶政，无敢折狱。"),
+    (23, "剥", 7, 8, "不利有攸往。", "山附于地，剥；上以厚下安宅。"),
+    (24, "复", 8, 4, "亨。出入无疾，朋来无咎。反复其道，七日来复，利有攸往。", "雷在地中，复；先王以至日闭关，商旅不行，后不省方。"),
+    (25, "无妄", 1, 4, "元，亨，利，贞。其匪正有眚，不利有攸往。", "天下雷行，物与无妄；先王以茂对时，育万物。"),
+    (26, "大畜", 7, 1, "利贞，不家食吉，利涉大川。", "天在山中，大畜；君子以多识前言往行，以畜其德。"),
+    (27, "颐", 7, 4, "贞吉。观颐，自求口实。", "山下有雷，颐；君子以慎言语，节饮食。"),
+    (28, "大过", 2, 5, "栋桡，利有攸往，亨。", "泽灭木，大过；君子以独立不惧，遁世无闷。"),
+    (29, "坎", 6, 6, "习坎，有孚，维心亨，行有尚。", "水洊至，习坎；君子以常德行，习教事。"),
+    (30, "离", 3, 3, "利贞，亨。畜牝牛，吉。", "明两作，离；大人以继明照于四方。"),
+    (31, "咸", 2, 7, "亨，利贞，取女吉。", "山上有泽，咸；君子以虚受人。"),
+    (32, "恒", 4, 5, "亨，无咎，利贞，利有攸往。", "雷风，恒；君子以立不易方。"),
+    (33, "遁", 1, 7, "亨，小利贞。", "天下有山，遁；君子以远小人，不恶而严。"),
+    (34, "大壮", 4, 1, "利贞。", "雷在天上，大壮；君子以非礼弗履。"),
+    (35, "晋", 3, 8, "康侯用锡马蕃庶，昼日三接。", "明出地上，晋；君子以自昭明德。"),
+    (36, "明夷", 8, 3, "利艰贞。", "明入地中，明夷；君子以莅众，用晦而明。"),
+    (37, "家人", 5, 3, "利女贞。", "风自火出，家人；君子以言有物，而行有恒。"),
+    (38, "睽", 3, 2, "小事吉。", "上火下泽，睽；君子以同而异。"),
+    (39, "蹇", 6, 7, "利西南，不利东北；利见大人，贞吉。", "山上有水，蹇；君子以反身修德。"),
+    (40, "解", 4, 6, "利西南，无所往，其来复吉。有攸往，夙吉。", "雷雨作，解；君子以赦过宥罪。"),
+    (41, "损", 7, 2, "有孚，元吉，无咎，可贞，利有攸往。曷之用，二簋可用享。", "山下有泽，损；君子以惩忿窒欲。"),
+    (42, "益", 5, 4, "利有攸往，利涉大川。", "风雷，益；君子以见善则迁，有过则改。"),
+    (43, "夬", 2, 1, "扬于王庭，孚号，有厉，告自邑，不利即戎，利有攸往。", "泽上于天，夬；君子以施禄及下，居德则忌。"),
+    (44, "姤", 1, 5, "女壮，勿用取女。", "天下有风，姤；后以施命诰四方。"),
+    (45, "萃", 2, 8, "亨。王假有庙，利见大人，亨，利贞。用大牲吉，利有攸往。", "泽上于地，萃；君子以除戎器，戒不虞。"),
+    (46, "升", 8, 5, "元亨，用见大人，勿恤，南征吉。", "地中生木，升；君子以顺德，积小以高大。"),
+    (47, "困", 2, 6, "亨，贞，大人吉，无咎，有言不信。", "泽无水，困；君子以致命遂志。"),
+    (48, "井", 6, 5, "改邑不改井，无丧无得，往来井井。汔至亦未繘井，羸其瓶，凶。", "木上有水，井；君子以劳民劝相。"),
+    (49, "革", 2, 3, "己日乃孚，元亨利贞，悔亡。", "泽中有火，革；君子以治历明时。"),
+    (50, "鼎", 3, 5, "元吉，亨。", "木上有火，鼎；君子以正位凝命。"),
+    (51, "震", 4, 4, "亨。震来虩虩，笑言哑哑。震惊百里，不丧匕鬯。", "洊雷，震；君子以恐惧修省。"),
+    (52, "艮", 7, 7, "艮其背，不获其身，行其庭，不见其人，无咎。", "兼山，艮；君子以思不出其位。"),
+    (53, "渐", 5, 7, "女归吉，利贞。", "山上有木，渐；君子以居贤德善俗。"),
+    (54, "归妹", 4, 2, "征凶，无攸利。", "泽上有雷，归妹；君子以永终知敝。"),
+    (55, "丰", 4, 3, "亨，王假之，勿忧，宜日中。", "雷电皆至，丰；君子以折狱致刑。"),
+    (56, "旅", 3, 7, "小亨，旅贞吉。", "山上有火，旅；君子以明慎用刑，而不留狱。"),
+    (57, "巽", 5, 5, "小亨，利有攸往，利见大人。", "随风，巽；君子以申命行事。"),
+    (58, "兑", 2, 2, "亨，利贞。", "丽泽，兑；君子以朋友讲习。"),
+    (59, "涣", 5, 6, "亨。王假有庙，利涉大川，利贞。", "风行水上，涣；先王以享于帝立庙。"),
+    (60, "节", 6, 2, "亨。苦节不可贞。", "泽上有水，节；君子以制数度，议德行。"),
+    (61, "中孚", 5, 2, "豚鱼吉，利涉大川，利贞。", "泽上有风，中孚；君子以议狱缓死。"),
+    (62, "小过", 4, 7, "亨，利贞，可小事，不可大事。飞鸟遗之音，不宜上宜下，大吉。", "山上有雷，小过；君子以行过乎恭，丧过乎哀，用过乎俭。"),
+    (63, "既济", 6, 3, "亨，小利贞，初吉终乱。", "水在火上，既济；君子以思患而豫防之。"),
+    (64, "未济", 3, 6, "亨，小狐汔济，濡其尾，无攸利。", "火在水上，未济；君子以慎辨物居方。"),
+]
+
+TRIGRAM_BY_NUMBER = {t["number"]: t for t in TRIGRAMS}
+TRIGRAM_BY_LINES = {t["lines"]: t for t in TRIGRAMS}
+
+
+def _full_name(name, upper, lower):
+    """
+    卦的全称：上下卦相同时为“乾为天”，否则为“泽山咸”
+    """
+    if upper is lower:
+        return f"{upper['name']}为{upper['nature']}"
+    return f"{upper['nature']}{lower['nature']}{name}"
+
+
+def _build_hexagrams():
+    hexagrams = []
+    for number, name, upper_number, lower_number, judgment, image in _HEXAGRAM_DATA:
+        upper = TRIGRAM_BY_NUMBER[upper_number]
+        lower = TRIGRAM_BY_NUMBER[lower_number]
+        hexagrams.append({
+            "number": number,
+            "name": name,
+            "full_name": _full_name(name, upper, lower),
+            "upper": upper["name"],
+            "lower": lower["name"],
+            "lines": lower["lines"] + upper["lines"],
+            "judgment": judgment,
+            "image": image
+        })
+    return hexagrams
+
+
+HEXAGRAMS = _build_hexagrams()
+HEXAGRAM_BY_NUMBER = {h["number"]: h for h in HEXAGRAMS}
+HEXAGRAM_BY_TRIGRAMS = {(h["upper"], h["lower"]): h for h in HEXAGRAMS}
+HEXAGRAM_BY_LINES = {h["lines"]: h for h in HEXAGRAMS}
+
+
+def hexagram_by_trigrams(upper_number, lower_number):
+    """
+    按上下卦的先天数查卦
+    """
+    return HEXAGRAM_BY_TRIGRAMS[(TRIGRAM_BY_NUMBER[upper_number]["name"], TRIGRAM_BY_NUMBER[lower_number]["name"])]
+
+
+def hexagram_by_lines(lines):
+    """
+    按六爻（自下而上）查卦
+    """
+    return HEXAGRAM_BY_LINES[tuple(lines)]
@@ -1,6 +1,26 @@
+import os
 import re
+import logging
 from .llm_client import llm_client
+from .async_llm_client import async_llm_client
 from .persona_store import persona_store
+from .persona_cache import persona_cache
+from .token_counter import select_recent_messages
+from .conversation_memory import create_conversation_memory_from_env
+from .safety_filter import reply_safety_filter
+from .intent_classifier import intent_classifier
+
+logger = logging.getLogger(__name__)
+
+# 合并翻译模式下要求模型使用的输出格式
+FUSED_TRANSLATION_INSTRUCTION = """请严格按以下格式输出，不要输出任何其他内容：
+<reply>用【母语】写的回复原文</reply>
+<translation>这段回复的中文翻译，保持口语化和原本的语气特点，不要有翻译腔</translation>"""
+FUSED_REPLY_PATTERN = re.compile(r"<reply>(.*?)</reply>", re.DOTALL)
+FUSED_TRANSLATION_PATTERN = re.compile(r"<translation>(.*?)</translation>", re.DOTALL)
+
+# 回复使用这些语言时不需要翻译成中文
+NO_TRANSLATION_LANGUAGES = ("zh", "zh-cn", "chinese", "en", "english")
 
 IDOL_SYSTEM_PROMPT_CN = """你现在正在进行一段非常私密、安静的一对一对话。
 
@@ -33,7 +53,20 @@ IDOL_SYSTEM_PROMPT_CN = """你现在正在进行一段非常私密、安静的
 class IdolChatService:
     def __init__(self):
         self.llm_client = llm_client
+        self.async_llm_client = async_llm_client
+        self.safety_filter = reply_safety_filter
+        self.intent_classifier = intent_classifier
         self.persona_store = persona_store
+        self.persona_cache = persona_cache
+        # 对话记录的 token 预算（从最新消息往前填充）
+        self.history_token_budget = int(os.getenv("IDOL_HISTORY_TOKEN_BUDGET", "1500"))
+        self.history_max_messages = int(os.getenv("IDOL_HISTORY_MAX_MESSAGES", "20"))
+        # 更早的对话折叠成滚动摘要放进提示词，预算只用于摘要之后的消息
+        self.conversation_memory = create_conversation_memory_from_env(self.llm_client)
+        # 需要翻译时在一次调用中同时生成原文与中文翻译，格式不对时退回两次调用
+        self.fused_translation = os.getenv("IDOL_FUSED_TRANSLATION", "true").lower() == "true"
+        self.fused_translations = 0
+        self.fused_fallbacks = 0
 
     def _language_code_from_text(self, text):
         t = (text or "").lower()
@@ -117,11 +150,58 @@ class IdolChatService:
 
     def generate_persona_profile(self, idol_name):
         """
-        根据偶像姓名生成动态 Persona 配置（一次性执行）
+        根据偶像姓名生成动态 Persona 配置（按规范化名字缓存，过期后后台刷新）
         :param idol_name: 偶像姓名
         :return: 结构化 Persona 字典
         """
-        prompt = f"""你将收到一个真实存在的公众人物姓名。
+        try:
+            return self.persona_cache.get_or_generate(idol_name, self._fetch_persona_profile)
+        except Exception as e:
+            logger.error(f"Persona generation failed for {idol_name}: {e}")
+            return self._default_persona_profile(idol_name)
+
+    async def agenerate_persona_profile(self, idol_name):
+        """
+        generate_persona_profile 的异步版本
+        """
+        profile, is_stale = self.persona_cache.get(idol_name)
+        if profile is not None:
+            if is_stale:
+                self.persona_cache.refresh_in_background(idol_name, self._fetch_persona_profile)
+            return profile
+
+        prompt = self._create_persona_prompt(idol_name)
+
+        try:
+            response_text = await self.async_llm_client.generate_response(prompt)
+            profile = self._parse_persona_profile_text(idol_name, response_text)
+        except Exception as e:
+            logger.error(f"Persona generation failed for {idol_name}: {e}")
+            return self._default_persona_profile(idol_name)
+
+        self.persona_cache.put(idol_name, profile)
+        return profile
+
+    def prewarm_persona_profiles(self, idol_names):
+        """
+        在后台为热门偶像预先生成并缓存 Persona
+        :param idol_names: 已规范化的偶像名字列表
+        """
+        return self.persona_cache.prewarm(idol_names, self._fetch_persona_profile)
+
+    def _fetch_persona_profile(self, idol_name):
+        """
+        调用 LLM 生成 Persona（不经过缓存），失败时抛出异常
+        """
+        prompt = self._create_persona_prompt(idol_name)
+        response_text = self.llm_client.generate_response(prompt)
+        return self._parse_persona_profile_text(idol_name, response_text)
+
+    def _create_persona_prompt(self, idol_name):
+        """
+        创建提取偶像说话风格的提示词
+        """
+        return f"""你将收到一个真实存在的公众人物姓名。
 
 你的任务不是介绍这个人，也不是总结经历，
 而是判断：这个人在现实生活中，私下说话大概是什么样子。
@@ -142,29 +222,28 @@ class IdolChatService:
 【明显避免的说话方式】（例如：说教、总结、正能量等）
 
 姓名：{idol_name}"""
-        
-        try:
-            response_text = self.llm_client.generate_response(prompt)
-            return self._parse_persona_profile_text(idol_name, response_text)
-        except Exception as e:
-            print(f"Persona generation failed: {e}")
-            return {
-                "name": idol_name,
-                "is_real_person": True,
-                "default_language": "zh",
-                "mother_tongue": "中文",
-                "common_languages": "中文",
-                "speaking_pace": "慢",
-                "tone_features": "温柔、克制",
-                "emotion_expression": "先共情，再轻轻回应",
-                "response_habits": "偶尔反问，更多是陪着说",
-                "avoid_style": "说教、总结、过度正能量",
-                "tone": ["温柔", "克制"],
-                "culture": "",
-                "speech_style_notes": "自然口语，句子不完整，停顿多",
-                "allowed_references": "公开信息",
-                "disallowed": "隐私"
-            }
+
+    def _default_persona_profile(self, idol_name):
+        """
+        Persona 生成失败时使用的保底配置
+        """
+        return {
+            "name": idol_name,
+            "is_real_person": True,
+            "default_language": "zh",
+            "mother_tongue": "中文",
+            "common_languages": "中文",
+            "speaking_pace": "慢",
+            "tone_features": "温柔、克制",
+            "emotion_expression": "先共情，再轻轻回应",
+            "response_habits": "偶尔反问，更多是陪着说",
+            "avoid_style": "说教、总结、过度正能量",
+            "tone": ["温柔", "克制"],
+            "culture": "",
+            "speech_style_notes": "自然口语，句子不完整，停顿多",
+            "allowed_references": "公开信息",
+            "disallowed": "隐私"
+        }
 
     def generate_idol_response(self, idol_info, session, translate=False):
         """
@@ -174,34 +253,196 @@ class IdolChatService:
         :param translate: 如果 True，附带中文翻译（当偶像为非中文母语时）
         :return: dict { persona_reply, language, translation(optional), reminder_virtual }
         """
-        recent_messages = session.messages[-10:]
+        summary, recent_messages = self._recent_messages(session, idol_info)
+        prefix = self.prompt_prefix(session, idol_info)
 
-        prompt = self._create_chat_prompt(idol_info, recent_messages)
+        if self.fused_translation and translate and self.needs_translation(idol_info):
+            fused_prompt = self._create_chat_prompt(idol_info, recent_messages, fused_translation=True, summary=summary, prefix=prefix)
+            reply = self._build_fused_reply(idol_info, self.llm_client.generate_response(fused_prompt))
+            if reply:
+                return reply
+
+        prompt = self._create_chat_prompt(idol_info, recent_messages, summary=summary, prefix=prefix)
         response = self.llm_client.generate_response(prompt)
 
+        reply = self._build_reply(idol_info, response)
+        trans_prompt = self._create_translation_prompt(idol_info, reply, translate)
+        if trans_prompt:
+            reply['translation'] = self.safety_filter.filter(self.llm_client.generate_response(trans_prompt, cache=True))
+
+        return reply
+
+    async def agenerate_idol_response(self, idol_info, session, translate=False):
+        """
+        generate_idol_response 的异步版本
+        """
+        summary, recent_messages = self._recent_messages(session, idol_info)
+        prefix = self.prompt_prefix(session, idol_info)
+
+        if self.fused_translation and translate and self.needs_translation(idol_info):
+            fused_prompt = self._create_chat_prompt(idol_info, recent_messages, fused_translation=True, summary=summary, prefix=prefix)
+            reply = self._build_fused_reply(idol_info, await self.async_llm_client.generate_response(fused_prompt))
+            if reply:
+                return reply
+
+        prompt = self._create_chat_prompt(idol_info, recent_messages, summary=summary, prefix=prefix)
+        response = await self.async_llm_client.generate_response(prompt)
+
+        reply = self._build_reply(idol_info, response)
+        trans_prompt = self._create_translation_prompt(idol_info, reply, translate)
+        if trans_prompt:
+            reply['translation'] = self.safety_filter.filter(await self.async_llm_client.generate_response(trans_prompt, cache=True))
+
+        return reply
+
+    def stream_idol_response(self, idol_info, session, translate=False):
+        """
+        流式生成偶像回复（生成器）
+        逐段产出经过安全过滤的文本增量，结束后再补充翻译
+        :return: 与 generate_idol_response 相同结构的 dict（生成器返回值）
+        """
+        summary, recent_messages = self._recent_messages(session, idol_info)
+        prefix = self.prompt_prefix(session, idol_info)
+
+        prompt = self._create_chat_prompt(idol_info, recent_messages, summary=summary, prefix=prefix)
+        stream_filter = self.safety_filter.stream()
+        chunks = []
+        for delta in self._strip_streamed_name_prefix(idol_info, self.llm_client.stream_response(prompt)):
+            chunks.append(delta)
+            text = stream_filter.feed(delta)
+            if text:
+                yield text
+        text = stream_filter.close()
+        if text:
+            yield text
+
+        # 称呼前缀已在流中去掉，这里不再重复处理，保证保存的文本与推送的一致
+        reply = self._build_reply(idol_info, "".join(chunks), strip_prefix=False)
+        trans_prompt = self._create_translation_prompt(idol_info, reply, translate)
+        if trans_prompt:
+            reply['translation'] = self.safety_filter.filter(self.llm_client.generate_response(trans_prompt, cache=True))
+
+        return reply
+
+    def translate_reply(self, idol_info, text):
+        """
+        将一条偶像回复翻译成中文（惰性翻译接口使用）
+        """
+        prompt = self._create_translation_prompt(idol_info, {"persona_reply": text}, True)
+        return self.safety_filter.filter(self.llm_client.generate_response(prompt, cache=True))
+
+    async def atranslate_reply(self, idol_info, text):
+        """
+        translate_reply 的异步版本
+        """
+        prompt = self._create_translation_prompt(idol_info, {"persona_reply": text}, True)
+        return self.safety_filter.filter(await self.async_llm_client.generate_response(prompt, cache=True))
+
+    def _recent_messages(self, session, idol_info):
+        """
+        取放进提示词的滚动摘要，并按 token 预算从摘要之后的消息中选取对话记录
+        :return: (摘要或 None, 消息列表)
+        """
+        summary, messages = self.conversation_memory.context(session, idol_info)
+        return summary, select_recent_messages(messages, self.history_token_budget, self.history_max_messages)
+
+    def _strip_name_prefix(self, idol_info, text):
+        """
+        去掉模型输出开头的称呼前缀（如“你：”“Lady Gaga:”）
+        """
         name = idol_info.get('name', '')
-        response = re.sub(rf"^(你|我|AI|助手|Assistant|{re.escape(name)})[：:]\s*", "", response, flags=re.IGNORECASE).strip()
+        return re.sub(rf"^(你|我|AI|助手|Assistant|{re.escape(name)})[：:]\s*", "", text, flags=re.IGNORECASE)
+
+    def _strip_streamed_name_prefix(self, idol_info, deltas):
+        """
+        在流式输出上做与 _build_reply 相同的称呼前缀清理
+        开头几段先缓冲，直到出现冒号或长度已超过最长的前缀，再判断并去掉前缀与开头的空白
+        :param deltas: 模型输出的文本增量
+        :return: 清理后的文本增量（生成器）
+        """
+        limit = max(len(idol_info.get('name', '')), len('Assistant')) + 1
+        head = ""
+        started = False
+        for delta in deltas:
+            if head is not None:
+                head += delta
+                if len(head) <= limit and not re.search(r"[：:]", head):
+                    continue
+                delta, head = self._strip_name_prefix(idol_info, head), None
+            if not started:
+                delta = delta.lstrip()
+                if not delta:
+                    continue
+                started = True
+            yield delta
+        # 整段输出都没有超过缓冲长度
+        if head:
+            head = self._strip_name_prefix(idol_info, head).lstrip()
+            if head:
+                yield head
+
+    def _build_reply(self, idol_info, response, strip_prefix=True):
+        """
+        清理模型输出的称呼前缀并做安全过滤，组装回复结构
+        :param strip_prefix: 流式输出已在推送时清理过前缀，传 False 跳过
+        """
+        if strip_prefix:
+            response = self._strip_name_prefix(idol_info, response)
+        response = self.safety_filter.filter(response.strip())
         
-        reply = {
+        return {
             "persona_reply": response,
             "language": (idol_info.get('default_language') or 'zh').lower(),
             "reminder_virtual": "提示：本对话由虚拟 AI 人设扮演，仅供娱乐与情绪陪伴。"
         }
 
+    def _build_fused_reply(self, idol_info, response):
+        """
+        从合并输出中解析原文与翻译；任一部分缺失时返回 None，由调用方退回两次调用
+        """
+        original = FUSED_REPLY_PATTERN.search(response or "")
+        translation = FUSED_TRANSLATION_PATTERN.search(response or "")
+        if not original or not translation or not original.group(1).strip() or not translation.group(1).strip():
+            self.fused_fallbacks += 1
+            return None
+
+        self.fused_translations += 1
+        reply = self._build_reply(idol_info, original.group(1).strip())
+        reply['translation'] = self.safety_filter.filter(translation.group(1).strip())
+        return reply
+
+    def translation_stats(self):
+        """
+        返回合并翻译的成功与退回次数
+        """
+        return {
+            "fused_translation": self.fused_translation,
+            "fused": self.fused_translations,
+            "fallbacks": self.fused_fallbacks
+        }
+
+    def needs_translation(self, idol_info):
+        """
+        判断 Persona 的回复是否需要翻译成中文（中文与英文回复不翻译），路由与服务共用这一条规则
+        :param idol_info: Persona 配置
+        :return: bool
+        """
         lang = (idol_info.get('default_language') or 'zh').lower()
-        if translate and lang not in ['zh', 'en']:
-            trans_prompt = f"请将以下内容翻译成中文，保持口语化和原本的语气特点，不要有翻译腔：\n\n{response}"
-            translation = self.llm_client.generate_response(trans_prompt)
-            reply['translation'] = translation
+        return lang not in NO_TRANSLATION_LANGUAGES
 
-        return reply
+    def _create_translation_prompt(self, idol_info, reply, translate):
+        """
+        创建翻译提示词；不需要翻译时返回 None
+        """
+        if not (translate and self.needs_translation(idol_info)):
+            return None
+        return f"请将以下内容翻译成中文，保持口语化和原本的语气特点，不要有翻译腔：\n\n{reply['persona_reply']}"
     
-    def _create_chat_prompt(self, idol_info, messages):
+    def build_prompt_prefix(self, idol_info):
         """
-        创建聊天提示词，整合系统提示词、动态 Persona 和对话历史
+        生成提示词的固定前缀：系统提示词 + 渲染好的 Persona 说话习惯。
+        只由 Persona 决定，同一个 Persona 每次生成的内容逐字节相同
         """
-        name = idol_info.get("name", "Unknown Idol")
-
         mother_tongue = idol_info.get("mother_tongue", "")
         common_languages = idol_info.get("common_languages", "")
         speaking_pace = idol_info.get("speaking_pace", "")
@@ -224,20 +465,33 @@ class IdolChatService:
 
 不要解释自己是谁，不要复述设定，不要说“作为某某偶像/作为AI”，只当成“我”在和“你”聊天。"""
 
-        conversation = "对话记录：\n"
-        for msg in messages:
-            role = "我" if msg.role == "user" else "你"
-            conversation += f"{role}：{msg.content}\n"
-
-        prompt = f"""{IDOL_SYSTEM_PROMPT_CN}
+        return f"{IDOL_SYSTEM_PROMPT_CN}\n\n{dynamic_persona_injection}"
 
-{dynamic_persona_injection}
-
-{conversation}
+    def prompt_prefix(self, session, idol_info):
+        """
+        取会话的固定前缀：首次使用时生成并保存在会话上（重新召唤偶像时 apply_persona 会清空）
+        """
+        if session.prompt_prefix is None:
+            session.prompt_prefix = self.build_prompt_prefix(idol_info)
+        return session.prompt_prefix
 
-你："""
-        
-        return prompt.strip()
+    def _create_chat_prompt(self, idol_info, messages, fused_translation=False, summary=None, prefix=None):
+        """
+        创建按角色拆分的聊天消息列表。
+        第一条 system 消息是固定前缀，之后依次是滚动摘要、对话历史（user / assistant）与本次调用的附加要求：
+        变化的内容都排在固定前缀之后，服务商的前缀缓存（DeepSeek 上下文硬盘缓存）每轮都能命中
+        :param fused_translation: 是否要求在同一次输出中附带中文翻译
+        :param summary: 更早对话的摘要（没有时为 None）
+        :param prefix: 会话保存的固定前缀，None 时按 idol_info 生成
+        """
+        prompt = [{"role": "system", "content": prefix or self.build_prompt_prefix(idol_info)}]
+        if summary:
+            prompt.append({"role": "system", "content": f"之前聊过的内容（备忘）：\n{summary}"})
+        for msg in messages:
+            prompt.append({"role": "user" if msg.role == "user" else "assistant", "content": msg.content})
+        if fused_translation:
+            prompt.append({"role": "system", "content": FUSED_TRANSLATION_INSTRUCTION})
+        return prompt
     
     def detect_divination_intent(self, message):
         """
@@ -245,21 +499,7 @@ class IdolChatService:
         :param message: 用户消息
         :return: 占卜类型，如果没有则返回None
         """
-        divination_keywords = {
-            "love": ["爱情", "恋爱", "暗恋", "表白", "感情", "伴侣"],
-            "career": ["事业", "工作", "职场", "职业", "升职", "跳槽"],
-            "fortune": ["运势", "运气", "财运", "健康", "整体运势"],
-            "study": ["学习", "考试", "学业", "成绩", "学习方法"]
-        }
-        
-        message_lower = message.lower()
-        
-        for div_type, keywords in divination_keywords.items():
-            for keyword in keywords:
-                if keyword in message_lower:
-                    return div_type
-        
-        return None
+        return self.intent_classifier.classify(message).divination_type
     
     def get_idol_list(self):
         """
@@ -0,0 +1,154 @@
+"""
+聊天热路径上的意图识别：占卜类型、肯定/否定、是否像偶像名字
+
+关键词表在启动时编译为一个 Aho-Corasick 自动机，每条消息只扫描一遍即可得到全部结果，
+不调用 LLM。关键词表可以用 INTENT_KEYWORDS_PATH 指向的 JSON 文件覆盖（结构同 DEFAULT_KEYWORD_TABLES，
+只需写要覆盖的键）。
+"""
+import os
+import re
+import json
+import logging
+from collections import namedtuple
+from .phrase_automaton import PhraseAutomaton
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEYWORD_TABLES = {
+    # 按顺序判断，多个类型同时命中时取靠前的
+    "divination": {
+        "love": ["爱情", "恋爱", "暗恋", "表白", "感情", "伴侣"],
+        "career": ["事业", "工作", "职场", "职业", "升职", "跳槽"],
+        "fortune": ["运势", "运气", "财运", "健康", "整体运势"],
+        "study": ["学习", "考试", "学业", "成绩", "学习方法"]
+    },
+    "negative": ["不需要", "不用", "不要", "算了", "不想", "没事", "不了", "先不用"],
+    "affirmative": ["需要", "想", "要", "好的", "好", "可以", "嗯", "想聊", "陪伴", "请"],
+    # 出现在名字部分时说明用户不是在报名字
+    "not_name": ["占卜", "问题", "建议", "陪伴", "聊聊", "需要", "不需要", "不用", "不要"]
+}
+
+_NAME_STRIP_CHARS = " \t\r\n\"'“”‘’"
+# 名字前的“我想召唤”“一位虚拟偶像”等前缀，依次去掉
+_NAME_PREFIX_PATTERNS = [
+    re.compile(r"(我想|想|我要|要|请|帮我|给我|召唤|召请|请你召唤|请召唤)[：:\s]*"),
+    re.compile(r"(一位|一个)?(虚拟)?(偶像)?(疗愈师)?[：:\s]*")
+]
+_LATIN_NAME_PATTERN = re.compile(r"[A-Za-z][A-Za-z .'\-]{1,39}")
+_CJK_NAME_PATTERN = re.compile(r"[\u4e00-\u9fff·\s]{2,20}")
+
+MessageIntent = namedtuple("MessageIntent", ["divination_type", "negative", "affirmative", "idol_name", "looks_like_name"])
+
+_NEGATIVE = "negative"
+_AFFIRMATIVE = "affirmative"
+_NOT_NAME = "not_name"
+
+
+def _name_span(text):
+    """
+    去掉首尾空白、引号与称呼前缀后，名字在原文中的位置
+    :return: (start, end)
+    """
+    start, end = 0, len(text)
+    while start < end and (text[start].isspace() or text[start] in _NAME_STRIP_CHARS):
+        start += 1
+    while end > start and (text[end - 1].isspace() or text[end - 1] in _NAME_STRIP_CHARS):
+        end -= 1
+    for pattern in _NAME_PREFIX_PATTERNS:
+        match = pattern.match(text, start, end)
+        if match:
+            start = match.end()
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def normalize_idol_name(text):
+    """
+    从“我想召唤周杰伦”这类输入中取出名字
+    """
+    text = text or ""
+    start, end = _name_span(text)
+    return text[start:end]
+
+
+class IntentClassifier:
+    def __init__(self, tables=None):
+        """
+        :param tables: 关键词表，结构同 DEFAULT_KEYWORD_TABLES
+        """
+        tables = tables or DEFAULT_KEYWORD_TABLES
+        self.divination_types = list(tables["divination"])
+        # 同一个关键词可能属于多张表，例如“需要”既是肯定词也说明不是名字
+        labels_by_phrase = {}
+        for div_type, keywords in tables["divination"].items():
+            for keyword in keywords:
+                labels_by_phrase.setdefault(keyword, set()).add(div_type)
+        for label in (_NEGATIVE, _AFFIRMATIVE, _NOT_NAME):
+            for keyword in tables[label]:
+                labels_by_phrase.setdefault(keyword, set()).add(label)
+
+        phrases = list(labels_by_phrase)
+        self.automaton = PhraseAutomaton(phrases)
+        self._labels = [frozenset(labels_by_phrase[phrase]) for phrase in phrases]
+
+    def classify(self, text):
+        """
+        一次扫描得到消息的全部意图
+        :return: MessageIntent
+        """
+        text = text or ""
+        matches, _ = self.automaton.scan(text)
+        name_start, name_end = _name_span(text)
+
+        labels = set()
+        not_name = False
+        for start, end, index in matches:
+            phrase_labels = self._labels[index]
+            labels |= phrase_labels
+            if _NOT_NAME in phrase_labels and start >= name_start and end <= name_end:
+                not_name = True
+
+        negative = _NEGATIVE in labels
+        divination_type = next((t for t in self.divination_types if t in labels), None)
+        looks_like_name = name_end > name_start and not not_name and bool(
+            _LATIN_NAME_PATTERN.fullmatch(text, name_start, name_end)
+            or _CJK_NAME_PATTERN.fullmatch(text, name_start, name_end)
+        )
+        return MessageIntent(
+            divination_type=divination_type,
+            negative=negative,
+            affirmative=_AFFIRMATIVE in labels and not negative,
+            idol_name=text[name_start:name_end],
+            looks_like_name=looks_like_name
+        )
+
+
+def load_keyword_tables(path):
+    """
+    读取 JSON 关键词表，未写的键使用默认值
+    """
+    with open(path, encoding="utf-8") as f:
+        overrides = json.load(f)
+    tables = dict(DEFAULT_KEYWORD_TABLES)
+    tables.update(overrides)
+    return tables
+
+
+def create_intent_classifier_from_env():
+    """
+    根据环境变量创建意图识别器：INTENT_KEYWORDS_PATH 关键词表 JSON 文件（不设置或读取失败时使用默认表）
+    """
+    path = os.getenv("INTENT_KEYWORDS_PATH")
+    if path:
+        try:
+            return IntentClassifier(load_keyword_tables(path))
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load intent keywords from {path}: {e}")
+    return IntentClassifier()
+
+
+# 全局意图识别器实例
+intent_classifier = create_intent_classifier_from_env()
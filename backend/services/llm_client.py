@@ -1,47 +1,301 @@
 import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import openai
+from .response_cache import response_cache, make_cache_key
+from .single_flight import SingleFlight
+from .model_router import create_model_router_from_env
+from .prompt_cache_stats import prompt_cache_stats
+from .resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    backoff_delay,
+    call_with_hedge,
+    create_circuit_breakers_from_env,
+    is_retryable,
+)
 
 # 加载环境变量
 load_dotenv()
 
+DEEPSEEK_API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/chat/completions")
+
+
+def chat_messages(prompt):
+    """
+    把提示词转换成请求中的 messages：字符串作为一条 user 消息，已经按角色拆分的消息列表原样使用
+    """
+    if isinstance(prompt, str):
+        return [{"role": "user", "content": prompt}]
+    return list(prompt)
+
+
 class LLMClient:
     def __init__(self):
         # 配置API密钥
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.deepseek_api_key = os.getenv("DEEPSEEK_API_KEY")
         self.default_model = os.getenv("DEFAULT_MODEL", "deepseek-chat")
-        
+
+        # 配置HTTP连接池（DeepSeek 与 OpenAI 共用，避免每次调用重新握手）
+        self.pool_connections = int(os.getenv("LLM_POOL_CONNECTIONS", "4"))
+        self.pool_maxsize = int(os.getenv("LLM_POOL_MAXSIZE", "32"))
+        self.keep_alive = os.getenv("LLM_KEEP_ALIVE", "true").lower() == "true"
+        self.connect_timeout = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+        self.read_timeout = float(os.getenv("LLM_READ_TIMEOUT", "90"))
+        self._http_session = None
+        self._http_lock = threading.Lock()
+
+        # 配置响应缓存（cache=None 的调用是否默认走缓存）
+        self.response_cache = response_cache if os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true" else None
+        self.cache_default = os.getenv("LLM_CACHE_DEFAULT", "false").lower() == "true"
+
+        # 合并并发中的相同请求，只向上游发送一次
+        self.single_flight = SingleFlight() if os.getenv("LLM_SINGLE_FLIGHT", "true").lower() == "true" else None
+
+        # 重试退避、对冲请求与熔断配置
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.backoff_base = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+        self.backoff_cap = float(os.getenv("LLM_BACKOFF_CAP", "8"))
+        self.hedge_enabled = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+        self.hedge_percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        self.hedge_min_delay = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+        self.hedge_min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+        self.circuit_breakers = create_circuit_breakers_from_env()
+        self.latency = {provider: LatencyTracker() for provider in self.circuit_breakers}
+        self.hedged_requests = 0
+        self._hedge_executor = None
+
+        # 多端点路由：在允许的端点中选择最快的健康端点，失败时自动切换
+        self.router = create_model_router_from_env(self.default_model, is_available=self._endpoint_available)
+
+        # 服务商 usage 中的提示词缓存命中统计
+        self.prompt_cache_stats = prompt_cache_stats
+
         # 配置OpenAI客户端
         if self.openai_api_key:
             openai.api_key = self.openai_api_key
-    
-    def generate_response(self, prompt, model=None, max_tokens=2000, temperature=0.7):
+            openai.requestssession = self.get_http_session
+
+    @property
+    def timeout(self):
+        """
+        requests 使用的 (连接超时, 读取超时)
+        """
+        return (self.connect_timeout, self.read_timeout)
+
+    def get_http_session(self):
+        """
+        获取长连接的 HTTP 会话（惰性创建，线程安全）
+        底层 urllib3 连接池本身是线程安全的，所有线程共享同一个池
+        """
+        if self._http_session is None:
+            with self._http_lock:
+                if self._http_session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_connections,
+                        pool_maxsize=self.pool_maxsize,
+                        max_retries=0
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers["Connection"] = "keep-alive" if self.keep_alive else "close"
+                    self._http_session = session
+        return self._http_session
+
+    def close(self):
+        """
+        关闭连接池
+        """
+        with self._http_lock:
+            if self._http_session is not None:
+                self._http_session.close()
+                self._http_session = None
+            if self._hedge_executor is not None:
+                self._hedge_executor.shutdown(wait=False)
+                self._hedge_executor = None
+
+    def generate_response(self, prompt, model=None, max_tokens=2000, temperature=0.7, cache=None, cache_ttl=None):
         """
         生成LLM响应
-        :param prompt: 提示词
-        :param model: 使用的模型
+        :param prompt: 提示词（字符串，或按角色拆分的消息列表）
+        :param model: 使用的模型，None 时由路由器在 LLM_ENDPOINTS 配置的端点中选择
         :param max_tokens: 最大令牌数
         :param temperature: 温度参数
+        :param cache: 是否使用响应缓存，None 时按 LLM_CACHE_DEFAULT 决定
+        :param cache_ttl: 写入缓存的过期秒数，None 时使用缓存默认值
         :return: 生成的响应文本
         """
-        model = model or self.default_model
+        key_model = model or self.default_model
+
+        cache_key = self._cache_key(prompt, key_model, max_tokens, temperature, cache)
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
         
         try:
-            if model.startswith("deepseek"):
-                return self._call_deepseek(prompt, model, max_tokens, temperature)
+            if self.single_flight is not None:
+                flight_key = cache_key or make_cache_key(key_model, prompt, temperature, max_tokens)
+                result = self.single_flight.do(flight_key, lambda: self._dispatch(prompt, model, max_tokens, temperature))
             else:
-                return self._call_openai(prompt, model, max_tokens, temperature)
+                result = self._dispatch(prompt, model, max_tokens, temperature)
         except Exception as e:
             raise Exception(f"LLM调用失败: {str(e)}")
+
+        if cache_key and result:
+            self.response_cache.set(cache_key, result, cache_ttl)
+        return result
+
+    def _endpoint_available(self, endpoint):
+        """
+        端点所属服务商的熔断器没有打开时才参与路由
+        """
+        return self.circuit_breakers[endpoint.provider].state != CircuitBreaker.OPEN
+
+    def _dispatch(self, prompt, model, max_tokens, temperature):
+        """
+        由路由器选择端点并发起调用：服务商熔断时直接失败；
+        可重试的错误会切换到其他端点，没有其他端点时按指数退避加抖动重试同一个；
+        慢请求可选地发出对冲请求
+        """
+        failed = set()
+        for attempt in range(self.max_retries):
+            endpoint = self.router.select(model, exclude=failed)
+            if endpoint.name in failed:
+                time.sleep(backoff_delay(attempt - 1, self.backoff_base, self.backoff_cap))
+
+            provider = endpoint.provider
+            breaker = self.circuit_breakers[provider]
+            if not breaker.allow_request():
+                raise CircuitOpenError(f"{provider} 服务暂时不可用（熔断中）")
+
+            call = self._call_deepseek if provider == "deepseek" else self._call_openai
+            started = time.monotonic()
+            try:
+                result = self._call_with_optional_hedge(provider, lambda: call(prompt, endpoint.model, max_tokens, temperature))
+            except Exception as e:
+                if not is_retryable(e):
+                    # 请求本身有问题（4xx），服务商是健康的
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                self.router.record_failure(endpoint)
+                failed.add(endpoint.name)
+                if attempt == self.max_retries - 1:
+                    raise
+                continue
+
+            elapsed = time.monotonic() - started
+            breaker.record_success()
+            self.latency[provider].record(elapsed)
+            self.router.record_success(endpoint, elapsed)
+            return result
+
+    def _hedge_delay(self, provider):
+        """
+        对冲请求的触发延迟：历史耗时的指定分位数；样本不足或未开启时返回 None
+        """
+        tracker = self.latency[provider]
+        if not self.hedge_enabled or len(tracker) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, tracker.percentile(self.hedge_percentile))
+
+    def _call_with_optional_hedge(self, provider, fn):
+        hedge_delay = self._hedge_delay(provider)
+        if hedge_delay is None:
+            return fn()
+
+        if self._hedge_executor is None:
+            with self._http_lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(max_workers=self.pool_maxsize, thread_name_prefix="llm-hedge")
+        result, hedged = call_with_hedge(fn, hedge_delay, self._hedge_executor)
+        if hedged:
+            self.hedged_requests += 1
+        return result
+
+    def resilience_stats(self):
+        """
+        返回各服务商的熔断器状态、耗时分位数与对冲次数，用于监控
+        """
+        return {
+            "circuit_breakers": {provider: breaker.stats() for provider, breaker in self.circuit_breakers.items()},
+            "latency_p50": {provider: tracker.percentile(50) for provider, tracker in self.latency.items()},
+            "latency_p95": {provider: tracker.percentile(95) for provider, tracker in self.latency.items()},
+            "hedged_requests": self.hedged_requests,
+            "endpoints": self.router.stats()
+        }
+
+    def _cache_key(self, prompt, model, max_tokens, temperature, cache):
+        """
+        计算本次调用的缓存键；不使用缓存时返回 None
+        """
+        use_cache = self.cache_default if cache is None else cache
+        if not use_cache or self.response_cache is None:
+            return None
+        return make_cache_key(model, prompt, temperature, max_tokens)
     
+    def stream_response(self, prompt, model=None, max_tokens=2000, temperature=0.7):
+        """
+        流式生成LLM响应（生成器）
+        :param prompt: 提示词（字符串，或按角色拆分的消息列表）
+        :param model: 使用的模型，None 时由路由器选择
+        :param max_tokens: 最大令牌数
+        :param temperature: 温度参数
+        :return: 逐段产出服务端返回的文本增量
+        """
+        failed = set()
+        try:
+            while True:
+                endpoint = self.router.select(model, exclude=failed)
+                if endpoint.name in failed:
+                    # 所有端点都已失败（各端点内部已经重试过）
+                    raise error
+                provider = endpoint.provider
+                breaker = self.circuit_breakers[provider]
+                if not breaker.allow_request():
+                    raise CircuitOpenError(f"{provider} 服务暂时不可用（熔断中）")
+
+                stream = self._stream_deepseek if provider == "deepseek" else self._stream_openai
+                started = False
+                try:
+                    for delta in stream(prompt, endpoint.model, max_tokens, temperature):
+                        started = True
+                        yield delta
+                except GeneratorExit:
+                    # 调用方提前结束读取，服务商本身是正常的
+                    breaker.record_success()
+                    raise
+                except Exception as e:
+                    if not is_retryable(e):
+                        breaker.record_success()
+                        raise
+                    breaker.record_failure()
+                    self.router.record_failure(endpoint)
+                    # 已经输出过内容时不再切换端点，避免重复内容
+                    if started:
+                        raise
+                    failed.add(endpoint.name)
+                    error = e
+                    continue
+                breaker.record_success()
+                self.router.record_success(endpoint)
+                return
+        except Exception as e:
+            raise Exception(f"LLM调用失败: {str(e)}")
+
     def _call_deepseek(self, prompt, model, max_tokens, temperature):
         """
         调用DeepSeek API
         """
-        import requests
-        
-        url = "https://api.deepseek.com/chat/completions"
         headers = {
             "Authorization": f"Bearer {self.deepseek_api_key}",
             "Content-Type": "application/json"
@@ -49,36 +303,107 @@ class LLMClient:
         
         data = {
             "model": model,
-            "messages": [{"role": "user", "content": prompt}],
+            "messages": chat_messages(prompt),
             "max_tokens": max_tokens,
             "temperature": temperature,
             "stream": False
         }
         
-        import time
-        for attempt in range(3):
+        http = self.get_http_session()
+        response = http.post(DEEPSEEK_API_URL, headers=headers, json=data, timeout=self.timeout)
+        response.raise_for_status()
+        payload = response.json()
+        self.prompt_cache_stats.record("deepseek", payload.get("usage"))
+        return payload["choices"][0]["message"]["content"]
+    
+    def _stream_deepseek(self, prompt, model, max_tokens, temperature):
+        """
+        以 SSE 方式调用DeepSeek API，逐段产出 delta 内容
+        已经开始输出后不再重试，避免重复内容
+        """
+        headers = {
+            "Authorization": f"Bearer {self.deepseek_api_key}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream"
+        }
+
+        data = {
+            "model": model,
+            "messages": chat_messages(prompt),
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": True,
+            # 最后一个分片附带 usage，用于统计提示词缓存命中
+            "stream_options": {"include_usage": True}
+        }
+
+        http = self.get_http_session()
+        for attempt in range(self.max_retries):
             try:
-                response = requests.post(url, headers=headers, json=data, timeout=90)
+                response = http.post(DEEPSEEK_API_URL, headers=headers, json=data, timeout=self.timeout, stream=True)
                 response.raise_for_status()
-                return response.json()["choices"][0]["message"]["content"]
+                break
             except Exception as e:
-                if attempt == 2: raise e
-                time.sleep(1)
-        
-        return "占卜由于网络波动未果，请稍后再试。"
-    
+                if attempt == self.max_retries - 1 or not is_retryable(e):
+                    raise
+                time.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_cap))
+
+        with response:
+            # SSE 固定使用 UTF-8；服务端未声明 charset 时 requests 会按 ISO-8859-1 解码，这里按字节切行后自行解码
+            for raw_line in response.iter_lines():
+                line = raw_line.decode("utf-8")
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                if chunk.get("usage"):
+                    self.prompt_cache_stats.record("deepseek", chunk["usage"])
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+
     def _call_openai(self, prompt, model, max_tokens, temperature):
         """
-        调用OpenAI API
+        调用OpenAI API（通过 openai.requestssession 复用同一个连接池）
         """
         response = openai.ChatCompletion.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}],
+            messages=chat_messages(prompt),
             max_tokens=max_tokens,
-            temperature=temperature
+            temperature=temperature,
+            request_timeout=self.timeout
         )
-        
+
+        self.prompt_cache_stats.record("openai", response.get("usage"))
         return response.choices[0].message.content
 
+    def _stream_openai(self, prompt, model, max_tokens, temperature):
+        """
+        流式调用OpenAI API
+        """
+        response = openai.ChatCompletion.create(
+            model=model,
+            messages=chat_messages(prompt),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            request_timeout=self.timeout,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+        for chunk in response:
+            if chunk.get("usage"):
+                self.prompt_cache_stats.record("openai", chunk["usage"])
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.get("content")
+            if delta:
+                yield delta
+
 # 创建全局LLM客户端实例
 llm_client = LLMClient()
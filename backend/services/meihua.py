@@ -0,0 +1,120 @@
+"""
+梅花易数起卦（本地计算，不调用 LLM）
+
+支持时间起卦、报数起卦与文字起卦，得到本卦、动爻、变卦与互卦。
+与传统做法的差异：时间起卦使用公历年月日（年取地支序数），不换算农历；
+文字起卦以汉字笔画数为数，这里没有笔画字典，改用字符的 Unicode 码位求和，结果同样稳定可复现。
+"""
+import re
+from datetime import datetime
+from .hexagram_table import hexagram_by_lines, hexagram_by_trigrams
+
+LINE_POSITIONS = ["初", "二", "三", "四", "五", "上"]
+_NUMBER_PATTERN = re.compile(r"\d+")
+
+
+def _trigram_number(n):
+    """
+    除以 8 取余得卦，余 0 作 8（坤）
+    """
+    return n % 8 or 8
+
+
+def _moving_line(n):
+    """
+    除以 6 取余得动爻（1 为初爻），余 0 作 6（上爻）
+    """
+    return n % 6 or 6
+
+
+def year_branch_number(year):
+    """
+    年的地支序数：子年为 1 …… 亥年为 12
+    """
+    return (year - 4) % 12 + 1
+
+
+def hour_branch_number(hour):
+    """
+    时辰的地支序数：子时（23-1 点）为 1 …… 亥时为 12
+    """
+    return (hour + 1) // 2 % 12 + 1
+
+
+def line_name(position, is_yang):
+    """
+    爻名：初九、六二 …… 上六
+    :param position: 1-6，自下而上
+    """
+    number = "九" if is_yang else "六"
+    place = LINE_POSITIONS[position - 1]
+    if position in (1, 6):
+        return f"{place}{number}"
+    return f"{number}{place}"
+
+
+def build_casting(upper_number, lower_number, moving_line, method):
+    """
+    由上下卦与动爻推出本卦、变卦、互卦
+    :return: dict { method, hexagram, moving_line, moving_line_name, changed, mutual }
+    """
+    hexagram = hexagram_by_trigrams(upper_number, lower_number)
+    lines = list(hexagram["lines"])
+
+    changed_lines = list(lines)
+    changed_lines[moving_line - 1] = 1 - changed_lines[moving_line - 1]
+    # 互卦：二三四爻为下卦，三四五爻为上卦
+    mutual_lines = lines[1:4] + lines[2:5]
+
+    return {
+        "method": method,
+        "hexagram": hexagram,
+        "moving_line": moving_line,
+        "moving_line_name": line_name(moving_line, lines[moving_line - 1] == 1),
+        "changed": hexagram_by_lines(changed_lines),
+        "mutual": hexagram_by_lines(mutual_lines)
+    }
+
+
+def cast_by_time(when=None):
+    """
+    时间起卦：(年支 + 月 + 日) 得上卦，再加时支得下卦，总数除以 6 得动爻
+    """
+    when = when or datetime.now()
+    base = year_branch_number(when.year) + when.month + when.day
+    total = base + hour_branch_number(when.hour)
+    return build_casting(_trigram_number(base), _trigram_number(total), _moving_line(total), "time")
+
+
+def cast_by_numbers(first, second, when=None):
+    """
+    报数起卦：第一个数得上卦，第二个数得下卦，两数之和加时支得动爻
+    """
+    when = when or datetime.now()
+    total = first + second + hour_branch_number(when.hour)
+    return build_casting(_trigram_number(first), _trigram_number(second), _moving_line(total), "numbers")
+
+
+def cast_by_text(text, when=None):
+    """
+    文字起卦：前半部分得上卦，后半部分得下卦（字数为奇数时前半少一字），总数加时支得动爻
+    """
+    when = when or datetime.now()
+    chars = [c for c in text if not c.isspace()]
+    half = len(chars) // 2
+    first = sum(ord(c) for c in chars[:half])
+    second = sum(ord(c) for c in chars[half:])
+    total = first + second + hour_branch_number(when.hour)
+    return build_casting(_trigram_number(first), _trigram_number(second), _moving_line(total), "text")
+
+
+def cast(question=None, when=None):
+    """
+    自动选择起卦方式：问题中带有至少两个数字时报数起卦，有问题文字时文字起卦，否则时间起卦
+    """
+    numbers = [int(n) for n in _NUMBER_PATTERN.findall(question or "")]
+    if len(numbers) >= 2:
+        return cast_by_numbers(numbers[0], numbers[1], when)
+    if question and question.strip():
+        return cast_by_text(question, when)
+    return cast_by_time(when)
@@ -0,0 +1,159 @@
+import os
+import time
+import threading
+
+SUPPORTED_PROVIDERS = ("deepseek", "openai")
+
+
+def provider_for(model):
+    """
+    根据模型名推断服务商
+    """
+    return "deepseek" if model.startswith("deepseek") else "openai"
+
+
+class Endpoint:
+    """
+    一个可调用的 服务商/模型 组合，记录耗时与错误率的指数加权移动平均（EWMA）
+    """
+
+    def __init__(self, provider, model):
+        self.provider = provider
+        self.model = model
+        self.ewma_latency = None
+        self.ewma_error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.last_failure_at = None
+
+    @property
+    def name(self):
+        return f"{self.provider}:{self.model}"
+
+
+def parse_endpoints(spec):
+    """
+    解析端点配置，逗号分隔，每项为 "服务商:模型" 或只写模型名（按前缀推断服务商）
+    例如 "deepseek-chat,openai:gpt-4o-mini"
+    """
+    endpoints = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        provider, sep, model = item.partition(":")
+        if not sep:
+            provider, model = provider_for(item), item
+        provider = provider.strip()
+        if provider not in SUPPORTED_PROVIDERS:
+            raise ValueError(f"不支持的服务商: {provider}")
+        endpoints.append(Endpoint(provider, model.strip()))
+    return endpoints
+
+
+class ModelRouter:
+    """
+    多端点路由：每次调用选择允许范围内耗时 EWMA 最低的健康端点，
+    失败时由调用方排除该端点后重新选择，实现自动切换。
+    健康判断：错误率 EWMA 低于 max_error_rate，且 is_available（例如熔断器未打开）返回 True；
+    不健康的端点在 recovery_timeout 秒后重新参与选择，以便在恢复后被探测到。
+    """
+
+    def __init__(self, endpoints, alpha=0.3, max_error_rate=0.5, recovery_timeout=30.0,
+                 is_available=None, clock=time.monotonic):
+        self.endpoints = list(endpoints)
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.recovery_timeout = recovery_timeout
+        self.is_available = is_available
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def allowed(self, model=None):
+        """
+        本次调用允许使用的端点：指定模型时只用该模型（未配置过的模型会临时加入），否则用全部配置的端点
+        """
+        with self._lock:
+            if model is None:
+                return list(self.endpoints)
+            matched = [e for e in self.endpoints if e.model == model]
+            if not matched:
+                endpoint = Endpoint(provider_for(model), model)
+                self.endpoints.append(endpoint)
+                matched = [endpoint]
+            return matched
+
+    def is_healthy(self, endpoint):
+        if self.is_available is not None and not self.is_available(endpoint):
+            return False
+        if endpoint.ewma_error_rate < self.max_error_rate:
+            return True
+        return self._clock() - endpoint.last_failure_at >= self.recovery_timeout
+
+    def select(self, model=None, exclude=()):
+        """
+        选择最快的健康端点；还没有耗时样本的端点优先，以便积累数据
+        :param exclude: 本次调用中已经失败过的端点名，有其他端点可选时跳过它们
+        :return: Endpoint（全部不健康时仍返回其中耗时最低的一个，由熔断器决定是否拒绝）
+        """
+        allowed = self.allowed(model)
+        candidates = [e for e in allowed if e.name not in exclude] or allowed
+        healthy = [e for e in candidates if self.is_healthy(e)]
+        return min(healthy or candidates, key=self._score)
+
+    def _score(self, endpoint):
+        return endpoint.ewma_latency if endpoint.ewma_latency is not None else 0.0
+
+    def record_success(self, endpoint, latency=None):
+        """
+        :param latency: 本次调用耗时（秒）；流式调用等不适合计入耗时的场景传 None
+        """
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.ewma_error_rate *= 1 - self.alpha
+            if latency is not None:
+                if endpoint.ewma_latency is None:
+                    endpoint.ewma_latency = latency
+                else:
+                    endpoint.ewma_latency += self.alpha * (latency - endpoint.ewma_latency)
+
+    def record_failure(self, endpoint):
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.failures += 1
+            endpoint.ewma_error_rate += self.alpha * (1 - endpoint.ewma_error_rate)
+            endpoint.last_failure_at = self._clock()
+
+    def stats(self):
+        """
+        返回每个端点的 EWMA 耗时、错误率与健康状态
+        """
+        return {
+            endpoint.name: {
+                "provider": endpoint.provider,
+                "model": endpoint.model,
+                "ewma_latency": endpoint.ewma_latency,
+                "ewma_error_rate": endpoint.ewma_error_rate,
+                "requests": endpoint.requests,
+                "failures": endpoint.failures,
+                "healthy": self.is_healthy(endpoint)
+            }
+            for endpoint in list(self.endpoints)
+        }
+
+
+def create_model_router_from_env(default_model, is_available=None):
+    """
+    根据环境变量创建路由器：
+    LLM_ENDPOINTS 参与路由的端点（不设置时只使用 DEFAULT_MODEL），
+    LLM_ROUTER_EWMA_ALPHA 新样本的权重，LLM_ROUTER_MAX_ERROR_RATE 错误率超过多少视为不健康，
+    LLM_ROUTER_RECOVERY 不健康的端点多少秒后重新参与选择
+    """
+    endpoints = parse_endpoints(os.getenv("LLM_ENDPOINTS", "")) or [Endpoint(provider_for(default_model), default_model)]
+    return ModelRouter(
+        endpoints,
+        alpha=float(os.getenv("LLM_ROUTER_EWMA_ALPHA", "0.3")),
+        max_error_rate=float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5")),
+        recovery_timeout=float(os.getenv("LLM_ROUTER_RECOVERY", "30")),
+        is_available=is_available
+    )
@@ -0,0 +1,161 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from dotenv import load_dotenv
+from .response_cache import MemoryCacheTier, SQLiteCacheTier
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def persona_cache_key(idol_name):
+    """
+    由（已经过 normalize_idol_name 处理的）偶像名字生成缓存键：
+    忽略大小写和多余空白，"Taylor  Swift" 与 "taylor swift" 命中同一条
+    """
+    return re.sub(r"\s+", " ", (idol_name or "").strip()).casefold()
+
+
+class PersonaCache:
+    """
+    Persona 配置缓存，按规范化后的偶像名字存储。
+    过期（stale）的条目仍然立即返回，同时在后台重新生成（stale-while-revalidate）。
+    store 可以是 MemoryCacheTier 或 SQLiteCacheTier（进程重启后仍然有效）。
+    """
+
+    def __init__(self, store=None, fresh_ttl=7 * 24 * 3600, clock=time.time):
+        self.store = store if store is not None else MemoryCacheTier(max_entries=4096)
+        self.fresh_ttl = fresh_ttl
+        self._clock = clock
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+
+    def get(self, idol_name):
+        """
+        :return: (profile, is_stale)；未命中时返回 (None, False)
+        """
+        raw = self.store.get(persona_cache_key(idol_name))
+        if raw is None:
+            with self._lock:
+                self.misses += 1
+            return None, False
+
+        entry = json.loads(raw)
+        is_stale = self._clock() - entry["refreshed_at"] > self.fresh_ttl
+        with self._lock:
+            self.hits += 1
+            self.stale_hits += int(is_stale)
+        return entry["profile"], is_stale
+
+    def put(self, idol_name, profile):
+        entry = {"profile": profile, "refreshed_at": self._clock()}
+        self.store.set(persona_cache_key(idol_name), json.dumps(entry, ensure_ascii=False))
+
+    def get_or_generate(self, idol_name, generate):
+        """
+        命中直接返回（过期时后台刷新），未命中时同步生成并写入缓存
+        :param generate: 根据偶像名字生成 Persona 的函数，失败时应抛出异常（不写入缓存）
+        """
+        profile, is_stale = self.get(idol_name)
+        if profile is not None:
+            if is_stale:
+                self.refresh_in_background(idol_name, generate)
+            return profile
+
+        profile = generate(idol_name)
+        self.put(idol_name, profile)
+        return profile
+
+    def begin_refresh(self, idol_name):
+        """
+        标记某个名字正在刷新；已经在刷新时返回 False，避免重复生成
+        """
+        key = persona_cache_key(idol_name)
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, idol_name):
+        with self._lock:
+            self._refreshing.discard(persona_cache_key(idol_name))
+
+    def refresh(self, idol_name, generate):
+        """
+        重新生成并覆盖缓存；失败时保留旧条目
+        """
+        try:
+            self.put(idol_name, generate(idol_name))
+            with self._lock:
+                self.refreshes += 1
+        except Exception as e:
+            logger.warning("persona refresh failed name=%s error=%s", idol_name, e)
+        finally:
+            self.end_refresh(idol_name)
+
+    def refresh_in_background(self, idol_name, generate):
+        if not self.begin_refresh(idol_name):
+            return None
+        thread = threading.Thread(target=self.refresh, args=(idol_name, generate), daemon=True)
+        thread.start()
+        return thread
+
+    def prewarm(self, names, generate):
+        """
+        在后台线程中为热门名字预先生成 Persona，已有的新鲜条目会跳过
+        """
+        def run():
+            for name in names:
+                profile, is_stale = self.get(name)
+                if profile is not None and not is_stale:
+                    continue
+                if self.begin_refresh(name):
+                    self.refresh(name, generate)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        """
+        返回命中统计
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "refreshes": self.refreshes
+        }
+
+
+def create_persona_cache_from_env():
+    """
+    根据环境变量创建 Persona 缓存：
+    PERSONA_CACHE_DB 持久化用的 SQLite 文件路径（不设置则只保存在内存中），
+    PERSONA_CACHE_FRESH_TTL 条目保持新鲜的秒数，超过后在后台刷新
+    """
+    db_path = os.getenv("PERSONA_CACHE_DB")
+    store = SQLiteCacheTier(db_path) if db_path else None
+    return PersonaCache(store=store, fresh_ttl=float(os.getenv("PERSONA_CACHE_FRESH_TTL", str(7 * 24 * 3600))))
+
+
+def prewarm_names_from_env():
+    """
+    读取需要预热的热门偶像名字（PERSONA_PREWARM_NAMES，逗号分隔）
+    """
+    raw = os.getenv("PERSONA_PREWARM_NAMES", "")
+    return [name.strip() for name in re.split(r"[,，]", raw) if name.strip()]
+
+
+# 全局 Persona 缓存实例
+persona_cache = create_persona_cache_from_env()
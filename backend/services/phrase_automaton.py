@@ -0,0 +1,93 @@
+"""
+多模式短语匹配：Aho-Corasick 自动机
+
+构建一次后，每段文本只需线性扫描一遍即可找出所有命中的短语（包括重叠与嵌套的），
+耗时与短语条数无关。安全过滤与意图识别共用。英文忽略大小写。
+"""
+
+
+def _fold(ch):
+    """
+    忽略大小写；小写后长度变化的少数字符保持原样，保证命中位置与原文一一对应
+    """
+    lowered = ch.lower()
+    return lowered if len(lowered) == 1 else ch
+
+
+class PhraseAutomaton:
+    """
+    多模式匹配的 Aho-Corasick 自动机
+    每个状态对应某条规则的一个前缀；状态的深度即该前缀的长度
+    """
+
+    def __init__(self, phrases):
+        self.phrases = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._depth = [0]
+        # 每个状态命中的规则序号（含沿失败链可达的状态），按长度从长到短
+        self._outputs = [()]
+        for phrase in phrases:
+            self._add(phrase)
+        self._build_failure_links()
+
+    def _add(self, phrase):
+        folded = "".join(_fold(ch) for ch in phrase)
+        if not folded:
+            return
+        state = 0
+        for ch in folded:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._depth.append(self._depth[state] + 1)
+                self._outputs.append(())
+                self._goto[state][ch] = next_state
+            state = next_state
+        if not self._outputs[state]:
+            # 同一短语重复出现时以第一条为准
+            self._outputs[state] = (len(self.phrases),)
+        self.phrases.append(phrase)
+
+    def _build_failure_links(self):
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+                queue.append(child)
+
+    def depth(self, state):
+        return self._depth[state]
+
+    def scan(self, text, state=0, offset=0):
+        """
+        从 state 出发扫描 text
+        :param offset: text 第一个字符在整段输出中的位置，命中位置据此换算
+        :return: (matches, state)，matches 为 [(start, end, rule_index)]，按结束位置排序
+        """
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        matches = []
+        folded = text.lower()
+        if len(folded) != len(text):
+            folded = "".join(_fold(ch) for ch in text)
+        for i, ch in enumerate(folded):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if outputs[state]:
+                end = offset + i + 1
+                for index in outputs[state]:
+                    matches.append((end - len(self.phrases[index]), end, index))
+        return matches, state
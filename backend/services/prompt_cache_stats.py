@@ -0,0 +1,57 @@
+"""
+服务商提示词缓存（前缀缓存）的命中统计
+
+DeepSeek 会自动缓存请求的公共前缀，命中部分在 usage 中记为 prompt_cache_hit_tokens，价格更低、首字更快；
+OpenAI 的对应字段是 usage.prompt_tokens_details.cached_tokens。
+偶像聊天的提示词以每个 Persona 固定不变的系统消息开头（见 IdolChatService.build_prompt_prefix），
+这里按服务商累计命中与未命中的 token 数，用来确认前缀确实被复用。
+"""
+import threading
+
+
+def cached_prompt_tokens(usage):
+    """
+    从 usage 中取 (提示词 token 数, 命中缓存的 token 数)，兼容 DeepSeek 与 OpenAI 的字段
+    :param usage: 服务商返回的 usage（dict 或 OpenAIObject）
+    """
+    prompt_tokens = int(usage.get("prompt_tokens") or 0)
+    if usage.get("prompt_cache_hit_tokens") is not None:
+        return prompt_tokens, int(usage["prompt_cache_hit_tokens"])
+    details = usage.get("prompt_tokens_details") or {}
+    return prompt_tokens, int(details.get("cached_tokens") or 0)
+
+
+class PromptCacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._providers = {}  # provider -> [请求数, 提示词 token 数, 命中 token 数]
+
+    def record(self, provider, usage):
+        """
+        记录一次调用的 usage；服务商没有返回 usage 时忽略
+        """
+        if not usage:
+            return
+        prompt_tokens, hit_tokens = cached_prompt_tokens(usage)
+        with self._lock:
+            entry = self._providers.setdefault(provider, [0, 0, 0])
+            entry[0] += 1
+            entry[1] += prompt_tokens
+            entry[2] += hit_tokens
+
+    def stats(self):
+        with self._lock:
+            return {
+                provider: {
+                    "requests": requests,
+                    "prompt_tokens": prompt_tokens,
+                    "cache_hit_tokens": hit_tokens,
+                    "cache_miss_tokens": prompt_tokens - hit_tokens,
+                    "hit_rate": hit_tokens / prompt_tokens if prompt_tokens else 0.0
+                }
+                for provider, (requests, prompt_tokens, hit_tokens) in self._providers.items()
+            }
+
+
+# 同步与异步客户端共用
+prompt_cache_stats = PromptCacheStats()
@@ -0,0 +1,203 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0, rng=random.random):
+    """
+    指数退避 + 全抖动（full jitter）
+    :param attempt: 已失败的次数（从 0 开始）
+    :return: 在 [0, min(cap, base * 2^attempt)] 之间随机的等待秒数
+    """
+    return rng() * min(cap, base * (2 ** attempt))
+
+
+def is_retryable(error):
+    """
+    判断错误是否值得重试，也决定是否计入熔断：
+    网络错误、超时、429 与 5xx 可以重试；其余 4xx 是请求本身的问题
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    for attr in ("status", "http_status"):
+        if status is None:
+            status = getattr(error, attr, None)
+    if isinstance(status, int) and 400 <= status < 500 and status != 429:
+        return False
+    return True
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后打开，recovery_timeout 秒内直接拒绝请求；
+    之后进入半开状态放行少量探测请求，成功则关闭，失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0, half_open_max_calls=1, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._half_open_calls = 0
+        self._probe_started_at = None
+        self.total_failures = 0
+        self.total_successes = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def allow_request(self):
+        """
+        是否放行本次请求；放行半开状态的探测请求时会占用一个探测名额
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN:
+                # 探测请求迟迟没有结果（例如调用方中途放弃）时，允许发出新的探测
+                if self._probe_started_at is not None and self._clock() - self._probe_started_at >= self.recovery_timeout:
+                    self._half_open_calls = 0
+                if self._half_open_calls < self.half_open_max_calls:
+                    self._half_open_calls += 1
+                    self._probe_started_at = self._clock()
+                    return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.total_successes += 1
+            self._consecutive_failures = 0
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.total_failures += 1
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._consecutive_failures,
+                "total_failures": self.total_failures,
+                "total_successes": self.total_successes,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened
+            }
+
+
+class LatencyTracker:
+    """记录最近若干次成功调用的耗时，用于计算对冲请求的触发延迟"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, p):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(p / 100.0 * len(samples))) - 1))
+        return samples[index]
+
+
+def call_with_hedge(fn, hedge_delay, executor):
+    """
+    对冲请求（线程版）：先发出一次调用，hedge_delay 秒内未完成则再发一次，
+    返回先成功的结果；都失败时抛出最后一个异常。落后的调用在后台自然结束。
+    :return: (result, hedged)
+    """
+    futures = [executor.submit(fn)]
+    done, _ = wait(futures, timeout=hedge_delay)
+    if not done:
+        futures.append(executor.submit(fn))
+
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result(), len(futures) > 1
+            error = future.exception()
+    raise error
+
+
+async def acall_with_hedge(fn, hedge_delay):
+    """
+    对冲请求（asyncio 版），语义同 call_with_hedge；胜出后取消落后的调用
+    :param fn: 无参数、返回协程的函数
+    :return: (result, hedged)
+    """
+    tasks = [asyncio.ensure_future(fn())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+        if not done:
+            tasks.append(asyncio.ensure_future(fn()))
+
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), len(tasks) > 1
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+def create_circuit_breakers_from_env(providers=("deepseek", "openai")):
+    """
+    为每个服务商创建熔断器：
+    LLM_BREAKER_THRESHOLD 连续失败多少次后打开，LLM_BREAKER_RECOVERY 打开后多少秒进入半开
+    """
+    threshold = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+    recovery = float(os.getenv("LLM_BREAKER_RECOVERY", "30"))
+    return {provider: CircuitBreaker(failure_threshold=threshold, recovery_timeout=recovery) for provider in providers}
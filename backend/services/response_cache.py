@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+
+def make_cache_key(model, prompt, temperature, max_tokens):
+    """
+    根据 (model, prompt, temperature, max_tokens) 计算内容寻址的缓存键
+    """
+    raw = json.dumps([model, prompt, temperature, max_tokens], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheTier:
+    """内存 LRU 缓存层，按条目数淘汰，条目带过期时间"""
+
+    def __init__(self, max_entries=1024, clock=time.time):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()  # { key: (value, expires_at) }
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = self._clock() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheTier:
+    """SQLite 磁盘缓存层，进程重启后仍然有效"""
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= self._clock():
+                self._conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return value
+
+    def ttl_remaining(self, key):
+        """
+        返回条目剩余的有效期（秒），用于提升到内存层时保持同样的过期时间
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at FROM llm_response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return max(row[0] - self._clock(), 0)
+
+    def set(self, key, value, ttl=None):
+        expires_at = self._clock() + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_response_cache")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    LLM 响应缓存：内存 LRU 层 + 可选的 SQLite 磁盘层
+    命中磁盘层时会回填内存层。任何实现了 get/set 的对象都可以作为层替换进来。
+    """
+
+    def __init__(self, memory=None, disk=None, default_ttl=3600):
+        self.memory = memory if memory is not None else MemoryCacheTier()
+        self.disk = disk
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._record(memory_hit=True)
+            return value
+
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                ttl = self.disk.ttl_remaining(key) if hasattr(self.disk, "ttl_remaining") else self.default_ttl
+                self.memory.set(key, value, ttl)
+                self._record(disk_hit=True)
+                return value
+
+        self._record()
+        return None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def _record(self, memory_hit=False, disk_hit=False):
+        with self._lock:
+            if memory_hit or disk_hit:
+                self.hits += 1
+                self.memory_hits += int(memory_hit)
+                self.disk_hits += int(disk_hit)
+            else:
+                self.misses += 1
+
+    def stats(self):
+        """
+        返回命中统计
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_evictions": getattr(self.memory, "evictions", 0)
+        }
+
+
+def create_response_cache_from_env():
+    """
+    根据环境变量创建响应缓存：
+    LLM_CACHE_MAX_ENTRIES 内存层最大条目数，LLM_CACHE_TTL 默认过期秒数，
+    LLM_CACHE_DB 磁盘层 SQLite 文件路径（不设置则只启用内存层）
+    """
+    memory = MemoryCacheTier(max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")))
+    db_path = os.getenv("LLM_CACHE_DB")
+    disk = SQLiteCacheTier(db_path) if db_path else None
+    return ResponseCache(memory=memory, disk=disk, default_ttl=float(os.getenv("LLM_CACHE_TTL", "3600")))
+
+
+# 全局响应缓存实例
+response_cache = create_response_cache_from_env()
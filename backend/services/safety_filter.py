@@ -1,20 +1,217 @@
-import re
+"""
+安全过滤：把绝对化或恐吓性的措辞替换为温和的说法
+
+规则从规则文件加载（默认为同目录下的 safety_rules.txt，可用 SAFETY_RULES_PATH 指定），
+改写类规则（“短语 => 替换词”）只用于占卜解读；偶像回复与翻译是日常聊天，
+“我一定会陪着你”这类话不应被改写，因此只使用遮盖类规则（不写替换词的短语）。
+启动时编译为一个 Aho-Corasick 自动机，之后每段文本只需线性扫描一遍，耗时与规则条数无关。
+中文没有词边界，规则按子串匹配；英文忽略大小写。重叠的命中取最靠左、最长的一条。
+"""
+import os
+import logging
+import threading
+from .phrase_automaton import PhraseAutomaton
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "safety_rules.txt")
+# 规则没有写替换词时使用的遮盖字符
+MASK_CHAR = "*"
+
+
+def load_rules(path):
+    """
+    读取规则文件：每行一条，"短语" 或 "短语 => 替换词"，# 开头为注释
+    :return: [(phrase, replacement)]
+    """
+    rules = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            phrase, sep, replacement = line.partition("=>")
+            phrase = phrase.strip()
+            if not phrase:
+                continue
+            rules.append((phrase, replacement.strip() if sep else MASK_CHAR * len(phrase)))
+    return rules
+
+
+def masking_rules(rules):
+    """
+    只保留遮盖类规则（替换词为遮盖字符），供偶像回复与翻译使用
+    """
+    return [(phrase, replacement) for phrase, replacement in rules if replacement == MASK_CHAR * len(phrase)]
+
+
+def _select_matches(matches):
+    """
+    在可能重叠的命中中取最靠左、最长且互不重叠的一组
+    """
+    selected = []
+    last_end = None
+    for start, end, index in sorted(matches, key=lambda m: (m[0], -m[1])):
+        if last_end is None or start >= last_end:
+            selected.append((start, end, index))
+            last_end = end
+    return selected
+
+
+class SafetyFilter:
+    def __init__(self, rules):
+        """
+        :param rules: [(phrase, replacement)]
+        """
+        self.automaton = PhraseAutomaton(phrase for phrase, _ in rules)
+        self.replacements = [replacement for _, replacement in rules]
+        self._lock = threading.Lock()
+        self.filtered_texts = 0
+        self.violations = 0
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_rules(path))
+
+    def find(self, text):
+        """
+        :return: 命中的规则短语（去重，按出现顺序）
+        """
+        matches, _ = self.automaton.scan(text or "")
+        found = []
+        for _, _, index in _select_matches(matches):
+            phrase = self.automaton.phrases[index]
+            if phrase not in found:
+                found.append(phrase)
+        return found
+
+    def check(self, text):
+        """
+        :return: (is_ok, violations)
+        """
+        violations = self.find(text)
+        return (len(violations) == 0, violations)
+
+    def filter(self, text):
+        """
+        替换文本中命中的短语
+        """
+        if not text:
+            return text
+        matches, _ = self.automaton.scan(text)
+        return self._apply(text, _select_matches(matches), 0)
+
+    def stream(self):
+        """
+        创建一个按增量过滤流式输出的过滤器
+        """
+        return StreamSafetyFilter(self)
+
+    def stats(self):
+        return {
+            "rules": len(self.automaton.phrases),
+            "filtered_texts": self.filtered_texts,
+            "violations": self.violations
+        }
+
+    def _apply(self, text, selected, offset):
+        """
+        :param offset: text 第一个字符在整段输出中的位置
+        """
+        if not selected:
+            return text
+        pieces = []
+        cursor = 0
+        for start, end, index in selected:
+            pieces.append(text[cursor:start - offset])
+            pieces.append(self.replacements[index])
+            cursor = end - offset
+        pieces.append(text[cursor:])
+        with self._lock:
+            self.filtered_texts += 1
+            self.violations += len(selected)
+        return "".join(pieces)
+
+
+class StreamSafetyFilter:
+    """
+    流式过滤：自动机状态跨增量保留，因此能发现被切开的短语。
+    尾部可能是某条规则开头的文字（长度为当前状态深度）以及跨越该位置的命中暂不输出，
+    等后续增量确定后再替换，最终输出与对全文调用 SafetyFilter.filter 一致。
+    """
+
+    def __init__(self, safety_filter):
+        self.safety_filter = safety_filter
+        self._state = 0
+        self._pending = ""
+        # _pending 第一个字符在整段输出中的位置
+        self._offset = 0
+        self._matches = []
+
+    def feed(self, chunk):
+        """
+        :return: 可以立即输出的过滤后文本（可能为空字符串）
+        """
+        if not chunk:
+            return ""
+        matches, self._state = self.safety_filter.automaton.scan(chunk, self._state, self._offset + len(self._pending))
+        self._matches.extend(matches)
+        self._pending += chunk
+
+        end = self._offset + len(self._pending)
+        cut = end - self.safety_filter.automaton.depth(self._state)
+        # 跨越 cut 的命中整体留到下次，直到没有命中跨越 cut
+        moved = True
+        while moved:
+            moved = False
+            for start, match_end, _ in self._matches:
+                if start < cut < match_end:
+                    cut = start
+                    moved = True
+        return self._release(cut)
+
+    def close(self):
+        """
+        流结束，输出剩余文本
+        """
+        return self._release(self._offset + len(self._pending))
+
+    def _release(self, cut):
+        if cut <= self._offset:
+            return ""
+        ready = [m for m in self._matches if m[1] <= cut]
+        self._matches = [m for m in self._matches if m[1] > cut]
+        text = self.safety_filter._apply(self._pending[:cut - self._offset], _select_matches(ready), self._offset)
+        self._pending = self._pending[cut - self._offset:]
+        self._offset = cut
+        return text
+
+
+def create_safety_filter_from_env(masking_only=False):
+    """
+    根据环境变量创建安全过滤器：SAFETY_RULES_PATH 规则文件路径；
+    SAFETY_FILTER_ENABLED=false 或规则文件无法读取时使用空规则集（不做任何替换）
+    :param masking_only: 只加载遮盖类规则（偶像回复与翻译使用）
+    """
+    if os.getenv("SAFETY_FILTER_ENABLED", "true").lower() != "true":
+        return SafetyFilter([])
+    path = os.getenv("SAFETY_RULES_PATH") or DEFAULT_RULES_PATH
+    try:
+        rules = load_rules(path)
+    except OSError as e:
+        logger.error(f"Failed to load safety rules from {path}: {e}")
+        return SafetyFilter([])
+    return SafetyFilter(masking_rules(rules) if masking_only else rules)
+
+
+# 全局安全过滤器实例：占卜输出使用全部规则，偶像回复与翻译只做遮盖
+safety_filter = create_safety_filter_from_env()
+reply_safety_filter = create_safety_filter_from_env(masking_only=True)
 
-# 仅示例性的禁止词集合，生产应维护更完整的规则集及上下文检查
-_FORBIDDEN_PATTERNS = [
-    r"\b必然\b",
-    r"\b注定\b",
-    r"\b灾难\b",
-    r"\b一定会\b",
-]
 
 def check_text_compliance(text: str):
     """检查文本是否包含绝对化或恐吓性语言。
 
     返回 (is_ok: bool, violations: list)
     """
-    violations = []
-    for pat in _FORBIDDEN_PATTERNS:
-        if re.search(pat, text):
-            violations.append(pat)
-    return (len(violations) == 0, violations)
+    return safety_filter.check(text)
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    合并并发中的相同请求（线程版）：同一个 key 同时只执行一次，
+    其余调用方等待并共享这一次的结果或异常。
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    @property
+    def in_flight(self):
+        return len(self._calls)
+
+    def stats(self):
+        """
+        返回合并统计：executions 为真正发往上游的次数，coalesced 为被合并掉的次数
+        """
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight
+        }
+
+
+class AsyncSingleFlight:
+    """
+    合并并发中的相同请求（asyncio 版），语义与 SingleFlight 相同
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """
+        :param fn: 无参数、返回协程的函数
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield：某个等待方被取消时不影响其他调用方
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.executions += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有其他等待方时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    @property
+    def in_flight(self):
+        return len(self._calls)
+
+    def stats(self):
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight
+        }
@@ -0,0 +1,203 @@
+"""
+XML 段落的增量解析器
+
+模型按 <interpretation>…</interpretation> 这类标签分段输出。解析器逐段读入流式增量，只扫描一遍：
+开始标签出现时产出 "open" 事件，段内文字到达时产出 "delta" 事件，标签闭合时产出 "section" 事件，结束后不需要再对全文做正则匹配。
+标签名忽略大小写，开始标签允许带属性；段外的未知标签会被丢弃，段内的其他标签按原文保留。
+"""
+from collections import namedtuple
+
+# kind: "open"（段落开始，text 为空）、"delta"（文字增量，tag 为 None 表示段外文字）
+#       或 "section"（段落闭合，text 为去掉首尾空白的全文）
+TagEvent = namedtuple("TagEvent", ["kind", "tag", "text"])
+
+# 开始标签最多等待这么多字符；超过仍未出现 ">" 的 "<" 按普通文字处理
+MAX_TAG_LENGTH = 64
+
+
+class TagStreamParser:
+    """
+    用法：
+        parser = TagStreamParser(("interpretation", "comfort"))
+        for chunk in stream:
+            for event in parser.feed(chunk): ...
+        for event in parser.close(): ...
+        parser.sections  # {tag: text}
+    """
+
+    def __init__(self, tags):
+        self.tags = {tag.lower() for tag in tags}
+        self.sections = {}
+        self.current = None
+        self._buffer = ""
+        self._parts = []
+        self._untagged = []
+
+    @property
+    def untagged(self):
+        """
+        所有段落之外的文字（未知标签已去掉），用于模型没有按标签输出时兜底
+        """
+        return "".join(self._untagged).strip()
+
+    def feed(self, chunk):
+        """
+        读入一段增量
+        :return: 本段增量产生的 TagEvent 列表
+        """
+        events = []
+        self._buffer += chunk
+        while self._buffer:
+            if self.current is None:
+                consumed = self._scan_outside(events)
+            else:
+                consumed = self._scan_inside(events)
+            if not consumed:
+                break
+        return events
+
+    def close(self):
+        """
+        流结束：未闭合的段落（例如输出被 max_tokens 截断）按已收到的内容闭合
+        :return: 剩余的 TagEvent 列表
+        """
+        events = []
+        rest, self._buffer = self._buffer, ""
+        if self.current is not None:
+            # 末尾残缺的结束标签不算正文
+            if not f"</{self.current}".startswith(rest.lower()):
+                self._emit_text(rest, events)
+            self._close_section(events)
+        elif not rest.startswith("<"):
+            self._emit_text(rest, events)
+        return events
+
+    def _scan_outside(self, events):
+        """
+        段外：输出 "<" 之前的文字，再判断 "<" 是否为关注的开始标签
+        :return: 是否消费了缓冲区中的内容（False 表示需要等待更多输入）
+        """
+        buffer = self._buffer
+        start = buffer.find("<")
+        if start == -1:
+            self._emit_text(buffer, events)
+            self._buffer = ""
+            return True
+        if start:
+            self._emit_text(buffer[:start], events)
+            self._buffer = buffer = buffer[start:]
+
+        end = buffer.find(">")
+        if end == -1:
+            if len(buffer) <= MAX_TAG_LENGTH:
+                return False
+            self._emit_text("<", events)
+            self._buffer = buffer[1:]
+            return True
+
+        token = buffer[1:end].split(None, 1)
+        name = token[0].lower() if token else ""
+        self._buffer = buffer[end + 1:]
+        if name in self.tags:
+            self.current = name
+            self._parts = []
+            events.append(TagEvent("open", name, ""))
+        return True
+
+    def _scan_inside(self, events):
+        """
+        段内：输出 "<" 之前的文字，遇到当前段落的结束标签时闭合段落
+        """
+        buffer = self._buffer
+        start = buffer.find("<")
+        if start == -1:
+            self._emit_text(buffer, events)
+            self._buffer = ""
+            return True
+        if start:
+            self._emit_text(buffer[:start], events)
+            self._buffer = buffer = buffer[start:]
+
+        closing = f"</{self.current}"
+        head = buffer[:len(closing)].lower()
+        if head != closing:
+            if closing.startswith(head):
+                # 可能是被切开的结束标签，等待更多输入
+                return False
+            self._emit_text("<", events)
+            self._buffer = buffer[1:]
+            return True
+
+        end = buffer.find(">", len(closing))
+        if end == -1:
+            return False
+        self._buffer = buffer[end + 1:]
+        self._close_section(events)
+        return True
+
+    def _emit_text(self, text, events):
+        if not text:
+            return
+        if self.current is None:
+            self._untagged.append(text)
+        else:
+            self._parts.append(text)
+        events.append(TagEvent("delta", self.current, text))
+
+    def _close_section(self, events):
+        text = "".join(self._parts).strip()
+        # 同名标签重复出现时保留第一个非空段落
+        if not self.sections.get(self.current):
+            self.sections[self.current] = text
+        events.append(TagEvent("section", self.current, text))
+        self.current = None
+        self._parts = []
+
+
+class SectionTextRenderer:
+    """
+    把解析器事件转换为展示给用户的文本：段落正文去掉标签与开头空白，段落之间用空行分隔；
+    在出现任何关注的标签之前，段外文字原样转发，以兼容没有按标签输出的模型
+    """
+
+    def __init__(self):
+        self._opened = False
+        self._section_start = False
+        self._emitted = False
+
+    def render(self, events):
+        """
+        :return: 本批事件对应的文本（可能为空字符串）
+        """
+        pieces = []
+        for event in events:
+            if event.kind == "open":
+                self._opened = self._section_start = True
+            elif event.kind == "delta":
+                if event.tag is None:
+                    if not self._opened:
+                        pieces.append(event.text)
+                        self._emitted = True
+                    continue
+                text = event.text
+                if self._section_start:
+                    text = text.lstrip()
+                    if not text:
+                        continue
+                    self._section_start = False
+                    if self._emitted:
+                        text = "\n\n" + text
+                pieces.append(text)
+                self._emitted = True
+        return "".join(pieces)
+
+
+def parse_sections(text, tags):
+    """
+    一次性解析完整文本
+    :return: (sections, untagged)
+    """
+    parser = TagStreamParser(tags)
+    parser.feed(text or "")
+    parser.close()
+    return parser.sections, parser.untagged
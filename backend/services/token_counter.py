@@ -0,0 +1,49 @@
+import re
+
+# 按 DeepSeek 官方给出的换算比例估算：1 个中文字符约 0.6 token，1 个英文字符约 0.3 token
+CJK_TOKENS_PER_CHAR = 0.6
+OTHER_TOKENS_PER_CHAR = 0.3
+# 每条消息在对话记录中额外占用的称呼前缀与换行
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+
+def estimate_tokens(text):
+    """
+    估算文本的 token 数（本地计算，不调用服务商）
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return int(round(cjk * CJK_TOKENS_PER_CHAR + other * OTHER_TOKENS_PER_CHAR))
+
+
+def count_message_tokens(message):
+    """
+    统计单条消息的 token 数，结果缓存在消息对象上，之后的轮次不再重复计算
+    """
+    if message.token_count is None:
+        message.token_count = estimate_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+    return message.token_count
+
+
+def select_recent_messages(messages, token_budget, max_messages=None):
+    """
+    从最新的消息往前选取，直到填满 token 预算
+    最新的一条消息总会被选中，即使它本身已经超出预算
+    :return: 按时间顺序排列的消息列表
+    """
+    selected = []
+    used = 0
+    for message in reversed(messages):
+        if max_messages is not None and len(selected) >= max_messages:
+            break
+        tokens = count_message_tokens(message)
+        if selected and used + tokens > token_budget:
+            break
+        selected.append(message)
+        used += tokens
+    selected.reverse()
+    return selected
@@ -1,14 +1,25 @@
 import sys
 import os
 import json
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import MagicMock
 
 # Add current directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app import app
+from aiohttp.test_utils import TestClient, TestServer
+from app import app, session_manager
+from async_app import create_app
 from services.llm_client import llm_client
+from services.async_llm_client import async_llm_client
+
+def prompt_text(prompt):
+    """
+    偶像聊天的提示词是按角色拆分的消息列表，拼成文本后再判断
+    """
+    return prompt if isinstance(prompt, str) else "\n".join(m["content"] for m in prompt)
 
 class TestFlow(unittest.TestCase):
     def setUp(self):
@@ -23,6 +34,7 @@ class TestFlow(unittest.TestCase):
         llm_client.generate_response = self.original_generate_response
 
     def mock_llm_response(self, prompt, **kwargs):
+        prompt = prompt_text(prompt)
         if "梅花易数" in prompt:
             return """
 【卦象与出处】
@@ -103,5 +115,216 @@ class TestFlow(unittest.TestCase):
         
         self.assertIn("Lady Gaga", message)
 
+    def test_lazy_translation(self):
+        print("\n=== Testing Lazy Translation ===")
+        res = self.app.post('/api/sessions', json={"user_id": "test_user"})
+        session_id = json.loads(res.data)['session_id']
+        session = session_manager.get_session(session_id)
+        session.persona_config = {"name": "IU", "default_language": "ko", "mother_tongue": "韩语"}
+        session.set_state(session.STATE_IDOL_CHAT)
+
+        llm_client.generate_response.side_effect = lambda prompt, **kwargs: "翻译好的中文" if "翻译成中文" in prompt else "괜찮아요"
+        res = self.app.post(f'/api/chat/{session_id}', json={"content": "今天好累"})
+        message = json.loads(res.data)['message']
+        self.assertEqual(message['content'], "괜찮아요")
+        self.assertTrue(message['translatable'])
+        self.assertIsNone(message['translation'])
+        self.assertEqual(llm_client.generate_response.call_count, 1)
+
+        url = f"/api/chat/{session_id}/messages/{message['id']}/translation"
+        for _ in range(2):
+            res = self.app.get(url)
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(json.loads(res.data)['translation'], "翻译好的中文")
+        # 只在第一次请求时生成
+        self.assertEqual(llm_client.generate_response.call_count, 2)
+
+        res = self.app.get(f'/api/chat/{session_id}/messages')
+        self.assertEqual(json.loads(res.data)['messages'][-1]['translation'], "翻译好的中文")
+
+        user_message_id = session.messages[0].id
+        res = self.app.get(f"/api/chat/{session_id}/messages/{user_message_id}/translation")
+        self.assertEqual(res.status_code, 400)
+
+    def test_list_user_sessions(self):
+        print("\n=== Testing User Session Listing ===")
+        created = []
+        for _ in range(3):
+            res = self.app.post('/api/sessions', json={"user_id": "list_user"})
+            created.append(json.loads(res.data)['session_id'])
+        # 最近更新的会话排在最前面
+        self.app.post(f'/api/chat/{created[0]}', json={"content": "我的事业怎么样？"})
+
+        res = self.app.get('/api/users/list_user/sessions?limit=2')
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data['sessions'][0]['session_id'], created[0])
+        self.assertNotIn('messages', data['sessions'][0])
+        self.assertIsNotNone(data['next_cursor'])
+
+        res = self.app.get(f"/api/users/list_user/sessions?limit=2&cursor={data['next_cursor']}")
+        rest = json.loads(res.data)
+        self.assertIsNone(rest['next_cursor'])
+        listed = [s['session_id'] for s in data['sessions'] + rest['sessions']]
+        self.assertEqual(sorted(listed), sorted(created))
+
+        self.app.delete(f'/api/sessions/{created[0]}')
+        res = self.app.get('/api/users/list_user/sessions')
+        self.assertNotIn(created[0], [s['session_id'] for s in json.loads(res.data)['sessions']])
+
+        self.assertEqual(self.app.get('/api/users/list_user/sessions?cursor=bad').status_code, 400)
+        self.assertEqual(self.app.get('/api/users/list_user/sessions?limit=0').status_code, 400)
+
+    def test_message_delta_sync(self):
+        print("\n=== Testing Message Delta Sync ===")
+        res = self.app.post('/api/sessions', json={"user_id": "test_user"})
+        session_id = json.loads(res.data)['session_id']
+        self.app.post(f'/api/chat/{session_id}', json={"content": "我的事业怎么样？"})
+
+        res = self.app.get(f'/api/chat/{session_id}/messages?since=-1&fields=id,role')
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data['messages'], [{"id": 0, "role": "user"}, {"id": 1, "role": "idol"}])
+        self.assertEqual(data['last_id'], 1)
+        etag = res.headers['ETag']
+
+        # 没有新消息时返回 304
+        res = self.app.get(f'/api/chat/{session_id}/messages?since=1', headers={"If-None-Match": etag})
+        self.assertEqual(res.status_code, 304)
+
+        self.app.post(f'/api/chat/{session_id}', json={"content": "不需要"})
+        res = self.app.get(f'/api/chat/{session_id}/messages?since=1', headers={"If-None-Match": etag})
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual([m['id'] for m in data['messages']], [2, 3])
+        self.assertEqual(data['last_id'], 3)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+        res = self.app.get(f'/api/sessions/{session_id}?fields=current_state,persona_config')
+        self.assertEqual(set(json.loads(res.data)), {"current_state", "persona_config"})
+        self.assertEqual(self.app.get(f'/api/chat/{session_id}/messages?fields=password').status_code, 400)
+        self.assertEqual(self.app.get(f'/api/chat/{session_id}/messages?since=abc').status_code, 400)
+        for query in ("since=1&limit=0", "since=1&limit=-3", "offset=-1"):
+            self.assertEqual(self.app.get(f'/api/chat/{session_id}/messages?{query}').status_code, 400)
+        res = self.app.get(f'/api/chat/{session_id}/messages?since=-1&limit=100000')
+        self.assertEqual(len(json.loads(res.data)['messages']), 4)
+
+    def test_concurrent_messages_one_session(self):
+        print("\n=== Testing Concurrent Messages On One Session ===")
+        res = self.app.post('/api/sessions', json={"user_id": "stress_user"})
+        session_id = json.loads(res.data)['session_id']
+
+        def slow_llm(prompt, **kwargs):
+            time.sleep(0.05)
+            return self.mock_llm_response(prompt, **kwargs)
+        llm_client.generate_response.side_effect = slow_llm
+
+        def send(i):
+            client = app.test_client()
+            return client.post(f'/api/chat/{session_id}', json={"content": f"我的事业怎么样？第{i}次"}).status_code
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            statuses = list(pool.map(send, range(16)))
+        self.assertEqual(statuses, [200] * 16)
+
+        session = session_manager.get_session(session_id)
+        # 只有第一条消息触发占卜，其余消息在过渡阶段处理，没有重复的 LLM 调用
+        self.assertEqual(len(session.divinations), 1)
+        divination_calls = [c for c in llm_client.generate_response.call_args_list if "梅花易数" in c.args[0]]
+        self.assertEqual(len(divination_calls), 1)
+        # 每一轮的用户消息与回复相邻，没有交错
+        self.assertEqual([m.role for m in session.messages], ["user", "idol"] * 16)
+
+    def test_stream_flow(self):
+        print("\n=== Testing Streaming Flow ===")
+        original_stream_response = llm_client.stream_response
+        llm_client.stream_response = MagicMock(side_effect=lambda prompt, **kwargs: iter(["Hello, ", "I am Lady Gaga."]))
+        try:
+            res = self.app.post('/api/sessions', json={"user_id": "test_user"})
+            session_id = json.loads(res.data)['session_id']
+
+            res = self.app.post(f'/api/chat/{session_id}/stream', json={"content": "我的事业怎么样？"})
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.mimetype, "text/event-stream")
+            events = self.parse_sse(res.get_data(as_text=True))
+            deltas = [p['content'] for e, p in events if e == "delta"]
+            # 本地起得的卦象先于模型输出推送
+            self.assertEqual(len(deltas), 3)
+            self.assertIn("《周易·", deltas[0])
+            event, payload = events[-1]
+            self.assertEqual(event, "done")
+            self.assertEqual(payload['state'], "TRANSITION")
+
+            res = self.app.post(f'/api/chat/{session_id}/stream', json={"content": "Lady Gaga"})
+            events = self.parse_sse(res.get_data(as_text=True))
+            deltas = "".join(p['content'] for e, p in events if e == "delta")
+            event, payload = events[-1]
+            self.assertEqual(event, "done")
+            self.assertEqual(payload['state'], "IDOL_CHAT")
+            self.assertIn("I am Lady Gaga.", deltas)
+            self.assertEqual(payload['message']['content'], deltas)
+
+            # 完整消息在流结束后持久化
+            res = self.app.get(f'/api/chat/{session_id}/messages')
+            messages = json.loads(res.data)['messages']
+            self.assertEqual(messages[-1]['content'], deltas)
+        finally:
+            llm_client.stream_response = original_stream_response
+
+    def parse_sse(self, body):
+        events = []
+        for block in body.strip().split("\n\n"):
+            lines = dict(line.split(": ", 1) for line in block.splitlines())
+            events.append((lines["event"], json.loads(lines["data"])))
+        return events
+
+class TestAsyncFlow(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.original_generate_response = async_llm_client.generate_response
+        async_llm_client.generate_response = self.mock_llm_response
+        self.client = TestClient(TestServer(create_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        async_llm_client.generate_response = self.original_generate_response
+
+    async def mock_llm_response(self, prompt, **kwargs):
+        prompt = prompt_text(prompt)
+        if "梅花易数" in prompt:
+            return "<hexagram>第1卦 乾卦</hexagram><interpretation>天行健，君子以自强不息。</interpretation>"
+        if "姓名：" in prompt:
+            return "【母语】英语\n【常用语言】英语"
+        return "Hello, I am Lady Gaga."
+
+    async def test_async_full_flow(self):
+        print("\n=== Testing Async Flow ===")
+        res = await self.client.post('/api/sessions', json={"user_id": "test_user"})
+        self.assertEqual(res.status, 201)
+        session_id = (await res.json())['session_id']
+
+        res = await self.client.post(f'/api/chat/{session_id}', json={"content": "我的事业怎么样？"})
+        data = await res.json()
+        self.assertIn("《周易·", data['message']['content'])
+        self.assertIn("天行健，君子以自强不息。", data['message']['content'])
+        self.assertEqual(data['state'], "TRANSITION")
+
+        res = await self.client.post(f'/api/chat/{session_id}', json={"content": "Lady Gaga"})
+        data = await res.json()
+        self.assertEqual(data['state'], "IDOL_CHAT")
+        self.assertIn("Hello, I am Lady Gaga.", data['message']['content'])
+
+        res = await self.client.post(f'/api/divination/{session_id}', json={"type": "career", "question": "下个月呢？"})
+        data = await res.json()
+        self.assertEqual(data['divination']['type'], "career")
+        self.assertEqual(data['state'], "IDOL_CHAT")
+
+        res = await self.client.get(f'/api/chat/{session_id}/messages?since=2&fields=id')
+        data = await res.json()
+        ids = [m['id'] for m in data['messages']]
+        self.assertEqual(ids, list(range(3, data['last_id'] + 1)))
+        res = await self.client.get(f"/api/chat/{session_id}/messages?since={data['last_id']}", headers={"If-None-Match": res.headers['ETag']})
+        self.assertEqual(res.status, 304)
+
 if __name__ == '__main__':
     unittest.main()
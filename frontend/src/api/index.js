@@ -30,6 +30,39 @@ apiClient.interceptors.response.use(
   }
 )
 
+// 流式发送消息（Server-Sent Events）
+// onDelta 接收文本增量，返回 done 事件中的完整消息
+const streamMessage = async (sessionId, data, onDelta) => {
+  const response = await fetch(`${getBaseURL()}/chat/${sessionId}/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(data)
+  })
+  if (!response.ok) {
+    throw new Error(`API 请求错误: ${response.status}`)
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let result = null
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    const blocks = buffer.split('\n\n')
+    buffer = blocks.pop()
+    for (const block of blocks) {
+      const event = (block.match(/^event: (.*)$/m) || [])[1]
+      const payload = JSON.parse((block.match(/^data: (.*)$/m) || [])[1] || '{}')
+      if (event === 'delta' && onDelta) onDelta(payload.content)
+      else if (event === 'done') result = payload
+      else if (event === 'error') throw new Error(payload.error)
+    }
+  }
+  return result
+}
+
 // API 接口
 export const api = {
   // 偶像相关
@@ -38,12 +71,14 @@ export const api = {
   
   // 会话相关
   createSession: (data) => apiClient.post('/sessions', data),
-  getSession: (sessionId) => apiClient.get(`/sessions/${sessionId}`),
+  getSession: (sessionId, params) => apiClient.get(`/sessions/${sessionId}`, { params }),
   deleteSession: (sessionId) => apiClient.delete(`/sessions/${sessionId}`),
   
   // 聊天相关
   sendMessage: (sessionId, data) => apiClient.post(`/chat/${sessionId}`, data),
+  streamMessage,
   getMessages: (sessionId, params) => apiClient.get(`/chat/${sessionId}/messages`, { params }),
+  getTranslation: (sessionId, messageId) => apiClient.get(`/chat/${sessionId}/messages/${messageId}/translation`),
   
   // 占卜相关
   requestDivination: (sessionId, data) => apiClient.post(`/divination/${sessionId}`, data),
@@ -0,0 +1,12 @@
+"""
+测试用的可控时钟：替代 time.time / time.monotonic 注入到带 clock 参数的组件中，
+测试通过修改 now 推进时间
+"""
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
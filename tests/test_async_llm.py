@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services.async_llm_client import AsyncLLMClient
+
+class TestAsyncLLMClient(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.llm_client = AsyncLLMClient()
+        self.llm_client.max_concurrency = 2
+        self.llm_client.backoff_base = 0
+
+    async def asyncTearDown(self):
+        await self.llm_client.close()
+
+    async def test_generate_response_deepseek(self):
+        """测试异步客户端按模型前缀调用DeepSeek"""
+        async def fake_call(prompt, model, max_tokens, temperature):
+            return f'{model}:{prompt}'
+
+        with patch.object(self.llm_client, '_call_deepseek', side_effect=fake_call):
+            result = await self.llm_client.generate_response('你好', model='deepseek-chat')
+
+        self.assertEqual(result, 'deepseek-chat:你好')
+
+    async def test_concurrency_is_bounded(self):
+        """测试全局信号量限制同时在途的调用数"""
+        peak = 0
+
+        async def fake_call(prompt, model, max_tokens, temperature):
+            nonlocal peak
+            peak = max(peak, self.llm_client.in_flight)
+            await asyncio.sleep(0.01)
+            return prompt
+
+        with patch.object(self.llm_client, '_call_deepseek', side_effect=fake_call):
+            results = await asyncio.gather(*[
+                self.llm_client.generate_response(str(i), model='deepseek-chat') for i in range(6)
+            ])
+
+        self.assertEqual(results, [str(i) for i in range(6)])
+        self.assertEqual(peak, 2)
+        self.assertEqual(self.llm_client.in_flight, 0)
+
+    async def test_errors_are_wrapped(self):
+        """测试异常包装与同步客户端一致"""
+        with patch.object(self.llm_client, '_call_deepseek', side_effect=RuntimeError('boom')):
+            with self.assertRaisesRegex(Exception, 'LLM调用失败: boom'):
+                await self.llm_client.generate_response('你好', model='deepseek-chat')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.benchmarks.mock_llm_server import MockLLMServer, parse_latency, pick_reply, DIVINATION_REPLY, TRANSLATION_REPLY
+from backend.benchmarks.load_test import StageRecorder, percentile
+
+class TestMockLLMServer(unittest.TestCase):
+    def test_parse_latency(self):
+        self.assertEqual(parse_latency("fixed:0.5")(), 0.5)
+        sample = parse_latency("uniform:0.1:0.2")()
+        self.assertTrue(0.1 <= sample <= 0.2)
+        self.assertGreater(parse_latency("lognormal:1:0.5")(), 0)
+        with self.assertRaises(ValueError):
+            parse_latency("pareto:1")
+
+    def test_pick_reply_by_stage(self):
+        self.assertEqual(pick_reply("你是一位隐居山林的易经宗师，精通梅花易数与六爻预测。"), DIVINATION_REPLY)
+        self.assertEqual(pick_reply("请将以下内容翻译成中文：hello"), TRANSLATION_REPLY)
+
+    def test_prefix_cache_usage(self):
+        server = MockLLMServer()
+        prefix = {"role": "system", "content": "固定前缀"}
+        first = server.usage([prefix, {"role": "user", "content": "你好"}], "嗯")
+        second = server.usage([prefix, {"role": "user", "content": "在吗"}], "嗯")
+        self.assertEqual(first["prompt_cache_hit_tokens"], 0)
+        self.assertEqual(second["prompt_cache_hit_tokens"], len("固定前缀"))
+        self.assertEqual(second["prompt_cache_miss_tokens"], len("在吗"))
+
+class TestStageRecorder(unittest.TestCase):
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertIsNone(percentile([], 50))
+
+    def test_summary(self):
+        recorder = StageRecorder()
+        for i in range(10):
+            recorder.record("divination", 0.1 * (i + 1), True)
+        recorder.record("divination", 5.0, False)
+        recorder.record("idol_chat", 0.2, True, first_byte=0.05)
+
+        summary = recorder.summary(elapsed=2.0)
+        self.assertEqual(list(summary), ["divination", "idol_chat"])
+        self.assertEqual(summary["divination"]["count"], 10)
+        self.assertEqual(summary["divination"]["errors"], 1)
+        self.assertAlmostEqual(summary["divination"]["throughput"], 5.0)
+        self.assertAlmostEqual(summary["divination"]["p50"], 0.5)
+        self.assertAlmostEqual(summary["idol_chat"]["ttfb_p50"], 0.05)
+
+if __name__ == '__main__':
+    unittest.main()
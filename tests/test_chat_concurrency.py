@@ -0,0 +1,131 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+# app.py 使用 models/services 顶层导入，需要把 backend 目录加入Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+import app as flask_app
+from models.chat_session import SessionManager
+from models.session_locks import SessionLocks
+from models.session_store import SessionStore
+from services.llm_client import llm_client
+
+DIVINATION_REPLY = """
+<interpretation>此卦刚健中正，象征持续向上的力量。</interpretation>
+<comfort>不用担心，现在的困难只是暂时的。</comfort>
+"""
+
+
+def prompt_text(prompt):
+    return prompt if isinstance(prompt, str) else "\n".join(m["content"] for m in prompt)
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def slow_llm(prompt, **kwargs):
+    """
+    桩 LLM：稍作等待，让并发请求在同一会话上重叠
+    """
+    time.sleep(0.05)
+    return DIVINATION_REPLY if "梅花易数" in prompt_text(prompt) else "嗯，我在听。"
+
+
+class TestChatConcurrency(unittest.TestCase):
+    """通过 Flask 测试客户端验证同一会话的并发请求按会话串行执行"""
+
+    def setUp(self):
+        self.client = flask_app.app.test_client()
+        patcher = patch.object(llm_client, 'generate_response', side_effect=slow_llm)
+        self.generate_response = patcher.start()
+        self.addCleanup(patcher.stop)
+        res = self.client.post('/api/sessions', json={"user_id": "concurrency_user"})
+        self.session_id = res.get_json()['session_id']
+
+    def post_message(self, i):
+        client = flask_app.app.test_client()
+        return client.post(f'/api/chat/{self.session_id}', json={"content": f"我的事业怎么样？第{i}次"}).status_code
+
+    def test_concurrent_posts_divine_once(self):
+        """测试 16 个并发请求只触发一次占卜，每一轮的用户消息与回复相邻"""
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            statuses = list(pool.map(self.post_message, range(16)))
+        self.assertEqual(statuses, [200] * 16)
+
+        session = flask_app.session_manager.get_session(self.session_id)
+        self.assertEqual(len(session.divinations), 1)
+        divination_calls = [c for c in self.generate_response.call_args_list if "梅花易数" in prompt_text(c.args[0])]
+        self.assertEqual(len(divination_calls), 1)
+        self.assertEqual([m.role for m in session.messages], ["user", "idol"] * 16)
+
+    def test_busy_session_returns_409(self):
+        """测试等待会话锁超过 SESSION_LOCK_TIMEOUT 时返回 409，会话没有被修改"""
+        locks = SessionLocks(timeout=0.05)
+        with patch.object(flask_app, 'session_locks', locks):
+            # 模拟同一会话的上一条请求仍在处理
+            with locks.hold(self.session_id):
+                res = self.client.post(f'/api/chat/{self.session_id}', json={"content": "我的事业怎么样？"})
+        self.assertEqual(res.status_code, 409)
+        self.assertEqual(res.get_json()['error'], flask_app.SESSION_BUSY_MESSAGE)
+        self.assertEqual(locks.stats()['timeouts'], 1)
+        self.assertEqual(flask_app.session_manager.get_session(self.session_id).messages, [])
+        self.generate_response.assert_not_called()
+
+
+class TestSharedStreamConflict(unittest.TestCase):
+    """共享模式下流式路由在提交时遇到版本冲突：只发送 409 error，不发送 done"""
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        url = f"sqlite:///{os.path.join(tmpdir, 'sessions.db')}"
+        self.workers = []
+        for _ in range(2):
+            store = SessionStore(url, flush_interval=60)
+            self.addCleanup(store.engine.dispose)
+            self.addCleanup(store.close)
+            self.workers.append(SessionManager(store=store, shared=True))
+        patcher = patch.object(flask_app, 'session_manager', self.workers[0])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = flask_app.app.test_client()
+
+    def test_conflict_sends_error_without_done(self):
+        session_id = self.client.post('/api/sessions', json={"user_id": "shared_user"}).get_json()['session_id']
+        other = self.workers[1]
+
+        def conflicting_stream(prompt, **kwargs):
+            # 流式输出期间另一个 worker 提交了同一会话，本次请求结束时的提交版本冲突
+            session = other.get_session(session_id)
+            session.add_message("user", "来自另一个 worker")
+            other.commit(session)
+            yield "<interpretation>此卦刚健中正。</interpretation>"
+            yield "<comfort>不用担心。</comfort>"
+
+        with patch.object(llm_client, 'stream_response', side_effect=conflicting_stream):
+            res = self.client.post(f'/api/chat/{session_id}/stream', json={"content": "我的事业怎么样？"})
+            events = parse_sse(res.get_data(as_text=True))
+
+        names = [event for event, _ in events]
+        self.assertIn("delta", names)
+        self.assertNotIn("done", names)
+        self.assertEqual(events[-1], ("error", {"error": flask_app.SESSION_BUSY_MESSAGE, "code": 409}))
+        # 回复没有写入，存储中只有另一个 worker 的修改
+        stored = other.get_session(session_id)
+        self.assertEqual([m.content for m in stored.messages], ["来自另一个 worker"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services.conversation_memory import ConversationMemory
+from backend.services.idol_chat_service import IdolChatService
+from backend.models.chat_session import ChatSession
+
+IDOL_INFO = {"name": "小梦", "default_language": "zh"}
+
+
+class FakeLLM:
+    """
+    记录摘要提示词，返回固定长度的摘要；gate 未放行前阻塞，用来模拟慢速调用
+    """
+    def __init__(self, gate=None):
+        self.prompts = []
+        self.gate = gate
+
+    def generate_response(self, prompt, **kwargs):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.prompts.append(prompt)
+        return f"摘要{len(self.prompts):02d}"
+
+
+def chat(session, turns, start=0):
+    for i in range(start, start + turns):
+        session.add_message('user', f'第{i}句')
+        session.add_message('idol', f'回应{i}')
+
+
+class TestConversationMemory(unittest.TestCase):
+    def test_summary_folds_older_turns(self):
+        """测试积累足够轮数后在后台生成摘要，下一轮写回会话并只保留之后的原文消息"""
+        llm = FakeLLM()
+        memory = ConversationMemory(llm, every_turns=2, keep_messages=2)
+        session = ChatSession()
+        chat(session, 2)
+        self.assertIsNone(memory.schedule(session, IDOL_INFO))
+
+        chat(session, 1, start=2)
+        future = memory.schedule(session, IDOL_INFO)
+        self.assertEqual(future.result(timeout=5), "摘要01")
+        self.assertIn("第0句", llm.prompts[0])
+        self.assertNotIn("第2句", llm.prompts[0])
+
+        summary, messages = memory.context(session, IDOL_INFO)
+        self.assertEqual(summary, "摘要01")
+        self.assertEqual(session.summary_upto, 4)
+        self.assertEqual([m.content for m in messages], ['第2句', '回应2'])
+
+        # 再积累两轮后，新摘要在旧摘要的基础上合并
+        chat(session, 2, start=3)
+        memory.schedule(session, IDOL_INFO).result(timeout=5)
+        self.assertIn("摘要01", llm.prompts[1])
+        self.assertIn("第2句", llm.prompts[1])
+        self.assertNotIn("第0句", llm.prompts[1])
+        memory.apply_ready(session)
+        self.assertEqual((session.summary, session.summary_upto), ("摘要02", 8))
+        self.assertEqual(memory.stats()["applied"], 2)
+
+    def test_one_summary_in_flight_per_session(self):
+        """测试同一会话同时只有一次摘要在途"""
+        gate = threading.Event()
+        memory = ConversationMemory(FakeLLM(gate), every_turns=1, keep_messages=0)
+        session = ChatSession()
+        chat(session, 3)
+        future = memory.schedule(session, IDOL_INFO)
+        self.assertIsNotNone(future)
+        self.assertIsNone(memory.schedule(session, IDOL_INFO))
+        gate.set()
+        future.result(timeout=5)
+        self.assertEqual(memory.stats()["scheduled"], 1)
+
+    def test_failed_summary_is_retried(self):
+        """测试摘要失败时不写回会话，之后的轮次重新触发"""
+        llm = FakeLLM()
+        memory = ConversationMemory(llm, every_turns=1, keep_messages=0)
+        session = ChatSession()
+        chat(session, 1)
+        with patch.object(llm, 'generate_response', side_effect=RuntimeError("timeout")):
+            self.assertIsNone(memory.schedule(session, IDOL_INFO).result(timeout=5))
+        self.assertFalse(memory.apply_ready(session))
+        self.assertEqual(memory.stats()["failed"], 1)
+        self.assertIsNotNone(memory.schedule(session, IDOL_INFO).result(timeout=5))
+        self.assertTrue(memory.apply_ready(session))
+
+    @patch('backend.services.idol_chat_service.llm_client.generate_response', return_value='嗯……')
+    def test_prompt_size_stays_bounded(self, mock_generate_response):
+        """测试长对话中提示词包含摘要，长度不随轮数增长"""
+        service = IdolChatService()
+        service.conversation_memory = ConversationMemory(FakeLLM(), every_turns=3, keep_messages=4, workers=1)
+        session = ChatSession()
+        sizes = []
+        for i in range(40):
+            session.add_message('user', f'这是我说的第{i:02d}句话，' * 5)
+            service.generate_idol_response(IDOL_INFO, session)
+            session.add_message('idol', f'这是你回应的第{i:02d}句话，' * 5)
+            sizes.append(sum(len(m['content']) for m in mock_generate_response.call_args[0][0]))
+            executor = service.conversation_memory._executor
+            if executor is not None:
+                # 等后台摘要完成，让下一轮可以写回
+                executor.submit(lambda: None).result(timeout=5)
+
+        prompt = "\n".join(m['content'] for m in mock_generate_response.call_args[0][0])
+        self.assertIn("之前聊过的内容", prompt)
+        self.assertIsNotNone(session.summary)
+        self.assertNotIn("第00句话", prompt)
+        self.assertLessEqual(max(sizes[20:]), max(sizes[:20]))
+
+
+if __name__ == '__main__':
+    unittest.main()
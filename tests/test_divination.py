@@ -1,6 +1,7 @@
 import unittest
 from unittest.mock import patch
 from backend.services.divination_service import DivinationService
+from backend.services.meihua import build_casting
 
 class TestDivinationService(unittest.TestCase):
     def setUp(self):
@@ -26,16 +27,14 @@ class TestDivinationService(unittest.TestCase):
         self.assertIn('我和我的伴侣会有未来吗？', prompt)
         self.assertIn('请严格按照以下 XML 标签格式输出', prompt)
     
+    @patch('backend.services.divination_service.cast', return_value=build_casting(2, 7, 3, 'text'))
     @patch('backend.services.divination_service.llm_client.generate_response')
-    def test_generate_divination(self, mock_generate_response):
-        """测试生成占卜结果"""
+    def test_generate_divination(self, mock_generate_response, mock_cast):
+        """测试生成占卜结果：卦象与原文来自本地起卦，模型只提供解读与安抚"""
         # 模拟 LLM 返回 XML
         mock_generate_response.return_value = """
-        <hexagram>第31卦 咸卦</hexagram>
-        <source>《周易·咸卦》：咸，亨，利贞，取女吉。\n这句话大意是：感应相合则亨通，守正有利，婚配为吉。</source>
         <interpretation>咸卦象征感应与互动。这里用“更像/可能/倾向”来表达，不做绝对断言。</interpretation>
         <comfort>别担心，一切都会好的。</comfort>
-        <question>你需要我再给你一些更具体的建议，还是想先让我陪你聊聊？</question>
         """
         
         # 调用占卜服务
@@ -46,12 +45,48 @@ class TestDivinationService(unittest.TestCase):
             user_emotion=None
         )
         
+        # 提示词中带上了本地起得的卦，不再要求模型起卦
+        prompt = mock_generate_response.call_args[0][0]
+        self.assertIn('第31卦 咸卦', prompt)
+        self.assertNotIn('<hexagram>', prompt)
+        # 每次解读针对具体的人，不走跨用户共享的响应缓存
+        self.assertFalse(mock_generate_response.call_args[1].get('cache'))
+
         # 验证结果包含格式化后的内容
-        self.assertIn('【第31卦 咸卦】', result)
-        self.assertIn('《周易·咸卦》：咸，亨，利贞，取女吉。', result)
+        self.assertIn('【第31卦 咸卦 泽山咸 上兑下艮】', result)
+        self.assertIn('《周易·咸卦》卦辞：亨，利贞，取女吉。', result)
+        self.assertIn('《象》曰：山上有泽，咸；君子以虚受人。', result)
+        self.assertIn('动爻：九三', result)
         self.assertIn('咸卦象征感应与互动', result)
         self.assertIn('别担心，一切都会好的。', result)
-        self.assertIn('你需要我再给你一些更具体的建议', result)
+        self.assertIn('你想继续吗？', result)
+
+    @patch('backend.services.divination_service.cast', return_value=build_casting(2, 7, 3, 'text'))
+    @patch('backend.services.divination_service.llm_client.generate_response')
+    def test_generate_divination_untagged_output(self, mock_generate_response, mock_cast):
+        """测试模型没有按标签输出时，全文作为解读"""
+        mock_generate_response.return_value = '感应之道，贵在真诚。'
+        result = self.divination_service.generate_divination(None, 'love', '我和我的伴侣会有未来吗？')
+        self.assertIn('【第31卦 咸卦 泽山咸 上兑下艮】', result)
+        self.assertIn('感应之道，贵在真诚。', result)
+
+    @patch('backend.services.divination_service.cast', return_value=build_casting(2, 7, 3, 'text'))
+    @patch('backend.services.divination_service.llm_client.stream_response')
+    def test_stream_divination(self, mock_stream_response, mock_cast):
+        """测试流式占卜：推送的文本不含标签，最终结果与非流式格式一致"""
+        mock_stream_response.return_value = iter(["<interpretation>咸卦象征", "感应。</interp", "retation><comfort>别担心。</comfort>"])
+        stream = self.divination_service.stream_divination(None, 'love', '我和我的伴侣会有未来吗？')
+        deltas = []
+        while True:
+            try:
+                deltas.append(next(stream))
+            except StopIteration as stop:
+                result = stop.value
+                break
+        self.assertIn('【第31卦 咸卦 泽山咸 上兑下艮】', deltas[0])
+        self.assertEqual("".join(deltas[1:]), "咸卦象征感应。\n\n别担心。")
+        self.assertIn('咸卦象征感应。\n\n别担心。', result)
+        self.assertIn('你想继续吗？', result)
 
 if __name__ == '__main__':
     unittest.main()
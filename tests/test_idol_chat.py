@@ -80,6 +80,95 @@ class TestIdolChatService(unittest.TestCase):
         self.assertIn('translation', result)
         self.assertEqual(result['language'], 'en')
     
+    @patch('backend.services.idol_chat_service.llm_client.generate_response')
+    def test_fused_translation_single_call(self, mock_generate_response):
+        """测试非中英文 Persona 在一次调用中同时得到原文与翻译"""
+        mock_generate_response.return_value = '<reply>괜찮아요, 천천히 해요.</reply>\n<translation>没关系，慢慢来。</translation>'
+
+        session = ChatSession(idol_id=None, user_id='test')
+        session.add_message('user', '今天好累')
+        idol_info = {"name": "IU", "default_language": "ko", "mother_tongue": "韩语"}
+
+        result = self.idol_chat_service.generate_idol_response(idol_info, session, translate=True)
+
+        mock_generate_response.assert_called_once()
+        self.assertIn('<translation>', mock_generate_response.call_args[0][0][-1]['content'])
+        self.assertEqual(result['persona_reply'], '괜찮아요, 천천히 해요.')
+        self.assertEqual(result['translation'], '没关系，慢慢来。')
+
+    @patch('backend.services.idol_chat_service.llm_client.generate_response')
+    def test_fused_translation_falls_back_to_two_calls(self, mock_generate_response):
+        """测试合并输出格式不对时退回回复 + 翻译两次调用"""
+        mock_generate_response.side_effect = ['괜찮아요', '괜찮아요, 천천히 해요.', '没关系，慢慢来。']
+
+        session = ChatSession(idol_id=None, user_id='test')
+        session.add_message('user', '今天好累')
+        idol_info = {"name": "IU", "default_language": "ko", "mother_tongue": "韩语"}
+
+        result = self.idol_chat_service.generate_idol_response(idol_info, session, translate=True)
+
+        self.assertEqual(mock_generate_response.call_count, 3)
+        self.assertNotIn('<translation>', mock_generate_response.call_args_list[1][0][0][-1]['content'])
+        self.assertEqual(result['persona_reply'], '괜찮아요, 천천히 해요.')
+        self.assertEqual(result['translation'], '没关系，慢慢来。')
+        self.assertEqual(self.idol_chat_service.translation_stats()['fallbacks'], 1)
+
+    @patch('backend.services.idol_chat_service.llm_client.generate_response', return_value='嗯……')
+    def test_prompt_prefix_is_stable(self, mock_generate_response):
+        """测试提示词按角色拆分，固定前缀只生成一次且每轮逐字节相同"""
+        session = ChatSession(idol_id=None, user_id='test')
+        idol_info = {"name": "IU", "default_language": "zh", "mother_tongue": "中文", "tone_features": "温柔"}
+        prompts = []
+        with patch.object(self.idol_chat_service, 'build_prompt_prefix',
+                          wraps=self.idol_chat_service.build_prompt_prefix) as mock_build:
+            for content in ['今天好累', '工作做不完']:
+                session.add_message('user', content)
+                self.idol_chat_service.generate_idol_response(idol_info, session)
+                prompts.append(mock_generate_response.call_args[0][0])
+                session.add_message('idol', '嗯……')
+        mock_build.assert_called_once()
+
+        first, second = prompts
+        self.assertEqual(first[0]['role'], 'system')
+        self.assertEqual(first[0]['content'], second[0]['content'])
+        self.assertEqual(first[0]['content'], session.prompt_prefix)
+        self.assertIn('温柔', session.prompt_prefix)
+        self.assertEqual([m['role'] for m in second[1:]], ['user', 'assistant', 'user'])
+        self.assertEqual(second[-1]['content'], '工作做不完')
+
+    @patch('backend.services.idol_chat_service.llm_client.stream_response')
+    def test_stream_strips_name_prefix(self, mock_stream_response):
+        """测试流式推送的文本与保存的回复一致：跨分片的称呼前缀同样被去掉"""
+        idol_info = {"name": "Lady Gaga", "default_language": "en"}
+        cases = [
+            (["Lady", " Gaga", ": ", " Hello", ", darling"], "Hello, darling"),
+            (["你：", "  ", "今天", "还好吗"], "今天还好吗"),
+            (["Hi"], "Hi"),
+        ]
+        for deltas, expected in cases:
+            mock_stream_response.return_value = iter(deltas)
+            session = ChatSession(idol_id=None, user_id='test')
+            session.add_message('user', 'hello')
+            stream = self.idol_chat_service.stream_idol_response(idol_info, session)
+            streamed = []
+            while True:
+                try:
+                    streamed.append(next(stream))
+                except StopIteration as done:
+                    reply = done.value
+                    break
+            self.assertEqual("".join(streamed), expected)
+            self.assertEqual(reply['persona_reply'], expected)
+
+    def test_needs_translation(self):
+        """测试中文、英文（含全称写法）回复不翻译，其他语言需要翻译"""
+        for lang in ['zh', 'zh-CN', 'Chinese', 'en', 'English', None]:
+            self.assertFalse(self.idol_chat_service.needs_translation({"default_language": lang}))
+        for lang in ['ko', 'ja']:
+            self.assertTrue(self.idol_chat_service.needs_translation({"default_language": lang}))
+        self.assertIsNone(self.idol_chat_service._create_translation_prompt(
+            {"default_language": "english"}, {"persona_reply": "hi"}, True))
+
     def test_get_idol_info(self):
         """测试获取偶像信息"""
         idol_info = self.idol_chat_service.get_idol_info('idol_001')
@@ -0,0 +1,67 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services.intent_classifier import IntentClassifier, load_keyword_tables, normalize_idol_name
+
+
+class TestIntentClassifier(unittest.TestCase):
+    def setUp(self):
+        self.classifier = IntentClassifier()
+
+    def test_divination_type(self):
+        """测试占卜类型按表中顺序取第一个命中的类型"""
+        self.assertEqual(self.classifier.classify("我想占卜一下爱情").divination_type, "love")
+        self.assertEqual(self.classifier.classify("考试和工作哪个重要").divination_type, "career")
+        self.assertEqual(self.classifier.classify("Hello").divination_type, None)
+
+    def test_affirmative_and_negative(self):
+        """测试否定优先于肯定"""
+        intent = self.classifier.classify("需要")
+        self.assertTrue(intent.affirmative)
+        self.assertFalse(intent.negative)
+        intent = self.classifier.classify("不需要了")
+        self.assertTrue(intent.negative)
+        self.assertFalse(intent.affirmative)
+
+    def test_looks_like_name(self):
+        """测试名字识别：去掉称呼前缀后是中文或英文名字"""
+        intent = self.classifier.classify("召唤 Taylor Swift")
+        self.assertEqual(intent.idol_name, "Taylor Swift")
+        self.assertTrue(intent.looks_like_name)
+        self.assertTrue(self.classifier.classify("“周杰伦”").looks_like_name)
+        self.assertFalse(self.classifier.classify("我想聊聊").looks_like_name)
+        self.assertFalse(self.classifier.classify("我需要建议").looks_like_name)
+        self.assertFalse(self.classifier.classify("周杰伦!!!").looks_like_name)
+
+    def test_name_check_after_prefix(self):
+        """测试先去掉称呼前缀再判断名字"""
+        self.assertFalse(self.classifier.classify("占卜师").looks_like_name)
+        intent = self.classifier.classify("我想 王菲")
+        self.assertEqual(intent.idol_name, "王菲")
+        self.assertTrue(intent.looks_like_name)
+
+    def test_normalize_idol_name(self):
+        self.assertEqual(normalize_idol_name("  请：一位虚拟偶像 IU "), "IU")
+        self.assertEqual(normalize_idol_name(None), "")
+
+    def test_load_keyword_tables(self):
+        """测试 JSON 关键词表只覆盖写出的键"""
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as f:
+            json.dump({"divination": {"pet": ["猫", "狗"]}}, f, ensure_ascii=False)
+        try:
+            classifier = IntentClassifier(load_keyword_tables(f.name))
+        finally:
+            os.remove(f.name)
+        self.assertEqual(classifier.classify("我的猫还好吗").divination_type, "pet")
+        self.assertEqual(classifier.classify("爱情").divination_type, None)
+        self.assertTrue(classifier.classify("好的").affirmative)
+
+
+if __name__ == '__main__':
+    unittest.main()
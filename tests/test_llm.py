@@ -1,12 +1,15 @@
+import io
 import unittest
 from unittest.mock import patch, MagicMock
 import os
 import sys
+import requests
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from backend.services.llm_client import LLMClient
+from backend.services.prompt_cache_stats import PromptCacheStats
 
 class TestLLMClient(unittest.TestCase):
     def setUp(self):
@@ -58,5 +61,85 @@ class TestLLMClient(unittest.TestCase):
         self.assertEqual(result, 'DeepSeek测试响应')
         mock_call_deepseek.assert_called_once()
 
+    def test_deepseek_reuses_pooled_session(self):
+        """测试DeepSeek调用复用同一个连接池会话，并使用分离的连接/读取超时"""
+        http = self.llm_client.get_http_session()
+        self.assertIs(http, self.llm_client.get_http_session())
+
+        mock_response = MagicMock()
+        mock_response.json.return_value = {"choices": [{"message": {"content": '池化响应'}}]}
+        with patch.object(http, 'post', return_value=mock_response) as mock_post:
+            self.llm_client.generate_response('你好', model='deepseek-chat')
+            result = self.llm_client.generate_response('你好', model='deepseek-chat')
+
+        self.assertEqual(result, '池化响应')
+        self.assertEqual(mock_post.call_count, 2)
+        _, kwargs = mock_post.call_args
+        self.assertEqual(kwargs['timeout'], (self.llm_client.connect_timeout, self.llm_client.read_timeout))
+
+    def test_stream_response_deepseek(self):
+        """测试DeepSeek流式调用逐段产出 SSE 中的 delta 内容"""
+        mock_response = MagicMock()
+        mock_response.iter_lines.return_value = [line.encode('utf-8') for line in [
+            'data: {"choices": [{"delta": {"role": "assistant"}}]}',
+            '',
+            'data: {"choices": [{"delta": {"content": "你"}}]}',
+            'data: {"choices": [{"delta": {"content": "好"}}]}',
+            'data: [DONE]',
+        ]]
+        http = self.llm_client.get_http_session()
+        with patch.object(http, 'post', return_value=mock_response) as mock_post:
+            deltas = list(self.llm_client.stream_response('你好', model='deepseek-chat'))
+
+        self.assertEqual(deltas, ['你', '好'])
+        _, kwargs = mock_post.call_args
+        self.assertTrue(kwargs['stream'])
+        self.assertTrue(kwargs['json']['stream'])
+
+    def test_stream_response_decodes_utf8_without_charset(self):
+        """测试服务端未声明 charset 时，流式 delta 中的中日韩文字按 UTF-8 解码而不是乱码"""
+        body = ('data: {"choices": [{"delta": {"content": "今天的运势"}}]}\n\n'
+                'data: {"choices": [{"delta": {"content": "괜찮아요"}}]}\n\n'
+                'data: [DONE]\n\n').encode('utf-8')
+        response = requests.Response()
+        response.status_code = 200
+        response.headers['Content-Type'] = 'text/event-stream'
+        # 与 requests 适配器一致：按响应头推断编码，text/* 未声明 charset 时为 ISO-8859-1
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(body)
+
+        http = self.llm_client.get_http_session()
+        with patch.object(http, 'post', return_value=response):
+            deltas = list(self.llm_client.stream_response('你好', model='deepseek-chat'))
+
+        self.assertEqual(deltas, ['今天的运势', '괜찮아요'])
+
+    def test_prompt_cache_usage_recorded(self):
+        """测试按角色拆分的消息原样发送，并记录 usage 中的提示词缓存命中"""
+        self.llm_client.prompt_cache_stats = PromptCacheStats()
+        messages = [{"role": "system", "content": "固定前缀"}, {"role": "user", "content": "你好"}]
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            "choices": [{"message": {"content": '命中'}}],
+            "usage": {"prompt_tokens": 100, "prompt_cache_hit_tokens": 80, "prompt_cache_miss_tokens": 20}
+        }
+        stream_response = MagicMock()
+        stream_response.iter_lines.return_value = [line.encode('utf-8') for line in [
+            'data: {"choices": [{"delta": {"content": "嗯"}}]}',
+            'data: {"choices": [], "usage": {"prompt_tokens": 50, "prompt_cache_hit_tokens": 0}}',
+            'data: [DONE]',
+        ]]
+        http = self.llm_client.get_http_session()
+        with patch.object(http, 'post', side_effect=[mock_response, stream_response]) as mock_post:
+            self.llm_client.generate_response(messages, model='deepseek-chat')
+            self.assertEqual(mock_post.call_args[1]['json']['messages'], messages)
+            self.assertEqual(list(self.llm_client.stream_response(messages, model='deepseek-chat')), ['嗯'])
+
+        stats = self.llm_client.prompt_cache_stats.stats()["deepseek"]
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["prompt_tokens"], 150)
+        self.assertEqual(stats["cache_hit_tokens"], 80)
+        self.assertAlmostEqual(stats["hit_rate"], 80 / 150)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import unittest
+from datetime import datetime
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services.hexagram_table import HEXAGRAMS, HEXAGRAM_BY_NUMBER, hexagram_by_lines, hexagram_by_trigrams
+from backend.services.meihua import cast, cast_by_numbers, cast_by_text, cast_by_time, line_name
+
+class TestHexagramTable(unittest.TestCase):
+    def test_table_is_complete(self):
+        """测试六十四卦齐全，卦序、上下卦组合与六爻都不重复"""
+        self.assertEqual(len(HEXAGRAMS), 64)
+        self.assertEqual(sorted(HEXAGRAM_BY_NUMBER), list(range(1, 65)))
+        self.assertEqual(len({(h['upper'], h['lower']) for h in HEXAGRAMS}), 64)
+        self.assertEqual(len({h['lines'] for h in HEXAGRAMS}), 64)
+        for hexagram in HEXAGRAMS:
+            self.assertTrue(hexagram['judgment'])
+            self.assertTrue(hexagram['image'])
+
+    def test_lookup(self):
+        self.assertEqual(hexagram_by_lines((1, 1, 1, 1, 1, 1))['name'], '乾')
+        self.assertEqual(hexagram_by_lines((0, 0, 0, 0, 0, 0))['full_name'], '坤为地')
+        xian = hexagram_by_trigrams(2, 7)
+        self.assertEqual((xian['number'], xian['full_name']), (31, '泽山咸'))
+        self.assertEqual(hexagram_by_trigrams(6, 3)['full_name'], '水火既济')
+
+class TestMeihuaCasting(unittest.TestCase):
+    def test_cast_by_time(self):
+        """丙午年十月十八日午时：上离下兑得睽卦，上九动，变归妹，互既济"""
+        casting = cast_by_time(datetime(2026, 10, 18, 12, 0))
+        self.assertEqual(casting['hexagram']['number'], 38)
+        self.assertEqual(casting['moving_line'], 6)
+        self.assertEqual(casting['moving_line_name'], '上九')
+        self.assertEqual(casting['changed']['full_name'], '雷泽归妹')
+        self.assertEqual(casting['mutual']['full_name'], '水火既济')
+
+    def test_cast_by_numbers(self):
+        casting = cast_by_numbers(3, 5, datetime(2026, 1, 1, 0, 0))
+        self.assertEqual(casting['hexagram']['full_name'], '火风鼎')
+        self.assertEqual(casting['moving_line_name'], '九三')
+        self.assertEqual(casting['changed']['full_name'], '火水未济')
+
+    def test_cast_selects_method(self):
+        when = datetime(2026, 10, 18, 12, 0)
+        self.assertEqual(cast('我选 3 和 5', when)['method'], 'numbers')
+        self.assertEqual(cast('我的事业怎么样？', when)['method'], 'text')
+        self.assertEqual(cast('', when)['method'], 'time')
+        # 同一问题在同一时辰起得同一卦
+        self.assertEqual(cast_by_text('我的事业怎么样？', when), cast_by_text('我的事业 怎么样？', when))
+
+    def test_line_name(self):
+        self.assertEqual(line_name(1, True), '初九')
+        self.assertEqual(line_name(2, False), '六二')
+        self.assertEqual(line_name(6, False), '上六')
+
+if __name__ == '__main__':
+    unittest.main()
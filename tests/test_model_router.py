@@ -0,0 +1,98 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch
+import requests
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services.model_router import Endpoint, ModelRouter, parse_endpoints
+from backend.services.llm_client import LLMClient
+from tests.fake_clock import FakeClock
+
+class TestModelRouter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.deepseek = Endpoint('deepseek', 'deepseek-chat')
+        self.openai = Endpoint('openai', 'gpt-4o-mini')
+        self.router = ModelRouter([self.deepseek, self.openai], alpha=0.5, max_error_rate=0.5,
+                                  recovery_timeout=30, clock=self.clock)
+
+    def test_parse_endpoints(self):
+        endpoints = parse_endpoints('deepseek-chat, openai:gpt-4o-mini,')
+        self.assertEqual([e.name for e in endpoints], ['deepseek:deepseek-chat', 'openai:gpt-4o-mini'])
+        with self.assertRaises(ValueError):
+            parse_endpoints('anthropic:claude')
+
+    def test_selects_fastest_after_sampling_every_endpoint(self):
+        """测试没有样本的端点优先，之后选择耗时 EWMA 最低的端点"""
+        self.router.record_success(self.deepseek, 2.0)
+        self.assertIs(self.router.select(), self.openai)
+        self.router.record_success(self.openai, 0.5)
+        self.assertIs(self.router.select(), self.openai)
+
+        self.router.record_success(self.openai, 5.5)
+        self.assertEqual(self.openai.ewma_latency, 3.0)
+        self.assertIs(self.router.select(), self.deepseek)
+
+    def test_model_restricts_allowed_set(self):
+        self.router.record_success(self.deepseek, 2.0)
+        self.router.record_success(self.openai, 0.5)
+        self.assertIs(self.router.select('deepseek-chat'), self.deepseek)
+
+        endpoint = self.router.select('gpt-4')
+        self.assertEqual(endpoint.name, 'openai:gpt-4')
+        self.assertIn('openai:gpt-4', self.router.stats())
+
+    def test_failover_and_recovery(self):
+        """测试错误率过高的端点被跳过，recovery_timeout 后重新参与选择"""
+        self.router.record_success(self.deepseek, 0.5)
+        self.router.record_success(self.openai, 2.0)
+        self.assertIs(self.router.select(exclude={'deepseek:deepseek-chat'}), self.openai)
+
+        self.router.record_failure(self.deepseek)
+        self.assertFalse(self.router.stats()['deepseek:deepseek-chat']['healthy'])
+        self.assertIs(self.router.select(), self.openai)
+
+        self.clock.now += 30
+        self.assertIs(self.router.select(), self.deepseek)
+
+    def test_unavailable_endpoint_is_skipped(self):
+        router = ModelRouter([self.deepseek, self.openai], is_available=lambda e: e.provider != 'deepseek')
+        self.assertIs(router.select(), self.openai)
+        # 全部不可用时仍然返回一个端点，由熔断器拒绝
+        self.assertIs(router.select('deepseek-chat'), self.deepseek)
+
+class TestLLMClientRouting(unittest.TestCase):
+    @patch.dict(os.environ, {'LLM_ENDPOINTS': 'deepseek-chat,openai:gpt-4o-mini'})
+    def setUp(self):
+        self.llm_client = LLMClient()
+        self.llm_client.single_flight = None
+
+    @patch('backend.services.llm_client.time.sleep')
+    def test_fails_over_to_next_endpoint(self, mock_sleep):
+        """测试端点失败后立即切换到下一个端点，不等待退避"""
+        with patch.object(self.llm_client, '_call_deepseek', side_effect=requests.ConnectionError('down')) as mock_deepseek, \
+             patch.object(self.llm_client, '_call_openai', return_value='来自 OpenAI') as mock_openai:
+            self.assertEqual(self.llm_client.generate_response('你好'), '来自 OpenAI')
+
+        mock_deepseek.assert_called_once()
+        self.assertEqual(mock_openai.call_args[0][1], 'gpt-4o-mini')
+        mock_sleep.assert_not_called()
+
+        endpoints = self.llm_client.resilience_stats()['endpoints']
+        self.assertEqual(endpoints['deepseek:deepseek-chat']['failures'], 1)
+        self.assertEqual(endpoints['openai:gpt-4o-mini']['requests'], 1)
+
+    def test_stream_fails_over_before_first_delta(self):
+        def broken_stream(*args):
+            raise requests.ConnectionError('down')
+            yield
+
+        with patch.object(self.llm_client, '_stream_deepseek', side_effect=broken_stream), \
+             patch.object(self.llm_client, '_stream_openai', side_effect=lambda *args: iter(['你', '好'])):
+            self.assertEqual(list(self.llm_client.stream_response('你好')), ['你', '好'])
+
+if __name__ == '__main__':
+    unittest.main()
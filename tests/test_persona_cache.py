@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services.persona_cache import PersonaCache, persona_cache_key
+from backend.services.response_cache import SQLiteCacheTier
+from backend.services.idol_chat_service import IdolChatService
+from tests.fake_clock import FakeClock
+
+class TestPersonaCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = PersonaCache(fresh_ttl=60, clock=self.clock)
+
+    def test_key_ignores_case_and_spacing(self):
+        """测试缓存键忽略大小写与多余空白"""
+        self.assertEqual(persona_cache_key(' Taylor  Swift '), persona_cache_key('taylor swift'))
+        self.assertEqual(persona_cache_key('周杰伦'), '周杰伦')
+
+    def test_get_or_generate_calls_once(self):
+        """测试同一偶像只生成一次"""
+        generate = MagicMock(side_effect=lambda name: {"name": name})
+        self.cache.get_or_generate('Taylor Swift', generate)
+        profile = self.cache.get_or_generate('taylor swift', generate)
+
+        self.assertEqual(profile, {"name": "Taylor Swift"})
+        generate.assert_called_once()
+
+    def test_stale_entry_is_served_then_refreshed(self):
+        """测试过期条目先返回旧值，再在后台刷新"""
+        self.cache.put('周杰伦', {"version": 1})
+        self.clock.now += 61
+
+        generate = MagicMock(return_value={"version": 2})
+        profile = self.cache.get_or_generate('周杰伦', generate)
+
+        self.assertEqual(profile, {"version": 1})
+        self.assertEqual(self.cache.stats()['stale_hits'], 1)
+        for _ in range(200):
+            if self.cache.stats()['refreshes']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.cache.get('周杰伦'), ({"version": 2}, False))
+
+    def test_persisted_across_restart(self):
+        """测试 SQLite 存储在重新打开后仍能命中"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'persona.db')
+            store = SQLiteCacheTier(path)
+            PersonaCache(store=store).put('Taylor Swift', {"name": "Taylor Swift"})
+            store.close()
+
+            store = SQLiteCacheTier(path)
+            profile, is_stale = PersonaCache(store=store).get('taylor swift')
+            store.close()
+
+        self.assertEqual(profile, {"name": "Taylor Swift"})
+        self.assertFalse(is_stale)
+
+    def test_service_does_not_cache_failures(self):
+        """测试生成失败时返回保底 Persona，且不写入缓存"""
+        service = IdolChatService()
+        service.persona_cache = self.cache
+        with patch.object(service.llm_client, 'generate_response', side_effect=Exception('timeout')):
+            profile = service.generate_persona_profile('周杰伦')
+        self.assertEqual(profile['speaking_pace'], '慢')
+        self.assertEqual(self.cache.get('周杰伦'), (None, False))
+
+        with patch.object(service.llm_client, 'generate_response', return_value='【母语】中文') as mock_generate:
+            service.generate_persona_profile('周杰伦')
+            service.generate_persona_profile('周杰伦')
+        mock_generate.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import requests
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services.resilience import CircuitBreaker, backoff_delay, call_with_hedge, is_retryable
+from backend.services.llm_client import LLMClient
+from tests.fake_clock import FakeClock
+
+class TestResilience(unittest.TestCase):
+    def test_backoff_is_exponential_with_jitter(self):
+        """测试退避时间按指数增长、带抖动并有上限"""
+        self.assertEqual(backoff_delay(0, base=0.5, cap=8, rng=lambda: 1.0), 0.5)
+        self.assertEqual(backoff_delay(3, base=0.5, cap=8, rng=lambda: 1.0), 4.0)
+        self.assertEqual(backoff_delay(10, base=0.5, cap=8, rng=lambda: 1.0), 8.0)
+        self.assertEqual(backoff_delay(3, base=0.5, cap=8, rng=lambda: 0.25), 1.0)
+
+    def test_client_errors_are_not_retryable(self):
+        """测试 4xx（429 除外）不重试"""
+        def http_error(status):
+            response = MagicMock(status_code=status)
+            return requests.HTTPError(response=response)
+
+        self.assertFalse(is_retryable(http_error(401)))
+        self.assertTrue(is_retryable(http_error(429)))
+        self.assertTrue(is_retryable(http_error(503)))
+        self.assertTrue(is_retryable(requests.ConnectionError()))
+
+    def test_circuit_breaker_transitions(self):
+        """测试熔断器 关闭 -> 打开 -> 半开 -> 关闭"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30, clock=clock)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow_request())
+
+        clock.now += 30
+        self.assertEqual(breaker.state, "half_open")
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+        clock.now += 30
+        self.assertTrue(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.stats()['times_opened'], 2)
+
+    def test_hedge_returns_faster_request(self):
+        """测试慢请求触发对冲，并返回先完成的结果"""
+        calls = []
+        lock = threading.Lock()
+
+        def fn():
+            with lock:
+                calls.append(1)
+                first = len(calls) == 1
+            time.sleep(0.5 if first else 0.01)
+            return 'slow' if first else 'fast'
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            result, hedged = call_with_hedge(fn, 0.05, executor)
+
+        self.assertEqual((result, hedged), ('fast', True))
+
+class TestLLMClientResilience(unittest.TestCase):
+    def setUp(self):
+        self.llm_client = LLMClient()
+        self.llm_client.single_flight = None
+        self.llm_client.circuit_breakers['deepseek'] = CircuitBreaker(failure_threshold=3, recovery_timeout=60)
+
+    @patch('backend.services.llm_client.time.sleep')
+    def test_retries_with_backoff_then_fails_fast(self, mock_sleep):
+        """测试重试使用退避，熔断打开后直接失败而不再请求上游"""
+        with patch.object(self.llm_client, '_call_deepseek', side_effect=requests.ConnectionError('down')) as mock_call:
+            with self.assertRaises(Exception):
+                self.llm_client.generate_response('你好', model='deepseek-chat')
+            self.assertEqual(mock_call.call_count, 3)
+            self.assertEqual(mock_sleep.call_count, 2)
+            self.assertEqual(self.llm_client.resilience_stats()['circuit_breakers']['deepseek']['state'], 'open')
+
+            with self.assertRaisesRegex(Exception, '熔断'):
+                self.llm_client.generate_response('你好', model='deepseek-chat')
+            self.assertEqual(mock_call.call_count, 3)
+
+    @patch('backend.services.llm_client.time.sleep')
+    def test_client_errors_are_not_retried(self, mock_sleep):
+        """测试 4xx 错误不重试，也不计入熔断"""
+        error = requests.HTTPError(response=MagicMock(status_code=400))
+        with patch.object(self.llm_client, '_call_deepseek', side_effect=error) as mock_call:
+            with self.assertRaises(Exception):
+                self.llm_client.generate_response('你好', model='deepseek-chat')
+
+        mock_call.assert_called_once()
+        self.assertEqual(self.llm_client.circuit_breakers['deepseek'].state, 'closed')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services.response_cache import ResponseCache, MemoryCacheTier, SQLiteCacheTier, make_cache_key
+from backend.services.llm_client import LLMClient
+from tests.fake_clock import FakeClock
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_cache_key_covers_all_parameters(self):
+        """测试缓存键由模型、提示词、温度和最大令牌数共同决定"""
+        key = make_cache_key('deepseek-chat', '你好', 0.7, 2000)
+        self.assertEqual(key, make_cache_key('deepseek-chat', '你好', 0.7, 2000))
+        self.assertNotEqual(key, make_cache_key('deepseek-chat', '你好', 0.2, 2000))
+        self.assertNotEqual(key, make_cache_key('deepseek-chat', '你好', 0.7, 100))
+        self.assertNotEqual(key, make_cache_key('gpt-4', '你好', 0.7, 2000))
+
+    def test_memory_tier_lru_and_ttl(self):
+        """测试内存层按 LRU 淘汰并遵守过期时间"""
+        tier = MemoryCacheTier(max_entries=2, clock=self.clock)
+        tier.set('a', '1', ttl=10)
+        tier.set('b', '2', ttl=10)
+        tier.get('a')
+        tier.set('c', '3', ttl=10)
+
+        self.assertEqual(tier.get('a'), '1')
+        self.assertIsNone(tier.get('b'))
+        self.assertEqual(tier.evictions, 1)
+
+        self.clock.now += 11
+        self.assertIsNone(tier.get('a'))
+
+    def test_disk_tier_survives_restart(self):
+        """测试磁盘层在重新打开后仍能命中，并回填内存层"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'cache.db')
+            disk = SQLiteCacheTier(path, clock=self.clock)
+            ResponseCache(memory=MemoryCacheTier(clock=self.clock), disk=disk).set('k', '缓存值', ttl=60)
+            disk.close()
+
+            disk = SQLiteCacheTier(path, clock=self.clock)
+            cache = ResponseCache(memory=MemoryCacheTier(clock=self.clock), disk=disk)
+            self.assertEqual(cache.get('k'), '缓存值')
+            self.assertEqual(cache.get('k'), '缓存值')
+            stats = cache.stats()
+            self.assertEqual((stats['disk_hits'], stats['memory_hits'], stats['misses']), (1, 1, 0))
+
+            self.clock.now += 61
+            self.assertIsNone(cache.get('missing'))
+            self.assertEqual(cache.stats()['misses'], 1)
+            disk.close()
+
+    def test_llm_client_cache_opt_in_and_out(self):
+        """测试 LLMClient 按调用选择是否使用缓存"""
+        client = LLMClient()
+        client.response_cache = ResponseCache(memory=MemoryCacheTier(clock=self.clock))
+        client.cache_default = False
+
+        with patch.object(client, '_call_deepseek', return_value='回复') as mock_call:
+            client.generate_response('同一个提示词', model='deepseek-chat', cache=True)
+            client.generate_response('同一个提示词', model='deepseek-chat', cache=True)
+            self.assertEqual(mock_call.call_count, 1)
+
+            client.generate_response('同一个提示词', model='deepseek-chat')
+            client.generate_response('同一个提示词', model='deepseek-chat', cache=False)
+            self.assertEqual(mock_call.call_count, 3)
+
+        self.assertEqual(client.response_cache.stats()['hits'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
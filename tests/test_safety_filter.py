@@ -0,0 +1,88 @@
+import os
+import sys
+import random
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services.phrase_automaton import PhraseAutomaton
+from backend.services.safety_filter import (
+    DEFAULT_RULES_PATH, SafetyFilter, check_text_compliance, load_rules, masking_rules, reply_safety_filter
+)
+
+RULES = [("注定", "可能"), ("命中注定", "冥冥之中"), ("一定会", "很可能会"), ("灾难", "波折"), ("Doomed", "facing challenges")]
+
+
+def stream_through(safety_filter, text, size):
+    stream = safety_filter.stream()
+    output = [stream.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    return "".join(output) + stream.close()
+
+
+class TestPhraseAutomaton(unittest.TestCase):
+    def test_overlapping_matches(self):
+        """测试重叠与嵌套的短语都能找到"""
+        automaton = PhraseAutomaton(["he", "she", "his", "hers"])
+        matches, _ = automaton.scan("ushers")
+        found = sorted((start, end, automaton.phrases[i]) for start, end, i in matches)
+        self.assertEqual(found, [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")])
+
+
+class TestSafetyFilter(unittest.TestCase):
+    def setUp(self):
+        self.filter = SafetyFilter(RULES)
+
+    def test_cjk_without_word_boundaries(self):
+        """测试中文短语在前后都是汉字时也能命中（原先的 \\b 规则匹配不到）"""
+        ok, violations = self.filter.check("你们注定会分开，这是一场灾难")
+        self.assertFalse(ok)
+        self.assertEqual(violations, ["注定", "灾难"])
+
+    def test_filter_prefers_longest_match(self):
+        """测试重叠时取最长的短语，英文忽略大小写"""
+        self.assertEqual(self.filter.filter("这是命中注定的"), "这是冥冥之中的")
+        self.assertEqual(self.filter.filter("You are DOOMED."), "You are facing challenges.")
+        self.assertEqual(self.filter.filter("平静的一天"), "平静的一天")
+
+    def test_stream_matches_across_chunks(self):
+        """测试流式过滤在任意切分下都与整段过滤结果一致"""
+        text = "你们命中注定，一定会好起来，不是灾难。一定要相信：注定？一定会。"
+        expected = self.filter.filter(text)
+        for size in range(1, 8):
+            self.assertEqual(stream_through(self.filter, text, size), expected, f"chunk size {size}")
+
+    def test_stream_random_text(self):
+        """测试随机文本下流式与整段过滤一致"""
+        rng = random.Random(7)
+        alphabet = "命中注定一灾难会的"
+        for _ in range(200):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+            self.assertEqual(stream_through(self.filter, text, rng.randint(1, 5)), self.filter.filter(text))
+
+    def test_stream_holds_back_partial_phrase(self):
+        """测试可能是短语开头的尾部暂不输出"""
+        stream = self.filter.stream()
+        self.assertEqual(stream.feed("我们命中"), "我们")
+        self.assertEqual(stream.feed("注定"), "")
+        self.assertEqual(stream.feed("相遇"), "冥冥之中相遇")
+        self.assertEqual(stream.close(), "")
+
+    def test_default_rules(self):
+        """测试默认规则文件可以加载，并兼容原有的 check_text_compliance 接口"""
+        rules = load_rules(DEFAULT_RULES_PATH)
+        self.assertIn(("灾难", "波折"), rules)
+        self.assertEqual(check_text_compliance("未来可期"), (True, []))
+        ok, violations = check_text_compliance("你必然会成功")
+        self.assertFalse(ok)
+        self.assertEqual(violations, ["必然"])
+
+    def test_reply_filter_only_masks(self):
+        """测试偶像回复使用的过滤器不改写日常措辞，只遮盖不写替换词的短语"""
+        self.assertEqual(masking_rules(RULES + [("开光", "**")]), [("开光", "**")])
+        self.assertEqual(reply_safety_filter.filter("我一定会陪着你，这不是灾难"), "我一定会陪着你，这不是灾难")
+        self.assertEqual(reply_safety_filter.filter("先交开光的钱"), "先交**的钱")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.models.session_locks import SessionBusyError, SessionLocks
+
+
+class TestSessionLocks(unittest.TestCase):
+    def run_threads(self, locks, session_ids, hold_seconds=0.05):
+        """
+        每个 session_id 一个线程，持锁 hold_seconds 秒，返回 (总耗时, 同时持锁的最大数)
+        """
+        active = {}
+        peak = {}
+        guard = threading.Lock()
+
+        def work(session_id):
+            with locks.hold(session_id):
+                with guard:
+                    active[session_id] = active.get(session_id, 0) + 1
+                    peak[session_id] = max(peak.get(session_id, 0), active[session_id])
+                time.sleep(hold_seconds)
+                with guard:
+                    active[session_id] -= 1
+
+        threads = [threading.Thread(target=work, args=(sid,)) for sid in session_ids]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start, peak
+
+    def test_same_session_serialized(self):
+        """测试同一会话的请求逐个执行"""
+        locks = SessionLocks()
+        _, peak = self.run_threads(locks, ["s1"] * 8)
+        self.assertEqual(peak["s1"], 1)
+        stats = locks.stats()
+        self.assertEqual(stats["acquired"], 8)
+        self.assertGreater(stats["contended"], 0)
+        # 没有在途请求后登记表清空
+        self.assertEqual(stats["active"], 0)
+
+    def test_different_sessions_parallel(self):
+        """测试不同会话之间不互相等待"""
+        locks = SessionLocks()
+        elapsed, _ = self.run_threads(locks, [f"s{i}" for i in range(8)], hold_seconds=0.2)
+        self.assertLess(elapsed, 0.2 * 4)
+        self.assertEqual(locks.stats()["contended"], 0)
+
+    def test_timeout(self):
+        """测试等待超过 timeout 时抛出 SessionBusyError，锁仍然可以继续使用"""
+        locks = SessionLocks(timeout=0.05)
+        with locks.hold("s1"):
+            errors = []
+
+            def contend():
+                try:
+                    with locks.hold("s1"):
+                        pass
+                except SessionBusyError as e:
+                    errors.append(e)
+
+            thread = threading.Thread(target=contend)
+            thread.start()
+            thread.join()
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(locks.stats()["timeouts"], 1)
+        with locks.hold("s1"):
+            pass
+        self.assertEqual(locks.stats()["active"], 0)
+
+    def test_async_serialized(self):
+        """测试协程版本：同一会话排队，不同会话并行"""
+        locks = SessionLocks(timeout=1)
+        order = []
+
+        async def work(session_id, tag):
+            async with locks.ahold(session_id):
+                order.append(("start", tag))
+                await asyncio.sleep(0.02)
+                order.append(("end", tag))
+
+        async def main():
+            await asyncio.gather(*(work("s1", i) for i in range(4)))
+
+        asyncio.run(main())
+        # 同一会话的开始与结束成对出现，没有交错
+        self.assertEqual([kind for kind, _ in order], ["start", "end"] * 4)
+        self.assertEqual(locks.stats()["active"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import os
+import sys
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import datetime
+from backend.models.chat_session import ChatSession, SessionManager
+from tests.fake_clock import FakeClock
+
+
+class TestSessionManager(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_lru_eviction_on_max_sessions(self):
+        """测试超过会话数上限时淘汰最久未访问的会话"""
+        manager = SessionManager(max_sessions=2, clock=self.clock)
+        first = manager.create_session(user_id="a")
+        second = manager.create_session(user_id="b")
+        manager.get_session(first.session_id)
+        manager.create_session(user_id="c")
+        self.assertIsNotNone(manager.get_session(first.session_id))
+        self.assertIsNone(manager.get_session(second.session_id))
+        self.assertEqual(manager.stats()["evictions"]["lru"], 1)
+
+    def test_idle_ttl(self):
+        """测试闲置过期：访问时发现过期视为不存在，后台清理从最久未访问的开始删除"""
+        manager = SessionManager(idle_ttl=60, clock=self.clock)
+        manager.stop()
+        idle = manager.create_session()
+        self.clock.now += 30
+        active = manager.create_session()
+        self.clock.now += 40
+        manager.sweep()
+        self.assertNotIn(idle.session_id, manager.sessions)
+        self.assertIs(manager.get_session(active.session_id), active)
+        self.clock.now += 61
+        self.assertIsNone(manager.get_session(active.session_id))
+        self.assertEqual(manager.stats()["evictions"]["idle"], 2)
+
+    def test_memory_cap(self):
+        """测试总估算内存超过上限时淘汰最久未访问的会话"""
+        manager = SessionManager(max_memory_bytes=10 ** 9, clock=self.clock)
+        manager.stop()
+        sessions = [manager.create_session() for _ in range(3)]
+        for session in sessions:
+            session.add_message("user", "x" * 10000)
+        manager.get_session(sessions[0].session_id)
+        manager.max_memory_bytes = sessions[0].approx_bytes * 2
+        manager.sweep()
+        self.assertNotIn(sessions[1].session_id, manager.sessions)
+        self.assertIn(sessions[0].session_id, manager.sessions)
+        self.assertIn(sessions[2].session_id, manager.sessions)
+        stats = manager.stats()
+        self.assertEqual(stats["evictions"]["memory"], 1)
+        self.assertLessEqual(stats["approx_bytes"], manager.max_memory_bytes)
+
+    def test_list_user_sessions(self):
+        """测试按用户分页：按 updated_at 倒序，游标翻页覆盖全部会话，淘汰与删除后从索引中移除"""
+        manager = SessionManager(max_sessions=5, clock=self.clock)
+        sessions = [manager.create_session(user_id="u1") for _ in range(4)]
+        other = manager.create_session(user_id="u2")
+        sessions[1].add_message("user", "最近的事业")
+
+        page, cursor = manager.list_user_sessions("u1", limit=3)
+        self.assertEqual(page[0]["session_id"], sessions[1].session_id)
+        self.assertNotIn("messages", page[0])
+        rest, last = manager.list_user_sessions("u1", limit=3, cursor=cursor)
+        self.assertIsNone(last)
+        listed = [s["session_id"] for s in page + rest]
+        self.assertEqual(sorted(listed), sorted(s.session_id for s in sessions))
+        updated = [s["updated_at"] for s in page + rest]
+        self.assertEqual(updated, sorted(updated, reverse=True))
+
+        manager.delete_session(sessions[2].session_id)
+        manager.get_session(other.session_id)
+        for session in sessions[:2] + sessions[3:]:
+            manager.get_session(session.session_id)
+        # 超过上限淘汰最久未访问的 u2 会话
+        manager.create_session(user_id="u1")
+        manager.create_session(user_id="u1")
+        self.assertEqual(manager.list_user_sessions("u2")[0], [])
+        listed = [s["session_id"] for s in manager.list_user_sessions("u1")[0]]
+        self.assertEqual(len(listed), 5)
+        self.assertNotIn(sessions[2].session_id, listed)
+        self.assertEqual(len(manager.user_index), 5)
+
+    def test_unbounded_by_default(self):
+        """测试不配置上限时不启动后台线程"""
+        manager = SessionManager()
+        for _ in range(5):
+            manager.create_session()
+        self.assertEqual(manager.stats()["sessions"], 5)
+        self.assertIsNone(manager._sweeper)
+
+
+
+class TestChatSessionRecords(unittest.TestCase):
+    def test_compact_messages(self):
+        """测试消息使用 __slots__、会话内序号 id、epoch 秒时间，序列化时才格式化"""
+        session = ChatSession()
+        first = session.add_message("".join(["us", "er"]), "你好")
+        second = session.add_message("idol", "안녕")
+        self.assertFalse(hasattr(first, "__dict__"))
+        self.assertEqual((first.id, second.id), (0, 1))
+        self.assertIs(first.role, "user")
+        self.assertIsInstance(first.timestamp, float)
+        self.assertIs(session.get_message("1"), second)
+        self.assertIsNone(session.get_message("2"))
+        self.assertIsNone(session.get_message("not-an-id"))
+
+        data = session.to_dict()
+        self.assertEqual(data["messages"][0]["id"], 0)
+        datetime.fromisoformat(data["messages"][0]["timestamp"])
+        datetime.fromisoformat(data["updated_at"])
+
+        divination = session.add_divination("career", "问题", "结果")
+        self.assertFalse(hasattr(divination, "__dict__"))
+        self.assertEqual(session.get_divinations()[0]["id"], 0)
+        self.assertGreaterEqual(session.updated_at, first.timestamp)
+
+
+    def test_messages_since_and_revision(self):
+        """测试增量同步按 id 切片，新增或修改消息时 ETag 变化"""
+        session = ChatSession()
+        for i in range(5):
+            session.add_message("user", f"第{i}条")
+        self.assertEqual([m.id for m in session.messages_since(2)], [3, 4])
+        self.assertEqual([m.id for m in session.messages_since(-1, limit=2)], [0, 1])
+        self.assertEqual(session.messages_since(4), [])
+
+        etag = session.messages_etag()
+        self.assertEqual(session.messages_etag(), etag)
+        session.update_message(session.messages[4], translatable=True)
+        self.assertNotEqual(session.messages_etag(), etag)
+        self.assertEqual(session.messages[0].to_dict(["id", "translatable"]), {"id": 0, "translatable": False})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,251 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import text
+from backend.models.chat_session import SessionConflictError, SessionManager
+from backend.models.session_store import SessionSchemaError, SessionStore
+
+
+class TestSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.url = f"sqlite:///{os.path.join(self.tmpdir, 'sessions.db')}"
+        # 写入间隔设得很长，由测试手动 flush
+        self.store = SessionStore(self.url, flush_interval=60)
+
+    def tearDown(self):
+        self.store.close()
+        self.store.engine.dispose()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def new_store(self):
+        """
+        模拟进程重启：新的存储实例与会话管理器
+        """
+        store = SessionStore(self.url, flush_interval=60)
+        self.addCleanup(store.engine.dispose)
+        self.addCleanup(store.close)
+        return store
+
+    def test_persist_and_reload(self):
+        """测试会话、消息与占卜记录写入后可以在新进程中恢复"""
+        manager = SessionManager(store=self.store)
+        session = manager.create_session(user_id="u1")
+        session.add_message("user", "我的事业怎么样？")
+        session.add_divination("career", "我的事业怎么样？", "【第1卦 乾卦】")
+        session.persona_config = {"name": "IU", "default_language": "ko"}
+        reply = session.add_message("idol", "안녕")
+        session.update_message(reply, translatable=True)
+        session.update_message(reply, translation="你好")
+        session.set_summary("聊过事业", 1)
+        self.assertGreater(self.store.flush(), 0)
+
+        restored = SessionManager(store=self.new_store()).get_session(session.session_id)
+        self.assertIsNot(restored, session)
+        self.assertEqual(restored.to_dict(), session.to_dict())
+        self.assertEqual(restored.get_divinations(), session.get_divinations())
+        self.assertEqual(restored.current_state, session.STATE_TRANSITION)
+        self.assertEqual((restored.summary, restored.summary_upto), ("聊过事业", 1))
+
+    def test_request_path_does_not_write(self):
+        """测试新增消息只进入缓冲区，flush 之前数据库中没有数据"""
+        manager = SessionManager(store=self.store)
+        session = manager.create_session(user_id="u1")
+        session.add_message("user", "hello")
+        with self.store.engine.connect() as conn:
+            self.assertEqual(conn.execute(text("SELECT COUNT(*) FROM chat_messages")).scalar(), 0)
+        self.assertEqual(self.store.stats()["pending"], 2)
+        self.store.flush()
+        with self.store.engine.connect() as conn:
+            self.assertEqual(conn.execute(text("SELECT COUNT(*) FROM chat_messages")).scalar(), 1)
+
+    def test_lazy_load_after_eviction(self):
+        """测试从内存淘汰的会话在再次访问时从存储加载，尚未写入的会话返回内存中的对象"""
+        manager = SessionManager(max_sessions=1, store=self.store)
+        first = manager.create_session(user_id="u1")
+        first.add_message("user", "first")
+        manager.create_session(user_id="u1")
+        self.assertNotIn(first.session_id, manager.sessions)
+        self.assertIs(manager.get_session(first.session_id), first)
+
+        self.store.flush()
+        manager.create_session(user_id="u1")
+        loaded = manager.get_session(first.session_id)
+        self.assertIsNot(loaded, first)
+        self.assertEqual(loaded.messages[0].content, "first")
+        # 加载后的会话继续写入存储
+        loaded.add_message("idol", "second")
+        self.store.flush()
+        restored = self.new_store().load_session(first.session_id)
+        self.assertEqual([m.content for m in restored.messages], ["first", "second"])
+
+    def test_delete_and_find_by_user(self):
+        manager = SessionManager(store=self.store)
+        kept = manager.create_session(user_id="u1")
+        removed = manager.create_session(user_id="u1")
+        manager.create_session(user_id="u2")
+        self.store.flush()
+        self.assertTrue(manager.delete_session(removed.session_id))
+        self.assertFalse(manager.delete_session("missing"))
+        self.assertEqual([s.session_id for s in manager.get_sessions_by_user("u1")], [kept.session_id])
+        self.store.flush()
+        self.assertIsNone(self.new_store().load_session(removed.session_id))
+
+    def test_list_user_sessions(self):
+        """测试按用户分页：已写入与缓冲区中的会话合并排序，缓冲区中较新的 updated_at 优先"""
+        manager = SessionManager(store=self.store)
+        sessions = [manager.create_session(user_id="u1") for _ in range(5)]
+        manager.create_session(user_id="u2")
+        self.store.flush()
+        # 写入之后的更新还在缓冲区中
+        sessions[0].add_message("user", "hello")
+        removed = sessions[3]
+        manager.delete_session(removed.session_id)
+        sessions.append(manager.create_session(user_id="u1"))
+
+        listed, cursor = [], None
+        while True:
+            page, cursor = manager.list_user_sessions("u1", limit=2, cursor=cursor)
+            listed += page
+            if cursor is None:
+                break
+        expected = sorted((s for s in sessions if s is not removed), key=lambda s: (s.updated_at, s.session_id), reverse=True)
+        self.assertEqual([s["session_id"] for s in listed], [s.session_id for s in expected])
+        self.assertEqual(listed[0]["session_id"], sessions[-1].session_id)
+
+        self.store.flush()
+        page, _ = SessionManager(store=self.new_store()).list_user_sessions("u1", limit=10)
+        self.assertEqual(page, [s.to_summary() for s in expected])
+
+    def test_sqlite_wal(self):
+        with self.store.engine.connect() as conn:
+            self.assertEqual(conn.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+
+    def test_rejects_old_record_tables(self):
+        """测试以 id 为主键的旧版消息表在启动时给出明确的错误"""
+        url = f"sqlite:///{os.path.join(self.tmpdir, 'legacy.db')}"
+        store = SessionStore(url, flush_interval=60)
+        with store.engine.begin() as conn:
+            conn.execute(text("DROP TABLE chat_messages"))
+            conn.execute(text("CREATE TABLE chat_messages (id VARCHAR(36) PRIMARY KEY, session_id VARCHAR(36), "
+                              "seq INTEGER, role VARCHAR(16), content TEXT, timestamp VARCHAR(32))"))
+        store.close()
+        store.engine.dispose()
+
+        with self.assertRaisesRegex(SessionSchemaError, "chat_messages"):
+            SessionStore(url, flush_interval=60)
+
+    def test_adds_missing_columns(self):
+        """测试早先创建、缺少 version 与摘要列的会话表在启动时补齐，已有的行仍然可以读取和更新"""
+        url = f"sqlite:///{os.path.join(self.tmpdir, 'old.db')}"
+        store = SessionStore(url, flush_interval=60)
+        with store.engine.begin() as conn:
+            for column in ("version", "summary", "summary_upto"):
+                conn.execute(text(f"ALTER TABLE chat_sessions DROP COLUMN {column}"))
+            conn.execute(text("INSERT INTO chat_sessions (session_id, user_id, created_at, updated_at, current_state) "
+                              "VALUES ('old', 'u1', 1.0, 1.0, 'DIVINATION')"))
+        store.close()
+        store.engine.dispose()
+
+        store = SessionStore(url, flush_interval=60)
+        self.addCleanup(store.engine.dispose)
+        self.addCleanup(store.close)
+        session = SessionManager(store=store).get_session("old")
+        self.assertEqual((session.version, session.summary, session.summary_upto), (1, None, 0))
+        session.add_message("user", "还在吗")
+        session.set_summary("聊过占卜", 1)
+        store.flush()
+        reloaded = SessionStore(url, flush_interval=60)
+        self.addCleanup(reloaded.engine.dispose)
+        self.addCleanup(reloaded.close)
+        restored = SessionManager(store=reloaded).get_session("old")
+        self.assertEqual(restored.summary, "聊过占卜")
+        self.assertEqual(len(restored.messages), 1)
+
+
+
+class TestSharedSessionStore(unittest.TestCase):
+    """两个 SessionManager + SessionStore 各自连接同一个数据库，模拟两个 worker 进程"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        url = f"sqlite:///{os.path.join(self.tmpdir, 'sessions.db')}"
+        self.workers = []
+        for _ in range(2):
+            store = SessionStore(url, flush_interval=60)
+            self.addCleanup(store.engine.dispose)
+            self.addCleanup(store.close)
+            self.workers.append(SessionManager(store=store, shared=True))
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+
+    def test_changes_visible_across_workers(self):
+        """测试一个 worker 提交后，另一个 worker 缓存的旧对象按版本号失效并重新加载"""
+        a, b = self.workers
+        session = a.create_session(user_id="u1")
+        seen = b.get_session(session.session_id)
+        self.assertIsNotNone(seen)
+
+        session.add_message("user", "我的事业怎么样？")
+        session.set_state(session.STATE_TRANSITION)
+        a.commit(session)
+        reloaded = b.get_session(session.session_id)
+        self.assertIsNot(reloaded, seen)
+        self.assertEqual(reloaded.to_dict(), session.to_dict())
+        # 版本号没有变化时直接使用缓存
+        self.assertIs(b.get_session(session.session_id), reloaded)
+
+        self.assertTrue(a.delete_session(session.session_id))
+        self.assertIsNone(b.get_session(session.session_id))
+
+    def test_conflicting_commit_rejected(self):
+        """测试两个 worker 同时修改同一会话：后提交的一方版本冲突，修改被丢弃，不会覆盖先提交的写入"""
+        a, b = self.workers
+        session_id = a.create_session(user_id="u1").session_id
+        first = a.get_session(session_id)
+        second = b.get_session(session_id)
+
+        first.add_message("user", "来自 worker A")
+        second.add_message("user", "来自 worker B")
+        a.commit(first)
+        with self.assertRaises(SessionConflictError):
+            b.commit(second)
+        self.assertEqual(b.store.stats()["conflicts"], 0)
+
+        current = b.get_session(session_id)
+        self.assertEqual([m.content for m in current.messages], ["来自 worker A"])
+        # 重新加载后可以继续正常提交
+        current.add_message("idol", "回复")
+        b.commit(current)
+        self.assertEqual([m.content for m in a.get_session(session_id).messages], ["来自 worker A", "回复"])
+
+    def test_flush_leaves_shared_changes_to_commit(self):
+        """测试共享模式下后台写入不写会话的修改：未提交的状态对其他 worker 不可见，基于旧版本的修改在提交时报冲突"""
+        a, b = self.workers
+        session_id = a.create_session(user_id="u1").session_id
+        stale = b.get_session(session_id)
+        fresh = a.get_session(session_id)
+        fresh.set_state(fresh.STATE_IDOL_CHAT)
+        self.assertEqual(a.store.flush(), 0)
+        self.assertEqual(b.get_session(session_id).current_state, stale.STATE_DIVINATION)
+        a.commit(fresh)
+
+        stale.add_message("user", "旧版本上的修改")
+        self.assertEqual(b.store.flush(), 0)
+        with self.assertRaises(SessionConflictError):
+            b.commit(stale)
+        current = b.get_session(session_id)
+        self.assertEqual(current.current_state, current.STATE_IDOL_CHAT)
+        self.assertEqual(current.messages, [])
+        # 删除仍由后台写入
+        self.assertTrue(b.delete_session(session_id))
+        self.assertIsNone(a.get_session(session_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
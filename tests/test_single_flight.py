@@ -0,0 +1,96 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services.single_flight import SingleFlight, AsyncSingleFlight
+from backend.services.llm_client import LLMClient
+
+class TestSingleFlight(unittest.TestCase):
+    def run_concurrently(self, n, target):
+        results = [None] * n
+        barrier = threading.Barrier(n)
+
+        def worker(i):
+            barrier.wait()
+            try:
+                results[i] = target()
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_concurrent_calls_share_one_execution(self):
+        """测试并发的相同请求只执行一次并共享结果"""
+        flight = SingleFlight()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'persona'
+
+        results = self.run_concurrently(5, lambda: flight.do('Taylor Swift', fn))
+
+        self.assertEqual(results, ['persona'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats(), {"executions": 1, "coalesced": 4, "in_flight": 0})
+
+    def test_errors_are_shared(self):
+        """测试上游异常同样传给所有等待方"""
+        flight = SingleFlight()
+
+        def fn():
+            time.sleep(0.05)
+            raise RuntimeError('upstream down')
+
+        results = self.run_concurrently(3, lambda: flight.do('k', fn))
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+        self.assertEqual(flight.executions, 1)
+
+    def test_llm_client_coalesces_identical_prompts(self):
+        """测试 LLMClient 合并并发中的相同提示词"""
+        client = LLMClient()
+        client.single_flight = SingleFlight()
+
+        def fake_call(prompt, model, max_tokens, temperature):
+            time.sleep(0.05)
+            return f'回复:{prompt}'
+
+        with patch.object(client, '_call_deepseek', side_effect=fake_call) as mock_call:
+            results = self.run_concurrently(4, lambda: client.generate_response('同一个偶像', model='deepseek-chat'))
+
+        self.assertEqual(results, ['回复:同一个偶像'] * 4)
+        self.assertEqual(mock_call.call_count, 1)
+        self.assertEqual(client.single_flight.coalesced, 3)
+
+class TestAsyncSingleFlight(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_calls_share_one_execution(self):
+        """测试异步版本合并并发中的相同请求"""
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'persona'
+
+        results = await asyncio.gather(*[flight.do('k', fn) for _ in range(5)])
+
+        self.assertEqual(results, ['persona'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.coalesced, 4)
+
+if __name__ == '__main__':
+    unittest.main()
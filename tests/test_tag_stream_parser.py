@@ -0,0 +1,85 @@
+import os
+import sys
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services.tag_stream_parser import TagStreamParser, SectionTextRenderer, parse_sections
+
+TAGS = ("hexagram", "source", "interpretation", "comfort", "question")
+RESPONSE = (
+    "好的。\n<hexagram>乾为天</hexagram>\n<source>天行健，君子以自强不息。</source>\n"
+    "<interpretation>\n顺势而为，a<b 时不必急。\n</interpretation>\n"
+    "<comfort>别担心。</comfort>\n<question>你想继续吗？</question>"
+)
+
+
+def feed_in_chunks(parser, text, size):
+    events = []
+    for i in range(0, len(text), size):
+        events += parser.feed(text[i:i + size])
+    return events + parser.close()
+
+
+class TestTagStreamParser(unittest.TestCase):
+    def test_parse_sections(self):
+        """测试一次性解析全部五段"""
+        sections, untagged = parse_sections(RESPONSE, TAGS)
+        self.assertEqual(sections["hexagram"], "乾为天")
+        self.assertEqual(sections["interpretation"], "顺势而为，a<b 时不必急。")
+        self.assertEqual(sections["question"], "你想继续吗？")
+        self.assertEqual(untagged, "好的。")
+
+    def test_chunk_boundaries(self):
+        """测试任意切分位置（包括切开标签）得到的段落与一次性解析相同"""
+        expected, _ = parse_sections(RESPONSE, TAGS)
+        for size in range(1, 12):
+            parser = TagStreamParser(TAGS)
+            events = feed_in_chunks(parser, RESPONSE, size)
+            self.assertEqual(parser.sections, expected, f"chunk size {size}")
+            closed = [e.tag for e in events if e.kind == "section"]
+            self.assertEqual(closed, list(TAGS))
+
+    def test_section_emitted_when_closed(self):
+        """测试段落在结束标签到达时立即产出，不必等整个流结束"""
+        parser = TagStreamParser(TAGS)
+        events = parser.feed("<hexagram>乾为天</hexa")
+        self.assertEqual([e.kind for e in events], ["open", "delta"])
+        events = parser.feed("gram><interpretation>顺势")
+        self.assertEqual(events[0], ("section", "hexagram", "乾为天"))
+        self.assertEqual(events[-1], ("delta", "interpretation", "顺势"))
+
+    def test_case_attributes_and_truncation(self):
+        """测试标签忽略大小写、允许属性，被截断的段落在结束时闭合"""
+        parser = TagStreamParser(TAGS)
+        parser.feed('<Interpretation lang="zh">解读</INTERPRETATION><comfort>别担心</com')
+        parser.close()
+        self.assertEqual(parser.sections, {"interpretation": "解读", "comfort": "别担心"})
+
+    def test_unknown_tags(self):
+        """测试段外的未知标签被丢弃，段内的按原文保留"""
+        sections, untagged = parse_sections("<think>先想想</think><comfort>要<b>相信</b>自己</comfort>", TAGS)
+        self.assertEqual(untagged, "先想想")
+        self.assertEqual(sections["comfort"], "要<b>相信</b>自己")
+
+
+class TestSectionTextRenderer(unittest.TestCase):
+    def test_render_strips_tags(self):
+        """测试展示文本去掉标签，段落之间空一行"""
+        parser = TagStreamParser(("interpretation", "comfort"))
+        renderer = SectionTextRenderer()
+        text = "".join(renderer.render(parser.feed(c)) for c in ["<interpretation>\n解", "读</interpretation>\n<com", "fort>安慰</comfort>"])
+        text += renderer.render(parser.close())
+        self.assertEqual(text, "解读\n\n安慰")
+
+    def test_render_untagged_passthrough(self):
+        """测试模型没有按标签输出时原样转发"""
+        parser = TagStreamParser(("interpretation",))
+        renderer = SectionTextRenderer()
+        self.assertEqual(renderer.render(parser.feed("Hello, ")), "Hello, ")
+        self.assertEqual(renderer.render(parser.feed("world")), "world")
+
+
+if __name__ == '__main__':
+    unittest.main()
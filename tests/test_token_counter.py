@@ -0,0 +1,66 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services import token_counter
+from backend.services.token_counter import estimate_tokens, count_message_tokens, select_recent_messages
+from backend.services.idol_chat_service import IdolChatService
+from backend.models.chat_session import ChatSession
+
+class TestTokenCounter(unittest.TestCase):
+    def test_estimate_tokens(self):
+        """测试中文与英文字符按不同比例估算"""
+        self.assertEqual(estimate_tokens(''), 0)
+        self.assertEqual(estimate_tokens('你' * 10), 6)
+        self.assertEqual(estimate_tokens('a' * 10), 3)
+
+    def test_message_count_is_cached(self):
+        """测试每条消息的 token 数只计算一次"""
+        session = ChatSession()
+        message = session.add_message('user', '你好' * 50)
+        with patch.object(token_counter, 'estimate_tokens', wraps=estimate_tokens) as mock_estimate:
+            first = count_message_tokens(message)
+            second = count_message_tokens(message)
+        self.assertEqual(first, second)
+        mock_estimate.assert_called_once()
+
+    def test_select_fills_budget_from_newest(self):
+        """测试从最新消息往前填充预算，长占卜结果会被挤出"""
+        session = ChatSession()
+        session.add_message('idol', '卦' * 1000)
+        for i in range(5):
+            session.add_message('user', f'第{i}句')
+
+        selected = select_recent_messages(session.messages, token_budget=100)
+        self.assertEqual([m.content for m in selected], [f'第{i}句' for i in range(5)])
+
+        selected = select_recent_messages(session.messages, token_budget=100, max_messages=2)
+        self.assertEqual([m.content for m in selected], ['第3句', '第4句'])
+
+    def test_newest_message_always_included(self):
+        """测试最新消息超出预算时仍然保留"""
+        session = ChatSession()
+        session.add_message('user', '很长' * 500)
+        self.assertEqual(len(select_recent_messages(session.messages, token_budget=10)), 1)
+
+    @patch('backend.services.idol_chat_service.llm_client.generate_response', return_value='嗯……')
+    def test_idol_prompt_respects_budget(self, mock_generate_response):
+        """测试偶像聊天提示词只包含预算内的历史"""
+        service = IdolChatService()
+        service.history_token_budget = 50
+        session = ChatSession()
+        session.add_message('idol', '旧的占卜结果' * 200)
+        session.add_message('user', '我有点累')
+
+        service.generate_idol_response({"name": "小梦", "default_language": "zh"}, session)
+
+        prompt = "\n".join(m['content'] for m in mock_generate_response.call_args[0][0])
+        self.assertIn('我有点累', prompt)
+        self.assertNotIn('旧的占卜结果', prompt)
+
+if __name__ == '__main__':
+    unittest.main()